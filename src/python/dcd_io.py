@@ -20,11 +20,17 @@ from __future__ import print_function
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
+import os
 import sys
 import string
+import struct
 import time
+import collections
+import threading
+import Queue
 import numpy
 import sasmol.dcdio as dcdio
+import sasmol.utilities as utilities
 
 #	DCD_IO
 #
@@ -52,8 +58,31 @@ import sasmol.dcdio as dcdio
 	These classes are accessed by the Atom class found in
 	the sasmol.system module through the file_io File() class.
 
+	Compressed (gzip, bz2 or xz) DCD files can not be handled by the
+	C module; read_dcd streams them through a python implementation of
+	the format instead (read_dcd_layout, etc.).  write_dcd and
+	write_dcd_frames always use the python writer, which assembles
+	blocks of frames with numpy and writes each block at once.
+
+	The unit cells that CHARMM and NAMD store with every frame of
+	constant pressure runs are read into unitcell() as an (nframes,6)
+	array of a, b, c, alpha, beta and gamma, and written back to the
+	file when the molecule has a unit cell.
+
 '''
 
+#	flags used by dcdio to describe CHARMM files (see dcdio.h)
+
+DCD_IS_CHARMM = 0x01
+DCD_HAS_4DIMS = 0x02
+DCD_HAS_EXTRA_BLOCK = 0x04
+
+#	size of the unit cell block written by CHARMM before each frame
+DCD_EXTRA_BLOCK_SIZE = 48
+
+#	number of coordinates that are assembled and written at once
+DCD_BLOCK_SIZE = 4194304
+
 class DCD(object):
 
     def open_dcd_read(self,filename):
@@ -116,33 +145,28 @@ class DCD(object):
 
         return
 
-    def write_dcd_frames(self, filename, start, end):
+    def write_dcd_frames(self, filename, start, end, **kwargs):
         '''
         This method writes a single step or multiple frames
         in the Charmm/Xplor data format.
-        by calling a pre-compiled C module (dcdio).
-        '''
-
-        outfile=dcdio.open_dcd_write(filename)
-        nset = end-start
-        natoms = self._coor[0,:,0].shape[0]
-        istart = 0 ; nsavc = 1 ; delta = 1.0
 
-        headerresult=dcdio.write_dcdheader(outfile,filename,natoms,nset,istart,nsavc,delta)
+        The frames are written in blocks (see write_dcd_stream); a
+        function given as progress=function is called with the number of
+        frames written and the number of frames to write after each block.
 
-        i = 0
-        for frame in xrange(start,end):
-            print(".",)
-            sys.stdout.flush()
-
-            tx=self._coor[frame,:,0].astype(numpy.float32)	
-            ty=self._coor[frame,:,1].astype(numpy.float32)	
-            tz=self._coor[frame,:,2].astype(numpy.float32)	
+        With append=True the frames are added to the end of an existing
+        file and its header is updated (see DCD_Writer).
+        '''
 
-            stepresult=dcdio.write_dcdstep(outfile,tx,ty,tz,i+1)
-            i += 1
+        if 'append' in kwargs and kwargs['append']:
+            writer = DCD_Writer(self,filename,'a')
+            writer.write_frames(xrange(start,end))
+            writer.close()
+            return
 
-        result = dcdio.close_dcd_write(outfile)
+        outfile = utilities.open_file(filename,'wb')
+        self.write_dcd_stream(outfile,start,end,**kwargs)
+        outfile.close()
 
         return
 
@@ -164,31 +188,20 @@ class DCD(object):
 	
         return
 
-    def write_dcd(self,filename):
+    def write_dcd(self,filename,**kwargs):
         '''
         This method writes data in the Charmm/Xplor data format.
-        by calling a pre-compiled C module (dcdio).
-        '''
-		
-        outfile=dcdio.open_dcd_write(filename)
 
-        nset = self._coor[:,0,0].shape[0]
-        natoms = self._coor[0,:,0].shape[0]
-        istart = 0 ; nsavc = 1 ; delta = 1.0
-		
-        headerresult=dcdio.write_dcdheader(outfile,filename,natoms,nset,istart,nsavc,delta)
-
-        for frame in xrange(nset):
-            print(".",)
-            sys.stdout.flush()
-
-            tx=self._coor[frame,:,0].astype(numpy.float32)	
-            ty=self._coor[frame,:,1].astype(numpy.float32)	
-            tz=self._coor[frame,:,2].astype(numpy.float32)	
-
-            stepresult=dcdio.write_dcdstep(outfile,tx,ty,tz,frame+1)
+        If filename ends with .gz, .bz2 or .xz the file is compressed
+        on the fly.  The frames are written in blocks (see
+        write_dcd_stream); a function given as progress=function is called
+        with the number of frames written and the number of frames to
+        write after each block.
+        '''
 
-        result = dcdio.close_dcd_write(outfile)
+        outfile = utilities.open_file(filename,'wb')
+        self.write_dcd_stream(outfile,0,self._coor[:,0,0].shape[0],**kwargs)
+        outfile.close()
 
         return
 
@@ -196,44 +209,13 @@ class DCD(object):
         '''
         This method reads a single dcd step in the Charmm/Xplor data format.
 	
-        The method simply reads all frames up until frame and then assigns
-        coordinates to the last frame (no seek option is utilizied)
+        frame counts from 1.  The position of the frame is computed from
+        the header and the file is read from there (see read_dcd_frames),
+        so the preceding frames are not read.
 
         '''
 
-        infile=dcdio.open_dcd_read(filename)
-        num_fixed=0
-        result = 1
-
-        print('calling read dcd header')
-        readheaderresult,nnatoms,nset,istart,nsavc,delta,namnf,reverseEndian,charmm=dcdio.read_dcdheader(infile)
-        if(readheaderresult!=0):
-            print('failed to read header')
-            print('readheaderresult = ',readheaderresult)	
-
-        print('done with read dcd header')
-
-        coor=numpy.zeros((1,nnatoms,3),numpy.float)	
-	
-        tx=numpy.zeros(nnatoms,dtype=numpy.float32)
-        ty=numpy.zeros(nnatoms,dtype=numpy.float32)
-        tz=numpy.zeros(nnatoms,dtype=numpy.float32)
-
-        first = 1  # since num_fixed = 0 ; the "first" variable is inconsequential
-		
-        for i in xrange(frame):	
-            result=dcdio.read_dcdstep(infile,tx,ty,tz,num_fixed,first,reverseEndian,charmm)
-
-        print('result = ',result)
-
-        coor[0,:,0]=tx.astype(numpy.float) ; coor[0,:,1]=ty.astype(numpy.float) ; coor[0,:,2]=tz.astype(numpy.float)
-		
-        result = dcdio.close_dcd_read(infile)
-        self._coor=numpy.array(coor)
-	
-        if(result!=0):
-            print('failed to read coordinates')	
-            print('result = ',result)
+        self.read_dcd_frames(filename,frame-1)
 
         return
 	
@@ -270,8 +252,16 @@ class DCD(object):
 
         '''
         This method reads data in the Charmm/Xplor data format.
+
+        gzip, bz2 and xz compressed files are decompressed on the fly.
         '''
 
+        if(utilities.compression_type(filename) is not None):
+            infile = utilities.open_file(filename,'rb')
+            self.read_dcd_stream(infile)
+            infile.close()
+            return
+
         infile=dcdio.open_dcd_read(filename)
 
         nnatoms=0 ; nset=0 ; istart=0 ; nsavc=0 ; delta=0.0
@@ -283,27 +273,1063 @@ class DCD(object):
         num_fixed=0 
         result=1
 
+        tx=numpy.zeros(nnatoms,dtype=numpy.float32)
+        ty=numpy.zeros(nnatoms,dtype=numpy.float32)
+        tz=numpy.zeros(nnatoms,dtype=numpy.float32)
+
         sum=0.0
         for i in xrange(nset):
             print('.',)
             sys.stdout.flush()
             read_start_time=time.time()
-            tx=numpy.zeros(nnatoms,dtype=numpy.float32)
-            ty=numpy.zeros(nnatoms,dtype=numpy.float32)
-            tz=numpy.zeros(nnatoms,dtype=numpy.float32)
 		
             result=dcdio.read_dcdstep(infile,tx,ty,tz,num_fixed,i,reverseEndian,charmm)
             read_end_time=time.time()
 	
             sum+=read_end_time-read_start_time
 
-            coor[i,:,0]=tx.astype(numpy.float) ; coor[i,:,1]=ty.astype(numpy.float) ; coor[i,:,2]=tz.astype(numpy.float)
+            coor[i,:,0]=tx ; coor[i,:,1]=ty ; coor[i,:,2]=tz
 	
         result = dcdio.close_dcd_read(infile)
-        self._coor=numpy.array(coor)
+        self._coor=coor
+        self._unitcell=self.read_dcd_unitcells(filename)
+
+        print()
+
+        return
+
+    def read_dcd_record(self,infile,endian):
+        '''
+        This method reads one fortran record (a length marker, the data and
+        the repeated length marker) from a DCD file object and returns the data.
+        '''
+
+        marker = infile.read(4)
+        if(len(marker) != 4):
+            raise Exception, 'unexpected end of dcd file'
+
+        size = struct.unpack(endian+'i',marker)[0]
+        data = infile.read(size)
+        end_marker = infile.read(4)
+
+        if(len(data) != size or len(end_marker) != 4 or struct.unpack(endian+'i',end_marker)[0] != size):
+            raise Exception, 'bad record in dcd file'
+
+        return data
+
+    def read_dcd_layout(self,infile):
+        '''
+        This method reads the header of a DCD file from a binary file object
+        and returns a dictionary describing the file (natoms, nset, istart,
+        nsavc, delta, namnf, free_indexes, charmm, endian, header_size).
+
+        The header is read sequentially, without seek, so the file object
+        can be a decompressing stream.  The interpretation of the header
+        follows read_dcdheader in the dcdio C module.
+        '''
+
+        marker = infile.read(4)
+        if(len(marker) != 4):
+            raise Exception, 'failed to read header'
+
+        if(struct.unpack('<i',marker)[0] == 84):
+            endian = '<'
+        elif(struct.unpack('>i',marker)[0] == 84):
+            endian = '>'
+        else:
+            raise Exception, 'failed to read header: not a dcd file'
+
+        hdrbuf = infile.read(84)
+        if(len(hdrbuf) != 84 or hdrbuf[0:4] != 'CORD'):
+            raise Exception, 'failed to read header: not a dcd file'
+
+        icntrl = struct.unpack(endian+'20i',hdrbuf[4:84])
+
+        charmm = 0
+        if(icntrl[19] != 0):
+            charmm = DCD_IS_CHARMM
+            if(icntrl[10] == 1):
+                charmm |= DCD_HAS_EXTRA_BLOCK
+            if(icntrl[11] == 1):
+                charmm |= DCD_HAS_4DIMS
+
+        if(charmm & DCD_IS_CHARMM):
+            delta = struct.unpack(endian+'f',hdrbuf[40:44])[0]
+        else:
+            delta = struct.unpack(endian+'d',hdrbuf[40:48])[0]
+
+        if(struct.unpack(endian+'i',infile.read(4))[0] != 84):
+            raise Exception, 'failed to read header: bad first block'
+
+        title = self.read_dcd_record(infile,endian)
+        if((len(title)-4)%80 != 0):
+            raise Exception, 'failed to read header: bad title block'
+
+        natoms = struct.unpack(endian+'i',self.read_dcd_record(infile,endian))[0]
+
+        header_size = 4 + 84 + 4 + (4 + len(title) + 4) + 12
+
+        namnf = icntrl[8]
+        free_indexes = None
+
+        if(namnf != 0):
+            free = self.read_dcd_record(infile,endian)
+            free_indexes = numpy.fromstring(free,dtype=endian+'i4').astype(numpy.int) - 1
+            header_size += 4 + len(free) + 4
+
+        layout = {'natoms':natoms, 'nset':icntrl[0], 'istart':icntrl[1], 'nsavc':icntrl[2],
+                  'delta':delta, 'namnf':namnf, 'free_indexes':free_indexes,
+                  'charmm':charmm, 'endian':endian, 'header_size':header_size}
+
+        return layout
+
+    def dcd_frame_layout(self,layout):
+        '''
+        This method returns the size in bytes of a frame of a DCD file
+        without fixed atoms and the offsets of its x, y and z data within
+        the frame, given the layout of the file (see read_dcd_layout).
+        '''
+
+        natoms = layout['natoms']
+        charmm = layout['charmm']
+        record_size = 4 + 4*natoms + 4
+
+        offset = 0
+        if((charmm & DCD_IS_CHARMM) and (charmm & DCD_HAS_EXTRA_BLOCK)):
+            offset += 4 + DCD_EXTRA_BLOCK_SIZE + 4
+
+        xyz_offsets = (offset+4, offset+record_size+4, offset+2*record_size+4)
+
+        frame_size = offset + 3*record_size
+        if((charmm & DCD_IS_CHARMM) and (charmm & DCD_HAS_4DIMS)):
+            frame_size += record_size
+
+        return frame_size,xyz_offsets
+
+    def read_dcd_memmap(self,filename,**kwargs):
+        '''
+        This method memory-maps a DCD file instead of reading it.
+
+        coor() becomes a float32 (nframes,natoms,3) view into the mapped
+        file, so coor()[i] is the (natoms,3) frame i and no data is copied
+        until it is used.  The default mode='c' (copy-on-write) keeps
+        changes to coor() in memory, mode='r' maps the file read-only and
+        mode='r+' writes changes back to the file.  The number of frames is
+        taken from the size of the file.
+
+        Compressed files and files with fixed atoms can not be mapped.
+        '''
+
+        mode = 'c'
+
+        if 'mode' in kwargs:
+            mode = kwargs['mode']
+
+        if(utilities.compression_type(filename) is not None):
+            raise Exception, 'compressed dcd files can not be memory-mapped: '+filename
+
+        infile = open(filename,'rb')
+        layout = self.read_dcd_layout(infile)
+        infile.close()
+
+        if(layout['namnf'] != 0):
+            raise Exception, 'dcd files with fixed atoms can not be memory-mapped: '+filename
+
+        natoms = layout['natoms']
+        frame_size,xyz_offsets = self.dcd_frame_layout(layout)
+        nframes = (os.path.getsize(filename)-layout['header_size'])//frame_size
+
+        if(nframes > 0 and natoms > 0):
+            mapped = numpy.memmap(filename,dtype=numpy.uint8,mode=mode)
+            coor = numpy.ndarray((nframes,natoms,3),dtype=layout['endian']+'f4',buffer=mapped,
+                                 offset=layout['header_size']+xyz_offsets[0],
+                                 strides=(frame_size,4,xyz_offsets[1]-xyz_offsets[0]))
+        else:
+            coor = numpy.zeros((nframes,natoms,3),numpy.float32)
+
+        self._coor = coor
+        self._unitcell = self.read_dcd_unitcells(filename)
+
+        return coor
+
+    def dcd_frame_offset(self,layout,frame):
+        '''
+        This method returns the byte offset of frame (counting from 0) in a
+        DCD file with the given layout (see read_dcd_layout).
+
+        In files with fixed atoms only the first frame holds all atoms, the
+        following ones hold the free atoms only.
+        '''
+
+        frame_size,xyz_offsets = self.dcd_frame_layout(layout)
+
+        if(layout['free_indexes'] is None or frame == 0):
+            return layout['header_size'] + frame*frame_size
+
+        free_layout = dict(layout)
+        free_layout['natoms'] = len(layout['free_indexes'])
+        free_frame_size,xyz_offsets = self.dcd_frame_layout(free_layout)
+
+        return layout['header_size'] + frame_size + (frame-1)*free_frame_size
+
+    def dcd_number_of_frames(self,filename,layout):
+        '''
+        This method returns the number of complete frames stored in a DCD
+        file; for compressed files the count in the header is used.
+        '''
+
+        if(utilities.compression_type(filename) is not None):
+            return layout['nset']
+
+        file_size = os.path.getsize(filename)
+        if(file_size < self.dcd_frame_offset(layout,1)):
+            return 0
+
+        frame_size = self.dcd_frame_offset(layout,2) - self.dcd_frame_offset(layout,1)
+
+        return 1 + (file_size-self.dcd_frame_offset(layout,1))//frame_size
+
+    def read_dcd_frames(self,filename,frames,**kwargs):
+        '''
+        This method reads selected frames of a DCD file into coor().
+
+        frames is a frame number or a list of frame numbers (counting from
+        0).  The byte offset of each frame is computed from the header
+        (including the CHARMM unit cell block and fixed atoms, see
+        dcd_frame_offset) and the file is read from there, so only the
+        requested frames are read.  The frames are returned in the order
+        given.  Compressed files are accepted but seeking in them means
+        decompressing up to the frame.
+        '''
+
+        if(isinstance(frames,(int,long,numpy.integer))):
+            frames = [frames]
+
+        infile = utilities.open_file(filename,'rb')
+        layout = self.read_dcd_layout(infile)
+
+        natoms = layout['natoms']
+        number_of_frames = self.dcd_number_of_frames(filename,layout)
+
+        coor = numpy.zeros((len(frames),natoms,3),numpy.float)
+        this_coor = numpy.zeros((natoms,3),numpy.float32)
+        unitcell = numpy.zeros((len(frames),6),numpy.float)
+
+        first_coor = self.read_dcd_fixed_atoms(infile,layout,number_of_frames)
+
+        for i in xrange(len(frames)):
+            frame = frames[i]
+            if(frame < 0 or frame >= number_of_frames):
+                infile.close()
+                raise Exception, 'frame '+str(frame)+' is not in '+filename+' which has '+str(number_of_frames)+' frame(s)'
+
+            self.read_dcd_frame(infile,layout,frame,this_coor,first_coor,unitcell[i])
+            coor[i] = this_coor
+
+        infile.close()
+
+        self._coor = coor
+        self._unitcell = self.dcd_unitcell(layout,unitcell)
+
+        return coor
+
+    def read_dcd_subset(self,filename,**kwargs):
+        '''
+        This method reads the coordinates of selected atoms and frames of a
+        DCD file into coor().
+
+        The atoms are given either as mask=, an array of ones and zeros
+        with one entry per atom in the file such as the one returned by
+        get_subset_mask, or as indices=, an array of atom indices (counting
+        from 0).  Frames start, start+step, ... up to (not including) stop
+        are read (kwargs start=0, stop=number of frames, step=1) and the
+        frames in between are skipped with seek.  Only the selected
+        coordinates are converted and stored, so coor() has the shape
+        (number of frames read, number of atoms selected, 3).
+
+        The atomic information of the molecule is not changed; use
+        copy_molecule_using_mask to make a matching molecule.
+        '''
+
+        start = 0 ; stop = None ; step = 1
+
+        if 'start' in kwargs:
+            start = kwargs['start']
+        if 'stop' in kwargs:
+            stop = kwargs['stop']
+        if 'step' in kwargs:
+            step = kwargs['step']
+
+        if(step < 1):
+            raise Exception, 'step must be a positive number: '+str(step)
+
+        infile = utilities.open_file(filename,'rb')
+
+        try:
+            layout = self.read_dcd_layout(infile)
+
+            natoms = layout['natoms']
+            number_of_frames = self.dcd_number_of_frames(filename,layout)
+
+            if 'mask' in kwargs:
+                mask = numpy.asarray(kwargs['mask'])
+                if(len(mask) != natoms):
+                    raise Exception, 'mask has '+str(len(mask))+' entries but '+filename+' has '+str(natoms)+' atoms'
+                indices = numpy.nonzero(mask)[0]
+            elif 'indices' in kwargs:
+                indices = numpy.asarray(kwargs['indices'],numpy.int)
+                if(len(indices) > 0 and (indices.min() < 0 or indices.max() >= natoms)):
+                    raise Exception, 'atom indices must be between 0 and '+str(natoms-1)
+            else:
+                raise Exception, 'read_dcd_subset needs a mask or indices'
+
+            if(stop is None or stop > number_of_frames):
+                stop = number_of_frames
+
+            frames = xrange(start,stop,step)
+            coor = numpy.zeros((len(frames),len(indices),3),numpy.float)
+            unitcell = numpy.zeros((len(frames),6),numpy.float)
+
+            if(layout['free_indexes'] is None and utilities.compression_type(filename) is None):
+                frame_size,xyz_offsets = self.dcd_frame_layout(layout)
+                for i in xrange(len(frames)):
+                    infile.seek(self.dcd_frame_offset(layout,frames[i]))
+                    data = infile.read(frame_size)
+                    for j in xrange(3):
+                        coor[i,:,j] = numpy.frombuffer(data,layout['endian']+'f4',natoms,xyz_offsets[j])[indices]
+                    if(layout['charmm'] & DCD_HAS_EXTRA_BLOCK):
+                        unitcell[i] = numpy.frombuffer(data,layout['endian']+'f8',6,4)
+            else:
+                this_coor = numpy.zeros((natoms,3),numpy.float32)
+                first_coor = self.read_dcd_fixed_atoms(infile,layout,number_of_frames)
+                for i in xrange(len(frames)):
+                    self.read_dcd_frame(infile,layout,frames[i],this_coor,first_coor,unitcell[i])
+                    coor[i] = this_coor[indices]
+
+        finally:
+            infile.close()
+
+        self._coor = coor
+        self._unitcell = self.dcd_unitcell(layout,unitcell)
+
+        return coor
+
+    def dcd_unitcell(self,layout,blocks):
+        '''
+        This method converts the (nframes,6) unit cell blocks of a DCD file
+        (A, gamma, B, beta, alpha and C, as CHARMM writes them) into an
+        (nframes,6) array of a, b, c, alpha, beta and gamma, with the
+        angles in degrees.  It returns None if the file (described by
+        layout, see read_dcd_layout) has no unit cells.
+
+        Recent CHARMM and NAMD versions store the cosines of the angles
+        rather than the angles; blocks whose three angles all lie in
+        [-1,1] are read as cosines.
+        '''
+
+        if(not (layout['charmm'] & DCD_IS_CHARMM) or not (layout['charmm'] & DCD_HAS_EXTRA_BLOCK)):
+            return None
+
+        blocks = numpy.asarray(blocks,numpy.float).reshape(-1,6)
+        unitcell = blocks[:,[0,2,5,4,3,1]]
+
+        cosines = numpy.all(numpy.abs(unitcell[:,3:]) <= 1.0,axis=1)
+        unitcell[cosines,3:] = numpy.degrees(numpy.arccos(unitcell[cosines,3:]))
+
+        return unitcell
+
+    def dcd_unitcell_blocks(self,frames):
+        '''
+        This method returns the unit cells of the given frames of the
+        molecule (see unitcell) as (nframes,6) DCD unit cell blocks, with
+        the angles stored as cosines, or None if the molecule has no unit
+        cell.  A single unit cell of 6 values is used for every frame.
+        '''
+
+        unitcell = getattr(self,'_unitcell',None)
+
+        if(unitcell is None):
+            return None
+
+        unitcell = numpy.asarray(unitcell,numpy.float)
+
+        if(unitcell.shape == (6,)):
+            unitcell = numpy.tile(unitcell,(len(frames),1))
+        elif(len(unitcell.shape) == 2 and unitcell.shape[1] == 6 and unitcell.shape[0] == self._coor.shape[0]):
+            unitcell = unitcell[frames]
+        else:
+            raise Exception, 'the unit cell must hold 6 values or 6 values for each of the '+str(self._coor.shape[0])+' frames'
+
+        blocks = unitcell[:,[0,5,1,4,3,2]]
+        blocks[:,[1,3,4]] = numpy.cos(numpy.radians(blocks[:,[1,3,4]]))
+
+        return blocks
+
+    def read_dcd_unitcells(self,filename):
+        '''
+        This method reads the unit cells of all frames of a DCD file and
+        returns them as an (nframes,6) array (see dcd_unitcell), or None
+        if the file has no unit cells.
+        '''
+
+        infile = utilities.open_file(filename,'rb')
+        layout = self.read_dcd_layout(infile)
+
+        if(not (layout['charmm'] & DCD_IS_CHARMM) or not (layout['charmm'] & DCD_HAS_EXTRA_BLOCK)):
+            infile.close()
+            return None
+
+        number_of_frames = self.dcd_number_of_frames(filename,layout)
+        blocks = numpy.zeros((number_of_frames,6),numpy.float)
+
+        for i in xrange(number_of_frames):
+            infile.seek(self.dcd_frame_offset(layout,i)+4)
+            blocks[i] = numpy.frombuffer(infile.read(DCD_EXTRA_BLOCK_SIZE),layout['endian']+'f8')
+
+        infile.close()
+
+        return self.dcd_unitcell(layout,blocks)
+
+    def read_dcd_fixed_atoms(self,infile,layout,number_of_frames):
+        '''
+        This method returns the float32 (natoms,3) coordinates of the first
+        frame of a DCD file with fixed atoms, which supply the fixed atoms
+        of the other frames, or None if the file has no fixed atoms.
+        '''
+
+        if(layout['free_indexes'] is None or number_of_frames == 0):
+            return None
+
+        first_coor = numpy.zeros((layout['natoms'],3),numpy.float32)
+        self.read_dcd_frame(infile,layout,0,first_coor,None)
+
+        return first_coor
+
+    def read_dcd_frame(self,infile,layout,frame,coor,first_coor,unitcell=None):
+        '''
+        This method seeks to frame (counting from 0) of a DCD file object
+        and reads it into the float32 (natoms,3) array coor.  first_coor
+        is the first frame of a file with fixed atoms (see
+        read_dcd_fixed_atoms) or None.  The unit cell block of the frame
+        is stored in unitcell if it is given (see read_dcd_stream_step).
+        '''
+
+        if(first_coor is not None):
+            coor[:] = first_coor
+
+        if(frame == 0):
+            layout.pop('first_frame_read',None)
+        else:
+            layout['first_frame_read'] = True
+
+        infile.seek(self.dcd_frame_offset(layout,frame))
+        self.read_dcd_stream_step(infile,layout,coor,unitcell)
+
+        return
+
+    def iterate_dcd(self,filename,**kwargs):
+        '''
+        This method is a generator over the frames of a DCD file.
+
+        Frames start, start+step, ... up to (not including) stop are
+        read one at a time (kwargs start=0, stop=number of frames,
+        step=1).  Without chunk each frame is yielded as a (natoms,3)
+        array; with chunk=n the frames are yielded in (n,natoms,3) arrays,
+        the last one holding the remaining frames.  While iterating coor()
+        holds the current frame or chunk, so the other methods of the
+        molecule can be used on it with frame=0..n-1.
+
+        The same buffer is filled and yielded every time, so memory use
+        does not depend on the length of the trajectory; copy a frame
+        to keep it.
+
+        With prefetch=n a background thread reads up to n frames (or
+        chunks) ahead into a ring of n+1 buffers while the caller works on
+        the current one (see prefetch_dcd_chunks).  A yielded buffer is
+        only refilled after the loop has moved on to the next one.
+
+        >>> for coor in molecule.iterate_dcd('run_0.dcd',chunk=100,step=10):
+        ...     print(coor.shape)
+        '''
+
+        start = 0 ; stop = None ; step = 1 ; chunk = None ; prefetch = 0
+
+        if 'start' in kwargs:
+            start = kwargs['start']
+        if 'stop' in kwargs:
+            stop = kwargs['stop']
+        if 'step' in kwargs:
+            step = kwargs['step']
+        if 'chunk' in kwargs:
+            chunk = kwargs['chunk']
+        if 'prefetch' in kwargs:
+            prefetch = kwargs['prefetch']
+
+        if(step < 1):
+            raise Exception, 'step must be a positive number: '+str(step)
+        if(chunk is not None and chunk < 1):
+            raise Exception, 'chunk must be a positive number: '+str(chunk)
+
+        infile = utilities.open_file(filename,'rb')
+        filled_buffers = None
+
+        try:
+            layout = self.read_dcd_layout(infile)
+
+            number_of_frames = self.dcd_number_of_frames(filename,layout)
+
+            if(stop is None or stop > number_of_frames):
+                stop = number_of_frames
+
+            first_coor = self.read_dcd_fixed_atoms(infile,layout,number_of_frames)
+
+            if chunk is None:
+                chunks = [xrange(frame,frame+1) for frame in xrange(start,stop,step)]
+            else:
+                chunks = [xrange(first,min(first+step*chunk,stop),step) for first in xrange(start,stop,step*chunk)]
+
+            if(prefetch > 0):
+                filled_buffers = self.prefetch_dcd_chunks(infile,layout,chunks,first_coor,prefetch)
+            else:
+                filled_buffers = self.read_dcd_chunks(infile,layout,chunks,first_coor,1)
+
+            for buffer,count in filled_buffers:
+                self._coor = buffer[:count]
+                if chunk is None:
+                    yield buffer[0]
+                else:
+                    yield buffer[:count]
+
+        finally:
+            if filled_buffers is not None:
+                filled_buffers.close()
+            infile.close()
+
+        return
+
+    def read_dcd_chunks(self,infile,layout,chunks,first_coor,number_of_buffers):
+        '''
+        This method is a generator that reads each list of frames in chunks
+        into a float (chunk,natoms,3) buffer and yields the buffer and the
+        number of frames in it.  The buffers are taken in turn from a ring
+        of number_of_buffers buffers.  first_coor is the first frame of a
+        file with fixed atoms (see read_dcd_fixed_atoms) or None.
+        '''
+
+        natoms = layout['natoms']
+        size = max([len(frames) for frames in chunks]+[1])
+
+        buffers = [numpy.zeros((size,natoms,3),numpy.float) for i in xrange(number_of_buffers)]
+        this_coor = numpy.zeros((natoms,3),numpy.float32)
+
+        for i in xrange(len(chunks)):
+            buffer = buffers[i%number_of_buffers]
+            count = 0
+            for frame in chunks[i]:
+                self.read_dcd_frame(infile,layout,frame,this_coor,first_coor)
+                buffer[count] = this_coor
+                count += 1
+            yield buffer,count
+
+        return
+
+    def prefetch_dcd_chunks(self,infile,layout,chunks,first_coor,prefetch):
+        '''
+        This method yields the same buffers as read_dcd_chunks, but they are
+        read by a background thread that stays up to prefetch chunks
+        ahead of the caller.  The thread reads the file with python file
+        objects, which release the GIL while waiting for the disk.
+        '''
+
+        ready = Queue.Queue(prefetch)
+        consumed = threading.Semaphore(prefetch)
+        stopped = threading.Event()
+
+        def read_ahead():
+            try:
+                for buffer,count in self.read_dcd_chunks(infile,layout,chunks,first_coor,prefetch+1):
+                    consumed.acquire()
+                    if stopped.is_set():
+                        return
+                    ready.put((buffer,count))
+                ready.put(None)
+            except Exception as error:
+                ready.put(error)
+
+        reader = threading.Thread(target=read_ahead)
+        reader.daemon = True
+        reader.start()
+
+        try:
+            while True:
+                item = ready.get()
+                if item is None:
+                    break
+                elif isinstance(item,Exception):
+                    raise item
+                yield item
+                consumed.release()
+        finally:
+            stopped.set()
+            consumed.release()
+            while reader.is_alive():
+                try:
+                    ready.get(timeout=0.01)
+                except Queue.Empty:
+                    pass
+            reader.join()
+
+        return
+
+    def read_dcd_stream_step(self,infile,layout,coor,unitcell=None):
+        '''
+        This method reads the next frame from a DCD file object into the
+        float32 (natoms,3) array coor, given the layout of the file
+        (see read_dcd_layout).
+
+        Frames after the first one of a file with fixed atoms only hold
+        the free atoms; the fixed atoms keep the values already in coor.
+
+        If the file has unit cells and unitcell is an array of 6 floats
+        the unit cell block of the frame is stored in it as it is found
+        in the file (see dcd_unitcell).
+        '''
+
+        endian = layout['endian']
+        charmm = layout['charmm']
+
+        if((charmm & DCD_IS_CHARMM) and (charmm & DCD_HAS_EXTRA_BLOCK)):
+            block = self.read_dcd_record(infile,endian)
+            if(unitcell is not None):
+                unitcell[:] = numpy.frombuffer(block,endian+'f8',6)
+
+        if('first_frame_read' in layout and layout['free_indexes'] is not None):
+            atoms = layout['free_indexes']
+        else:
+            atoms = slice(None)
+
+        for i in xrange(3):
+            coor[atoms,i] = numpy.fromstring(self.read_dcd_record(infile,endian),dtype=endian+'f4')
+
+        if((charmm & DCD_IS_CHARMM) and (charmm & DCD_HAS_4DIMS)):
+            self.read_dcd_record(infile,endian)
+
+        layout['first_frame_read'] = True
+
+        return
+
+    def read_dcd_stream(self,infile):
+        '''
+        This method reads all frames of a DCD file from a binary file object
+        (for instance a decompressing stream) into coor().
+        '''
+
+        layout = self.read_dcd_layout(infile)
+
+        nset = layout['nset'] ; nnatoms = layout['natoms']
+
+        coor=numpy.zeros((nset,nnatoms,3),numpy.float)
+        this_coor=numpy.zeros((nnatoms,3),numpy.float32)
+        unitcell=numpy.zeros((nset,6),numpy.float)
+
+        for i in xrange(nset):
+            print('.',)
+            sys.stdout.flush()
+
+            self.read_dcd_stream_step(infile,layout,this_coor,unitcell[i])
+            coor[i]=this_coor
+
+        self._coor=coor
+        self._unitcell=self.dcd_unitcell(layout,unitcell)
 
         print()
 
         return
 
+    def write_dcd_stream_header(self,outfile,natoms,nset,istart=0,nsavc=1,delta=1.0,unitcell=False):
+        '''
+        This method writes a DCD header to a binary file object with the
+        same layout as write_dcdheader in the dcdio C module.
+
+        With unitcell=True a CHARMM (version 24) header is written instead,
+        announcing a unit cell block before the coordinates of every frame.
+        '''
+
+        if(unitcell):
+            header = struct.pack('=i4s9ifi8iii',84,'CORD',nset,istart,nsavc,nset,0,0,0,0,0,delta,1,0,0,0,0,0,0,0,0,24,84)
+        else:
+            header = struct.pack('=i4s3i6id9ii',84,'CORD',nset,istart,nsavc,nset,0,0,0,0,0,delta,0,0,0,0,0,0,0,0,0,84)
+
+        remarks = string.ljust('REMARKS FILENAME=A.DCD :: SASSIE',80)[:80]
+        remarks += string.ljust('REMARKS DATE: '+time.strftime('%m/%d/%y')+' CREATED BY USER: ikuo',80)[:80]
+
+        header += struct.pack('=ii',164,2) + remarks + struct.pack('=i',164)
+        header += struct.pack('=iii',4,natoms,4)
+
+        outfile.write(header)
+
+        return
+
+    def write_dcd_stream_step(self,outfile,frame):
+        '''
+        This method writes one frame as float32 x, y and z records to a
+        binary file object.
+        '''
+
+        outfile.write(self.dcd_frame_records(self._coor[frame:frame+1],self.dcd_unitcell_blocks([frame])).tostring())
+
+        return
+
+    def write_dcd_stream(self,outfile,start,end,**kwargs):
+        '''
+        This method writes frames start to end-1 as a DCD file to a binary
+        file object (for instance a compressing stream).
+
+        The records of up to DCD_BLOCK_SIZE coordinates are assembled in
+        one array, converting the coordinates to float32 on the way, and
+        written with a single call (see dcd_frame_records).  A function
+        given as progress=function is called with the number of frames
+        written and the number of frames to write after each block.
+
+        If the molecule has a unit cell (see unitcell) a CHARMM file with
+        a unit cell block in every frame is written.
+        '''
+
+        progress = None
+
+        if 'progress' in kwargs:
+            progress = kwargs['progress']
+
+        natoms = self._coor[0,:,0].shape[0]
+        nset = end-start
+
+        unitcell = self.dcd_unitcell_blocks(range(start,end))
+
+        self.write_dcd_stream_header(outfile,natoms,nset,unitcell=(unitcell is not None))
+
+        frames_per_block = max(1,DCD_BLOCK_SIZE//(3*natoms))
+
+        for first in xrange(start,end,frames_per_block):
+            last = min(first+frames_per_block,end)
+            if(unitcell is not None):
+                records = self.dcd_frame_records(self._coor[first:last],unitcell[first-start:last-start])
+            else:
+                records = self.dcd_frame_records(self._coor[first:last])
+            outfile.write(records.tostring())
+            if progress is not None:
+                progress(last-start,nset)
+
+        return
+
+    def dcd_frame_records(self,coor,unitcell=None):
+        '''
+        This method returns the DCD records of the (nframes,natoms,3)
+        coordinates coor as one float32 array: for every frame an x, a y
+        and a z record, each framed by its length in bytes.
 
+        If the (nframes,6) unit cell blocks unitcell are given (see
+        dcd_unitcell_blocks) every frame starts with its unit cell record
+        and a structured array is returned.
+        '''
+
+        nframes,natoms = coor.shape[0],coor.shape[1]
+
+        if(unitcell is None):
+            records = numpy.empty((nframes,3,natoms+2),numpy.float32)
+            xyz = records
+        else:
+            records = numpy.empty(nframes,numpy.dtype([('start','i4'),('unitcell','f8',(6,)),('end','i4'),('xyz','f4',(3,natoms+2))]))
+            records['start'] = DCD_EXTRA_BLOCK_SIZE
+            records['unitcell'] = unitcell
+            records['end'] = DCD_EXTRA_BLOCK_SIZE
+            xyz = records['xyz']
+
+        markers = xyz.view(numpy.int32)
+        markers[:,:,0] = 4*natoms
+        markers[:,:,-1] = 4*natoms
+        xyz[:,:,1:-1] = coor.transpose(0,2,1)
+
+        return records
+
+class DCD_Writer(object):
+
+    '''
+    DCD_Writer keeps a DCD file open and writes frames of a molecule to it.
+
+    With flag='w' a new file is started; with flag='a' frames are added to
+    the end of an existing file (a new one is started if there is none).
+    A partial frame left at the end of the file, for instance by a run
+    that crashed, is cut off first.  The number of frames (NSET) and
+    the last step (NSTEP) in the header are updated whenever the writer
+    is flushed or closed, so the file can be read up to the last flush
+    even if the program stops before close is called.
+
+    If the molecule has a unit cell (see unitcell) a new file gets a unit
+    cell block in every frame.  Frames can be appended to a file with
+    unit cells only if the molecule has a unit cell; the unit cell of a
+    molecule is not written to an existing file without them.  Files with
+    fixed atoms or a fourth dimension can not be appended to.
+
+    >>> writer = dcd_io.DCD_Writer(molecule,'ensemble.dcd','a')
+    >>> for step in xrange(number_of_steps):
+    ...     do_monte_carlo_step(molecule)
+    ...     writer.write_frame(0)
+    ...     writer.flush()
+    >>> writer.close()
+    '''
+
+    def __init__(self,molecule,filename,flag='w'):
+
+        if(utilities.compression_type(filename,'w') is not None):
+            raise Exception, 'DCD_Writer can not write compressed files: '+filename
+
+        self._molecule = molecule
+        self._natoms = molecule._coor.shape[1]
+
+        if((flag=='a' or flag=='A') and os.path.isfile(filename) and os.path.getsize(filename) > 0):
+            self._outfile = open(filename,'r+b')
+            layout = molecule.read_dcd_layout(self._outfile)
+
+            if(layout['natoms'] != self._natoms):
+                self._outfile.close()
+                raise Exception, filename+' has '+str(layout['natoms'])+' atoms but the molecule has '+str(self._natoms)
+            if(layout['namnf'] != 0 or (layout['charmm'] & DCD_HAS_4DIMS)):
+                self._outfile.close()
+                raise Exception, 'can not append to a dcd file with fixed atoms or 4 dimensions: '+filename
+
+            self._unitcell = bool((layout['charmm'] & DCD_IS_CHARMM) and (layout['charmm'] & DCD_HAS_EXTRA_BLOCK))
+            if(self._unitcell and getattr(molecule,'_unitcell',None) is None):
+                self._outfile.close()
+                raise Exception, 'can not append frames without a unit cell to a dcd file with unit cells: '+filename
+
+            self._endian = layout['endian']
+            self._istart = layout['istart'] ; self._nsavc = layout['nsavc']
+            self._nset = molecule.dcd_number_of_frames(filename,layout)
+
+            self._outfile.truncate(molecule.dcd_frame_offset(layout,self._nset))
+            self._outfile.seek(0,os.SEEK_END)
+        elif(flag=='w' or flag=='W' or flag=='a' or flag=='A'):
+            self._outfile = open(filename,'w+b')
+            self._endian = '='
+            self._istart = 0 ; self._nsavc = 1
+            self._nset = 0
+            self._unitcell = getattr(molecule,'_unitcell',None) is not None
+            molecule.write_dcd_stream_header(self._outfile,self._natoms,0,self._istart,self._nsavc,unitcell=self._unitcell)
+        else:
+            raise Exception, 'flag must be "w" or "a" to write '+filename
+
+        self.flush()
+
+    def number_of_frames(self):
+        '''
+        Return the number of frames in the file, including those not yet flushed
+        '''
+
+        return self._nset
+
+    def write_frames(self,frames):
+        '''
+        Append the given frames of the molecule to the file, in blocks of
+        up to DCD_BLOCK_SIZE coordinates
+        '''
+
+        coor = self._molecule._coor
+
+        if(coor.shape[1] != self._natoms):
+            raise Exception, 'the molecule has '+str(coor.shape[1])+' atoms but the file has '+str(self._natoms)
+
+        frames = list(frames)
+        frames_per_block = max(1,DCD_BLOCK_SIZE//(3*self._natoms))
+
+        for first in xrange(0,len(frames),frames_per_block):
+            block = frames[first:first+frames_per_block]
+            if(self._unitcell):
+                records = self._molecule.dcd_frame_records(coor[block],self._molecule.dcd_unitcell_blocks(block))
+            else:
+                records = self._molecule.dcd_frame_records(coor[block])
+            if(self._endian == '>' and sys.byteorder == 'little') or (self._endian == '<' and sys.byteorder == 'big'):
+                records = records.byteswap()
+            self._outfile.write(records.tostring())
+            self._nset += len(block)
+
+        return
+
+    def write_frame(self,frame):
+        '''
+        Append a single frame of the molecule to the file
+        '''
+
+        self.write_frames([frame])
+
+        return
+
+    def flush(self):
+        '''
+        Write the number of frames and the last step to the header and
+        flush the file, leaving a complete DCD file on disk
+        '''
+
+        self._outfile.seek(8)
+        self._outfile.write(struct.pack(self._endian+'i',self._nset))
+        self._outfile.seek(20)
+        self._outfile.write(struct.pack(self._endian+'i',self._istart+self._nset*self._nsavc))
+        self._outfile.seek(0,os.SEEK_END)
+        self._outfile.flush()
+
+        return
+
+    def close(self):
+        '''
+        Update the header and close the file
+        '''
+
+        self.flush()
+        self._outfile.close()
+
+        return
+
+class DCD_Trajectory(object):
+
+    '''
+    DCD_Trajectory presents an ordered list of DCD files as one trajectory.
+
+    The headers of all files are read when the trajectory is created and
+    the files must have the same number of atoms.  Frames are numbered
+    from 0 across all files and each frame is read by seeking to it in
+    its file (see DCD.read_dcd_frame).  Files are opened when a frame in
+    them is first needed and at most max_open_files (default 16) are kept
+    open; the least recently used one is closed first.
+
+    >>> trajectory = dcd_io.DCD_Trajectory(['run_0.dcd','run_1.dcd'])
+    >>> molecule.setCoor(trajectory.read_frames(range(0,trajectory.number_of_frames(),10)))
+    >>> trajectory.close()
+    '''
+
+    def __init__(self,filenames,**kwargs):
+
+        self._max_open_files = 16
+
+        if 'max_open_files' in kwargs:
+            self._max_open_files = max(1,kwargs['max_open_files'])
+
+        self._dcd = DCD()
+        self._filenames = list(filenames)
+        self._layouts = []
+        self._open_files = collections.OrderedDict()
+
+        if(len(self._filenames) == 0):
+            raise Exception, 'a trajectory needs at least one dcd file'
+
+        frames_per_file = []
+
+        for filename in self._filenames:
+            infile = utilities.open_file(filename,'rb')
+            layout = self._dcd.read_dcd_layout(infile)
+            infile.close()
+            if(len(self._layouts) > 0 and layout['natoms'] != self._layouts[0]['natoms']):
+                raise Exception, filename+' has '+str(layout['natoms'])+' atoms but '+self._filenames[0]+' has '+str(self._layouts[0]['natoms'])
+            self._layouts.append(layout)
+            frames_per_file.append(self._dcd.dcd_number_of_frames(filename,layout))
+
+        self._first_frames = numpy.concatenate([[0],numpy.cumsum(frames_per_file)])
+
+    def natoms(self):
+
+        return self._layouts[0]['natoms']
+
+    def number_of_frames(self):
+
+        return int(self._first_frames[-1])
+
+    def filenames(self):
+
+        return self._filenames
+
+    def locate_frame(self,frame):
+        '''
+        Return the number of the file holding frame and the number of the frame within that file
+        '''
+
+        if(frame < 0 or frame >= self.number_of_frames()):
+            raise Exception, 'frame '+str(frame)+' is not in the trajectory which has '+str(self.number_of_frames())+' frame(s)'
+
+        file_number = int(numpy.searchsorted(self._first_frames,frame,'right'))-1
+
+        return file_number,frame-int(self._first_frames[file_number])
+
+    def _open_file(self,file_number):
+        '''
+        Return the open file object and the fixed atom coordinates of a file,
+        opening it (and closing the least recently used file) if needed
+        '''
+
+        if file_number in self._open_files:
+            open_file = self._open_files.pop(file_number)
+        else:
+            if(len(self._open_files) >= self._max_open_files):
+                oldest_file_number,oldest_file = self._open_files.popitem(last=False)
+                oldest_file[0].close()
+            layout = self._layouts[file_number]
+            infile = utilities.open_file(self._filenames[file_number],'rb')
+            number_of_frames = int(self._first_frames[file_number+1]-self._first_frames[file_number])
+            open_file = (infile,self._dcd.read_dcd_fixed_atoms(infile,layout,number_of_frames))
+
+        self._open_files[file_number] = open_file
+
+        return open_file
+
+    def read_frame(self,frame,coor=None):
+        '''
+        Read a frame into the float32 (natoms,3) array coor (a new one if
+        not given) and return it
+        '''
+
+        if coor is None:
+            coor = numpy.zeros((self.natoms(),3),numpy.float32)
+
+        file_number,file_frame = self.locate_frame(frame)
+        infile,first_coor = self._open_file(file_number)
+
+        self._dcd.read_dcd_frame(infile,self._layouts[file_number],file_frame,coor,first_coor)
+
+        return coor
+
+    def read_frames(self,frames):
+        '''
+        Return the given frames as a (nframes,natoms,3) array, as read_dcd_frames does for a single file
+        '''
+
+        if(isinstance(frames,(int,long,numpy.integer))):
+            frames = [frames]
+
+        coor = numpy.zeros((len(frames),self.natoms(),3),numpy.float)
+        this_coor = numpy.zeros((self.natoms(),3),numpy.float32)
+
+        for i in xrange(len(frames)):
+            self.read_frame(frames[i],this_coor)
+            coor[i] = this_coor
+
+        return coor
+
+    def __len__(self):
+
+        return self.number_of_frames()
+
+    def __iter__(self):
+
+        this_coor = numpy.zeros((self.natoms(),3),numpy.float32)
+
+        for frame in xrange(self.number_of_frames()):
+            yield self.read_frame(frame,this_coor)
+
+    def close(self):
+        '''
+        Close the files that are open
+        '''
+
+        for infile,first_coor in self._open_files.values():
+            infile.close()
+
+        self._open_files.clear()
+
+        return
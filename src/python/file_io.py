@@ -26,6 +26,8 @@ import locale
 import time
 import sasmol.pdb_io as pdb_io
 import sasmol.dcd_io as dcd_io
+import sasmol.mmcif_io as mmcif_io
+import sasmol.sct_io as sct_io
 
 #	FILE_IO
 #
@@ -47,7 +49,7 @@ import sasmol.dcd_io as dcd_io
 
 '''
 
-class Files(pdb_io.PDB, dcd_io.DCD):
+class Files(pdb_io.PDB, dcd_io.DCD, mmcif_io.MMCIF, sct_io.SCT):
 
     def __init__(self,filename,flag):
         pass
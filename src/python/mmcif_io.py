@@ -0,0 +1,380 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+#from __future__ import unicode_literals
+#
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+import os
+import re
+import numpy
+import sasmol.utilities as utilities
+
+#	MMCIF_IO
+#
+#
+#LC	 1         2         3         4         5         6         7
+#LC4567890123456789012345678901234567890123456789012345678901234567890123456789
+#								       *      **
+'''
+	MMCIF_IO contains the class that reads and writes the atom_site
+	records of macromolecular crystallographic information (mmCIF / PDBx)
+	files from and to the hard disk.
+
+	Unlike the fixed-column PDB format there is no limit on the number
+	of atoms, residue numbers or chain names, so very large systems can
+	be written and read back without renumbering.
+
+	http://mmcif.wwpdb.org/dictionaries/mmcif_pdbx_v50.dic/Categories/atom_site.html
+
+    These classes are accessed by the Atom class found in
+    the sasmol.system module through the file_io File() class.
+'''
+
+MMCIF_TOKEN = re.compile(r"""'(.*?)'(?=\s|$)|"(.*?)"(?=\s|$)|(\S+)""")
+
+MMCIF_CHUNK_SIZE = 65536
+
+MMCIF_ATOM_SITE = ['group_PDB','id','type_symbol','label_atom_id','label_alt_id',
+                   'label_comp_id','label_asym_id','label_seq_id','pdbx_PDB_ins_code',
+                   'Cartn_x','Cartn_y','Cartn_z','occupancy','B_iso_or_equiv',
+                   'pdbx_formal_charge','auth_seq_id','auth_comp_id','auth_asym_id',
+                   'auth_atom_id','pdbx_PDB_model_num']
+
+class MMCIF(object):
+
+    def read_mmcif(self,filename,**kwargs):
+        '''
+        This method reads the _atom_site loop of a mmCIF file and fills
+        in the same attributes as read_pdb.
+
+        The file is streamed one line at a time and the records of each
+        column are collected in blocks that are converted to numpy arrays,
+        so memory use is proportional to the number of atoms.  Models after
+        the first (pdbx_PDB_model_num) only contribute coordinates.
+
+        The auth_* identifiers are used for atom name, residue name,
+        residue number and chain, label_asym_id is used as segname.
+        '''
+
+        infile = utilities.open_file(filename,'r')
+
+        loop_names = None ; columns = None
+        names = None ; wanted = [] ; model_column = None
+        chunks = [] ; block = None ; row = []
+        frame_coor = [] ; x = [] ; y = [] ; z = []
+        first_model = None ; this_model = None
+
+        for line in infile:
+            line = line.strip()
+            if(len(line) == 0 or line[0] == '#'):
+                continue
+            elif(line[:5].lower() == 'loop_'):
+                if names is not None:
+                    break
+                loop_names = []
+                continue
+            elif(loop_names is not None and line[0] == '_'):
+                loop_names.append(line.split()[0])
+                continue
+            elif(loop_names is not None):
+                if(len(loop_names) > 0 and loop_names[0].startswith('_atom_site.')):
+                    names = [name[len('_atom_site.'):] for name in loop_names]
+                    wanted = [i for i in xrange(len(names)) if names[i] in MMCIF_ATOM_SITE]
+                    x_column = names.index('Cartn_x') ; y_column = names.index('Cartn_y') ; z_column = names.index('Cartn_z')
+                    if 'pdbx_PDB_model_num' in names:
+                        model_column = names.index('pdbx_PDB_model_num')
+                    block = [[] for i in wanted]
+                loop_names = None
+            elif(names is not None and (line[0] == '_' or line[:5].lower() == 'data_')):
+                break
+
+            if names is None:
+                continue
+
+            if(line[0] == ';'):
+                raise Exception, 'multi-line text fields are not supported in the _atom_site loop'
+            elif("'" in line or '"' in line):
+                tokens = [match.group(match.lastindex) for match in MMCIF_TOKEN.finditer(line)]
+            else:
+                tokens = line.split()
+
+            if(len(row) == 0 and len(tokens) == len(names)):
+                rows = [tokens]
+            else:
+                row.extend(tokens)
+                rows = []
+                while(len(row) >= len(names)):
+                    rows.append(row[:len(names)])
+                    row = row[len(names):]
+
+            for this_row in rows:
+                if model_column is not None:
+                    model = this_row[model_column]
+                else:
+                    model = '1'
+
+                if(first_model is None):
+                    first_model = model ; this_model = model
+                elif(model != this_model):
+                    frame_coor.append(self._mmcif_frame(x,y,z))
+                    x = [] ; y = [] ; z = []
+                    this_model = model
+
+                x.append(this_row[x_column]) ; y.append(this_row[y_column]) ; z.append(this_row[z_column])
+
+                if(model == first_model and len(frame_coor) == 0):
+                    for j in xrange(len(wanted)):
+                        block[j].append(this_row[wanted[j]])
+                    if(len(block[0]) == MMCIF_CHUNK_SIZE):
+                        chunks.append([numpy.array(values) for values in block])
+                        block = [[] for i in wanted]
+
+        infile.close()
+
+        if names is None or first_model is None:
+            raise Exception, 'no _atom_site records found in mmCIF file: '+filename
+        elif(len(row) > 0):
+            raise Exception, 'incomplete _atom_site record in mmCIF file: '+filename
+
+        frame_coor.append(self._mmcif_frame(x,y,z))
+        x = [] ; y = [] ; z = []
+
+        if(len(block[0]) > 0 or len(chunks) == 0):
+            chunks.append([numpy.array(values) for values in block])
+        block = None
+
+        natoms = len(frame_coor[0])
+        if not all(len(this_coor) == natoms for this_coor in frame_coor):
+            raise Exception, 'number of atoms per frame is not equal'
+
+        columns = {}
+        for j in xrange(len(wanted)):
+            columns[names[wanted[j]]] = numpy.concatenate([chunk[j] for chunk in chunks])
+        chunks = []
+
+        def column(keys,default):
+            for key in keys:
+                if key in columns:
+                    return columns[key]
+            return numpy.array([default]*natoms)
+
+        def missing(values,default):
+            return numpy.where((values == '?') | (values == '.'),default,values)
+
+        atom = column(['group_PDB'],'ATOM')
+        original_index = missing(column(['id'],'0'),'0').astype(numpy.int)
+        index = numpy.arange(1,natoms+1,dtype=numpy.int)
+        name = column(['auth_atom_id','label_atom_id'],'')
+        loc = missing(column(['label_alt_id'],'.'),' ')
+        resname = column(['auth_comp_id','label_comp_id'],'')
+        chain = missing(column(['auth_asym_id','label_asym_id'],'?'),' ')
+        resid = missing(column(['auth_seq_id','label_seq_id'],'0'),'0').astype(numpy.int)
+        rescode = missing(column(['pdbx_PDB_ins_code'],'?'),' ')
+        occupancy = missing(column(['occupancy'],'?'),'1.00')
+        beta = missing(column(['B_iso_or_equiv'],'?'),'0.00')
+        segname = column(['label_asym_id'],'?')
+        segname = numpy.where((segname == '?') | (segname == '.'),chain,segname)
+        element = missing(column(['type_symbol'],'?'),'  ')
+        charge = self._mmcif_charge_to_pdb(missing(column(['pdbx_formal_charge'],'?'),'0'))
+        moltype = self._assign_moltypes(resname)
+
+        coor = numpy.zeros((len(frame_coor),natoms,3),numpy.float)
+        for i in xrange(len(frame_coor)):
+            coor[i] = frame_coor[i]
+            frame_coor[i] = None
+
+        self._atom = atom.tolist() ; self._index = index ; self._original_index = original_index
+        self._name = name.tolist() ; self._loc = loc.tolist() ; self._resname = resname.tolist()
+        self._residue_flag = [False]*natoms
+        self._chain = chain.tolist() ; self._resid = resid ; self._rescode = rescode.tolist()
+        self._original_resid = resid.copy()
+        self._occupancy = occupancy.tolist() ; self._beta = beta.tolist() ; self._segname = segname.tolist()
+        self._element = element.tolist() ; self._charge = charge.tolist() ; self._moltype = moltype.tolist()
+
+        unique_names = self._first_unique(name) ; unique_resnames = self._first_unique(resname)
+        unique_resids = self._first_unique(resid) ; unique_chains = self._first_unique(chain)
+        unique_segnames = self._first_unique(segname) ; unique_occupancies = self._first_unique(occupancy)
+        unique_betas = self._first_unique(beta) ; unique_moltypes = self._first_unique(moltype)
+
+        self._number_of_names = len(unique_names) ; self._names = unique_names
+        self._number_of_resnames = len(unique_resnames) ; self._resnames = unique_resnames
+        self._number_of_resids = len(unique_resids) ; self._resids = unique_resids
+        self._number_of_chains = len(unique_chains) ; self._chains = unique_chains
+        self._number_of_segnames = len(unique_segnames) ; self._segnames = unique_segnames
+        self._number_of_occupancies = len(unique_occupancies) ; self._occupancies = unique_occupancies
+        self._number_of_betas = len(unique_betas) ; self._betas = unique_betas
+        self._number_of_moltypes = len(unique_moltypes) ; self._moltypes = unique_moltypes
+
+        self._coor = coor
+
+        if 'check_zero_coor' in kwargs:
+            self.check_for_all_zero_columns(self._coor)
+
+        unique_elements = self.element_filter()
+
+        self._number_of_elements = len(unique_elements) ; self._elements = unique_elements
+
+        self._natoms = natoms
+
+        total_mass = self.calculate_mass()
+
+        self._header = []
+        self._conect = {}
+
+        return
+
+    def _mmcif_frame(self,x,y,z):
+        '''
+        Convert the coordinate strings of one model to a float32 (natoms,3) array
+        '''
+
+        this_coor = numpy.zeros((len(x),3),numpy.float32)
+        this_coor[:,0] = numpy.array(x,numpy.float32)
+        this_coor[:,1] = numpy.array(y,numpy.float32)
+        this_coor[:,2] = numpy.array(z,numpy.float32)
+
+        return this_coor
+
+    def _mmcif_charge_to_pdb(self,charge):
+        '''
+        Convert integer pdbx_formal_charge values to the PDB style ('2+', '1-', '  ')
+        '''
+
+        unique_charges,inverse = numpy.unique(charge,return_inverse=True)
+
+        pdb_charges = []
+        for value in unique_charges:
+            value = int(value)
+            if(value > 0):
+                pdb_charges.append(str(value)+'+')
+            elif(value < 0):
+                pdb_charges.append(str(-value)+'-')
+            else:
+                pdb_charges.append('  ')
+
+        return numpy.array(pdb_charges)[inverse]
+
+    def _mmcif_charge_from_pdb(self,charge):
+        '''
+        Convert PDB style charges ('2+', '1-', '  ') to pdbx_formal_charge values
+        '''
+
+        unique_charges,inverse = numpy.unique(charge,return_inverse=True)
+
+        mmcif_charges = []
+        for value in unique_charges:
+            value = value.strip()
+            if(len(value) > 1 and value[-1] in '+-' and value[:-1].isdigit()):
+                mmcif_charges.append(str(int(value[:-1])*(-1 if value[-1] == '-' else 1)))
+            elif(len(value) > 1 and value[0] in '+-' and value[1:].isdigit()):
+                mmcif_charges.append(str(int(value)))
+            else:
+                mmcif_charges.append('?')
+
+        return numpy.array(mmcif_charges)[inverse]
+
+    def _mmcif_values(self,values,default='?'):
+        '''
+        Return values as mmCIF tokens: blank entries become default and
+        entries that would not read back as a single token are quoted
+        '''
+
+        unique_values,inverse = numpy.unique(numpy.asarray(values),return_inverse=True)
+
+        tokens = []
+        for value in unique_values:
+            value = value.strip()
+            if(len(value) == 0):
+                tokens.append(default)
+            elif(' ' in value or "'" in value or '"' in value or value[0] in '_#$;[]' or value in ('?','.') or value[:5].lower() in ('data_','loop_','save_')):
+                if("'" in value):
+                    tokens.append('"'+value+'"')
+                else:
+                    tokens.append("'"+value+"'")
+            else:
+                tokens.append(value)
+
+        return numpy.array(tokens)[inverse]
+
+    def write_mmcif(self,filename,frame,**kwargs):
+        '''
+        This method writes a single frame to a mmCIF file
+
+        Indices, residue numbers and chain names are written as they are,
+        without the field-width limits of write_pdb.
+        '''
+
+        return self.write_mmcif_frames(filename,frame,frame+1,**kwargs)
+
+    def write_mmcif_frames(self,filename,start,end,**kwargs):
+        '''
+        This method writes frames start to end-1 to a single mmCIF file,
+        one pdbx_PDB_model_num per frame.
+
+        The atom_site columns that do not change between frames are
+        formatted once and the rows are written in blocks of
+        MMCIF_CHUNK_SIZE atoms.
+        '''
+
+        result = 1
+
+        natoms = self._natoms
+        data_name = os.path.basename(filename).split('.')[0]
+        if(len(data_name) == 0 or ' ' in data_name):
+            data_name = 'sasmol'
+
+        atom = self._mmcif_values(self._atom,'ATOM')
+        index = numpy.char.mod('%d',numpy.asarray(self._index))
+        element = self._mmcif_values(self._element)
+        name = self._mmcif_values(self._name)
+        loc = self._mmcif_values(self._loc,'.')
+        resname = self._mmcif_values(self._resname)
+        segname = self._mmcif_values(self._segname)
+        resid = numpy.char.mod('%d',numpy.asarray(self._resid))
+        rescode = self._mmcif_values(self._rescode)
+        occupancy = self._mmcif_values(self._occupancy,'1.00')
+        beta = self._mmcif_values(self._beta,'0.00')
+        charge = self._mmcif_charge_from_pdb(numpy.asarray(self._charge))
+        chain = self._mmcif_values(self._chain)
+
+        before = [atom,index,element,name,loc,resname,segname,resid,rescode]
+        after = [occupancy,beta,charge,resid,resname,chain,name]
+
+        outfile = utilities.open_file(filename,'w')
+
+        outfile.write('data_'+data_name+'\n#\nloop_\n')
+        outfile.write(''.join(['_atom_site.'+column+'\n' for column in MMCIF_ATOM_SITE]))
+
+        for frame in xrange(start,end):
+            model = str(frame-start+1)
+            for first in xrange(0,natoms,MMCIF_CHUNK_SIZE):
+                last = min(first+MMCIF_CHUNK_SIZE,natoms)
+                coor = self._coor[frame,first:last]
+                fields = [values[first:last] for values in before]
+                fields += [numpy.char.mod('%.3f',coor[:,i]) for i in xrange(3)]
+                fields += [values[first:last] for values in after]
+                line = fields[0]
+                for values in fields[1:]:
+                    line = numpy.char.add(numpy.char.add(line,' '),values)
+                line = numpy.char.add(line,' '+model+'\n')
+                outfile.write(''.join(line.tolist()))
+
+        outfile.write('#\n')
+        outfile.close()
+
+        return result
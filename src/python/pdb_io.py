@@ -19,10 +19,21 @@ from __future__ import print_function
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
+import os
 import sys
 import string
 import locale
+import struct
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.sharedctypes
 import numpy
+import sasmol.utilities as utilities
+
+PDB_CACHE_MAGIC = 'SASMOL PDB CACHE\n'
+
+PDB_CACHE_VERSION = 2
 
 #	PDB_IO
 #
@@ -50,6 +61,9 @@ import numpy
 
 class PDB(object):
 
+    # elements inferred by get_element, keyed by (atom name, resname) and shared by all molecules
+    element_table = {}
+
     def print_error(self,name,my_message):
 
         error = []
@@ -76,21 +90,22 @@ class PDB(object):
         
         Filter element list... 
         '''
-        unique_elements = []
+        unique_elements = [] ; seen_elements = set()
         error = []
         single_atom_names = ['H','F','B','D','C','N','O','S','P','I','K','U','V','W','Y']
 
         for i in range(len(self._name)):
-            name = self._name[i].upper()
-            resname = self._resname[i].upper()
             if (self._element[i]=='' or self._element[i]==' ' or self._element[i]=='  '):
+                name = self._name[i].upper()
+                resname = self._resname[i].upper()
                 natoms = len(self._name[i])
                 error,self._element[i] = self.get_element(name,resname)
                 self.check_error(error)
 #
 ###	OPEN	Error exception handling stub
 #
-            if(self._element[i] not in unique_elements): 
+            if(self._element[i] not in seen_elements):
+                seen_elements.add(self._element[i])
                 unique_elements.append(self._element[i])
 
         return unique_elements
@@ -99,6 +114,67 @@ class PDB(object):
         '''
         Get elment from charmm27 atom name list plus extras from periodic table
         and resolve name conflicts	
+
+        Elements that are found are remembered in PDB.element_table so that
+        each (name,resname) pair is only resolved once.
+        '''
+
+        key = (name,resname)
+        if key in PDB.element_table:
+            return [],PDB.element_table[key]
+
+        error,element_name = self.infer_element(name,resname)
+
+        if(len(error) == 0):
+            PDB.element_table[key] = element_name
+
+        return error,element_name
+
+    def save_element_table(self,filename):
+        '''
+        Save the elements remembered by get_element to a JSON file as a
+        list of [name, resname, element] entries
+        '''
+
+        element_table = [[name,resname,element_name] for (name,resname),element_name in sorted(PDB.element_table.items())]
+
+        outfile = open(filename,'w')
+        json.dump(element_table,outfile)
+        outfile.close()
+
+        return
+
+    def load_element_table(self,filename):
+        '''
+        Add the elements saved by save_element_table to the table used by get_element
+
+        Every entry is checked to be [name, resname, element] strings before
+        any of them is added.
+        '''
+
+        infile = open(filename,'r')
+        try:
+            element_table = json.load(infile)
+        except ValueError:
+            raise Exception, 'the element table in '+filename+' is not valid JSON'
+        finally:
+            infile.close()
+
+        if not isinstance(element_table,list):
+            raise Exception, 'the element table in '+filename+' is not a list'
+
+        for entry in element_table:
+            if not (isinstance(entry,list) and len(entry) == 3 and all(isinstance(value,basestring) for value in entry)):
+                raise Exception, 'the element table in '+filename+' has an entry that is not [name, resname, element]: '+repr(entry)
+
+        PDB.element_table.update(((str(name),str(resname)),str(element_name)) for name,resname,element_name in element_table)
+
+        return
+
+    def infer_element(self,name,resname):
+        '''
+        Work out the element of an atom from its name and resname
+        (see get_element)
         '''
 
         error = []
@@ -155,102 +231,35 @@ class PDB(object):
 
         '''
         This method writes the PDB file
+
+        The records are formatted and written by a PDB_Writer.
         '''
 
-        debug=0
         result=1
-        conect = False
-	
-        if(flag=='w' or flag=='W'):
-            infile=open(filename,'w')
-        elif(flag=='a' or flag=='A'):				
-            infile=open(filename,'a')
-	
-        if 'conect' in kwargs:
-            conect = kwargs['conect']
-		
-        if 'model' in kwargs:
-            this_frame = kwargs['model']
-            infile.write("MODEL "+str(this_frame)+"\n")
-
-        if(debug==1):
-            infile.write("          1         2         3         4         5         6         7         \n")
-            infile.write("01234567890123456789012345678901234567890123456789012345678901234567890123456789\n")
-
-        for i in range(len(self._atom)):
-			
-            this_index = self._index[i]
-	
-            this_resid = self._resid[i]
 
-            if(this_index > 99999):
-                this_index = '99999'
-            elif(this_index < -9999):
-                this_index = '-9999'
-            else:
-                this_index = str(this_index)
+        writer = PDB_Writer(self,filename,flag)
+        writer.write_frame(frame,**kwargs)
+        writer.close()
 
-            if(this_resid > 9999):
-                this_resid = '9999'
-            elif(this_resid < -999):
-                this_resid = '-999'
-
-            try:
-                sx = "{0:8.3f}".format(float(self._coor[frame,i,0]))[:8]
-                sy = "{0:8.3f}".format(float(self._coor[frame,i,1]))[:8]
-                sz = "{0:8.3f}".format(float(self._coor[frame,i,2]))[:8]
+        return result
 
-                infile.write("%-6s%5s %-4s%1s%-4s%1s%4s%1s   %8s%8s%8s%6s%6s      %-4s%2s%2s\n" % (self._atom[i],this_index,self._name[i],self._loc[i],self._resname[i],self._chain[i],this_resid,self._rescode[i],sx,sy,sz,self._occupancy[i],self._beta[i],self._segname[i],self._element[i],self._charge[i]))
-            except:
-                print('\n>>>> ERROR IN WRITE_PDB <<<<\n')
-                print('>> i = ',i)
-                print('atom = ',self._atom[i],' : type = ',type(self._atom[i]))
-                print('index = ',this_index,' : type = ',type(this_index))
-                print('name = ',self._name[i],' : type = ',type(self._name[i]))
-                print('loc = ',self._loc[i],' : type = ',type(self._loc[i]))
-                print('resname = ',self._resname[i],' : type = ',type(self._resname[i]))
-                print('chain = ',self._chain[i],' : type = ',type(self._chain[i]))
-                print('resid = ',self._resid[i],' : type = ',type(self._resid[i]))
-                print('rescode = ',self._rescode[i],' : type = ',type(self._rescode[i]))
-                print('coor_x = ',self._coor[frame,i,0],' : type = ',type(self._coor[frame,i,0]))
-                print('coor_y = ',self._coor[frame,i,1],' : type = ',type(self._coor[frame,i,1]))
-                print('coor_z = ',self._coor[frame,i,2],' : type = ',type(self._coor[frame,i,2]))
-                print('occupancy = ',self._occupancy[i],' : type = ',type(self._occupancy[i]))
-                print('beta = ',self._beta[i],' : type = ',type(self._beta[i]))
-                print('segname = ',self._segname[i],' : type = ',type(self._segname[i]))
-                print('element = ',self._element[i],' : type = ',type(self._element[i]))
-                print('charge = ',self._charge[i],' : type = ',type(self._charge[i]))
-
-        # TODO: Check with Joseph to see if logic acceptable -
-        # i.e. is 'final' always accompanied by 'model'?
-        if ('final' in kwargs) or ('model' not in kwargs):
+    def write_pdb_frames(self,filename,start,end,**kwargs):
 
-            if conect:
-                conect_lines = self.create_conect_pdb_lines()
-                for line in conect_lines:
-                    infile.write(line + '\n')
+        '''
+        This method writes frames start to end-1 to a single PDB file
+        as MODEL/ENDMDL blocks followed by END.
 
-            infile.write("END\n")
+        The file is opened once and each frame is formatted in bulk and
+        written with one call (see PDB_Writer).  The optional kwarg
+        conect=True adds the CONECT records before END.
+        '''
 
-        else:
+        result=1
 
-            infile.write("ENDMDL\n")
-
-        # if 'model' in kwargs:
-        #     infile.write("ENDMDL\n")
-        # else:
-        #     if conect:
-        #         conect_lines = self.create_conect_pdb_lines()
-        #         for line in conect_lines:
-        #             infile.write(line + '\n')
-        #
-        #     infile.write("END\n")
-        #
-        # if 'final' in kwargs:
-        #     infile.write("END\n")
+        writer = PDB_Writer(self,filename,'w')
+        writer.write_frames(xrange(start,end),**kwargs)
+        writer.close()
 
-        infile.close()
-    
         return result
 
     def get_resnames(self):
@@ -304,30 +313,14 @@ class PDB(object):
         name = self.name() ; resname = self.resname() ; resid = self.resid() ; chain = self.chain()
         occupancy = self.occupancy() ; beta = self.beta() ; element = self.element() ; segname = self.segname()
 
-        names = [] ; resnames = [] ; resids = [] ; chains = [] 
-        occupancies = [] ; betas = [] ; elements = [] ; segments = []
-
-        names_mask = numpy.zeros((number_of_names,natoms),numpy.int)
-        resnames_mask = numpy.zeros((number_of_resnames,natoms),numpy.int)
-        resids_mask = numpy.zeros((number_of_resids,natoms),numpy.int)
-        chains_mask = numpy.zeros((number_of_chains,natoms),numpy.int)
-        occupancies_mask = numpy.zeros((number_of_occupancies,natoms),numpy.int)
-        betas_mask = numpy.zeros((number_of_betas,natoms),numpy.int)
-        elements_mask = numpy.zeros((number_of_elements,natoms),numpy.int)
-        segnames_mask = numpy.zeros((number_of_segnames,natoms),numpy.int)
-
-        nresid = 0
-
-        for i in xrange(natoms):
-
-            names_mask[unique_names.index(name[i])][i] = 1
-            resnames_mask[unique_resnames.index(resname[i])][i] = 1
-            resids_mask[unique_resids.index(resid[i])][i] = 1
-            chains_mask[unique_chains.index(chain[i])][i] = 1
-            occupancies_mask[unique_occupancies.index(occupancy[i])][i] = 1
-            betas_mask[unique_betas.index(beta[i])][i] = 1
-            elements_mask[unique_elements.index(element[i])][i] = 1
-            segnames_mask[unique_segnames.index(segname[i])][i] = 1
+        names_mask = self._unique_value_mask(number_of_names,unique_names,name,natoms)
+        resnames_mask = self._unique_value_mask(number_of_resnames,unique_resnames,resname,natoms)
+        resids_mask = self._unique_value_mask(number_of_resids,unique_resids,resid,natoms)
+        chains_mask = self._unique_value_mask(number_of_chains,unique_chains,chain,natoms)
+        occupancies_mask = self._unique_value_mask(number_of_occupancies,unique_occupancies,occupancy,natoms)
+        betas_mask = self._unique_value_mask(number_of_betas,unique_betas,beta,natoms)
+        elements_mask = self._unique_value_mask(number_of_elements,unique_elements,element,natoms)
+        segnames_mask = self._unique_value_mask(number_of_segnames,unique_segnames,segname,natoms)
 
         self._names_mask = names_mask
         self._resnames_mask = resnames_mask
@@ -340,6 +333,26 @@ class PDB(object):
 
         return
 
+    def _unique_value_mask(self,number_of_values,unique_values,values,natoms):
+        '''
+        Return a (number_of_values,natoms) integer mask with a 1 in row j
+        for every atom whose value is unique_values[j].
+
+        The row of each atom is found with a dictionary lookup so that
+        the cost is linear in the number of atoms.
+        '''
+
+        row = {}
+        for j in xrange(len(unique_values)-1,-1,-1):
+            row[unique_values[j]] = j
+
+        rows = numpy.array([row[values[i]] for i in xrange(natoms)],numpy.int)
+
+        mask = numpy.zeros((number_of_values,natoms),numpy.int)
+        mask[rows,numpy.arange(natoms)] = 1
+
+        return mask
+
 
     def check_for_all_zero_columns(self, coor, frame=0):
         '''
@@ -365,25 +378,86 @@ class PDB(object):
 
     def read_pdb(self,filename,**kwargs):
         '''
-        This method reads a PDB file.  
+        This method reads a PDB file.
+
+        The file is streamed a single time: the atom table is built
+        from the records of the first frame as they are read, frame
+        boundaries (MODEL/ENDMDL or END) are found on the fly and the
+        coordinates of each subsequent frame are converted as soon as the
+        frame is complete.  The memory used is therefore proportional to
+        the arrays that are returned rather than to the size of the file.
+
+        With vectorized=True the ATOM/HETATM records of each frame are
+        kept as fixed-width lines and every column is decoded at once with
+        numpy byte slicing (see _decode_pdb_atom_records) instead of being
+        sliced field by field as each line is read.
+
+        With cache=True the parsed molecule is saved to a binary sidecar
+        (filename+'.sascache') and later reads with the same options load
+        it from there, memory-mapping its arrays, as long as the path,
+        size, modification time and md5 checksum of the file are unchanged.
+
+        With workers=n (n > 1) the atom table and the first frame of an
+        uncompressed file are read as above, while the byte offsets of the
+        atom records of every frame are collected in the same pass, and the
+        coordinates of the remaining frames are parsed by a pool of n
+        processes straight into a shared-memory coordinate array (see
+        read_pdb_frames_parallel).  Compressed files are read serially.
+
+        With frame_offsets=list the [first,last] byte offsets of the atom
+        records of each frame are appended to list.
         '''
+        if 'cache' in kwargs and kwargs['cache']:
+            options = dict((key,value) for key,value in kwargs.items() if key != 'cache')
+            cache_name = filename+'.sascache'
+            cache_key = self.pdb_cache_key(filename,options)
+            if(self.read_pdb_cache(cache_name,cache_key)):
+                return
+            # parse into a new instance and cache the attributes set by read_pdb
+            parsed = self.__class__()
+            initial = dict(parsed.__dict__)
+            error = parsed.read_pdb(filename,**options)
+            attributes = dict((name,value) for name,value in parsed.__dict__.items()
+                              if name not in initial or value is not initial[name])
+            self.__dict__.update(attributes)
+            if not ('saspdbrx_topology' in options and options['saspdbrx_topology']):
+                self.write_pdb_cache(cache_name,cache_key,attributes)
+            return error
+
+        if 'workers' in kwargs and kwargs['workers'] > 1:
+            if(utilities.compression_type(filename) is not None):
+                # compressed files can not be read with seek, so they are read serially
+                return self.read_pdb(filename,**dict((key,value) for key,value in kwargs.items() if key != 'workers'))
+            options = dict((key,value) for key,value in kwargs.items() if key not in ('workers','check_zero_coor'))
+            options['fastread'] = True
+            options['frame_offsets'] = []
+            error = self.read_pdb(filename,**options)
+            if('saspdbrx_topology' in options and options['saspdbrx_topology']):
+                return error
+            if(self.number_of_frames() > 1):
+                self.read_pdb_frames_parallel(filename,kwargs['workers'],offsets=options['frame_offsets'])
+            if 'check_zero_coor' in kwargs:
+                self.check_for_all_zero_columns(self._coor)
+            return error
+
         debug=0
         result=1
 
         protein_resnames,dna_resnames,rna_resnames,nucleic_resnames,water_resnames = self.get_resnames()
 
         ### LONG	Need to properly import header information
-	
+
         # see: http://deposit.rcsb.org/adit/docs/pdb_atom_format.html
 
         fastread = False
         pdbscan = False
+        vectorized = False
         printme = True
         printme = False
 
         if 'verbose' in kwargs:
             printme = kwargs['verbose']
-			
+
         if 'fastread' in kwargs:
             fastread = kwargs['fastread']
             if(fastread):
@@ -391,24 +465,29 @@ class PDB(object):
 
         if 'pdbscan' in kwargs:
             pdbscan = kwargs['pdbscan']
-	
-        infile=open(filename,'r').readlines()
+
+        if 'vectorized' in kwargs:
+            vectorized = kwargs['vectorized']
+
+        frame_offsets = None
+
+        if 'frame_offsets' in kwargs:
+            frame_offsets = kwargs['frame_offsets']
+
+        infile=utilities.open_file(filename,'r')
 
         if(printme): print('reading filename: ',filename)
-		
+
         atom=[] ; index=[] ; original_index=[] ; name=[] ; loc=[] ; resname=[] ; chain=[] ; resid=[] ; rescode=[]
-        x=[] ; y=[] ; z=[] 
+        x=[] ; y=[] ; z=[]
         occupancy=[] ; beta=[] ; segname=[] ; element=[] ; charge=[] ; moltype=[] ; conect = {}
         residue_flag = [] ; original_resid=[] ; header = []
-	
-        # first check to see how many frames are in the file
 
         num_model = 0
         num_endmdl = 0
         num_end = 0
-        
+
         num_frames = 1
-        
         count_index = 0
 
         num_counts_this_model = 0 # number of atoms encompassed by "MODEL" and "ENDMDL" lines
@@ -416,47 +495,245 @@ class PDB(object):
         num_counts_per_model = [] # array of number of atoms encompassed by "MODEL" and "ENDMDL" lines
         num_counts_per_end = [] # array of number of atoms before the first "END" line or between two consecutive "END" lines
         modelON = False # Flag to indicate that a "MODEL" frame is being read
-        for i in range(len(infile)):
-            lin=infile[i]
-            lins=string.split(infile[i])
-            if (len(lins)==0):
-                if ((i+1)==len(infile)):
-                    lins=['']
-                    if modelON:
-                        raise Exception, 'There should be an ENDMDL pairing with MODEL'
-                    else:
-                        continue
+        last_line_blank = False # Flag to indicate that the most recent line had no characters
+
+        this_frame = 1
+        true_index = 0
+
+        position = 0 # byte offset of the end of the current line
+        frame_first = 0 ; frame_last = 0 # byte offsets of the atom records of the current frame
+
+        frame_coor = [] # float32 (natoms,3) coordinates of each completed frame
+        pending = [] # non-atom lines read in frame 1 since the last atom record
+        atom_lines = [] # atom records of the current frame (vectorized only)
+        first_frame_lines = [] # atom records of frame 1 (vectorized only)
+
+        unique_names = [] ; unique_resnames = [] ; unique_resids = [] ; unique_chains = []
+        unique_occupancies = [] ; unique_betas = [] ; unique_segnames = [] ; unique_moltypes = []
+
+        # sets mirroring the unique lists above so that membership tests are O(1);
+        # the lists keep the order in which the values are first found
+
+        seen_names = set() ; seen_resnames = set() ; seen_resids = set() ; seen_chains = set()
+        seen_occupancies = set() ; seen_betas = set() ; seen_segnames = set() ; seen_moltypes = set()
+
+        for lin in infile:
+
+            position += len(lin)
 
             record_name = string.strip(lin[0:6])
+
+            if(record_name == 'ATOM' or record_name == 'HETATM'):
+
+                last_line_blank = False
+                count_index += 1
+                num_counts_this_model += 1
+                num_counts_this_end += 1
+                true_index += 1
+
+                if(true_index == 1):
+                    frame_first = position - len(lin)
+                frame_last = position
+
+                if(this_frame == 1):
+                    header.extend(pending) ; pending = []
+
+                if(vectorized):
+                    if(this_frame == 1 or not fastread):
+                        atom_lines.append(lin)
+
+                elif(this_frame == 1):
+                    atom.append(string.strip(lin[0:6]))		#	1-6		record name
+                    original_index.append(lin[6:11])				#	7-11		atom serial number
+                    index.append(str(true_index))   	        #   set index so that > 99,999 atoms can be read and counted
+                    this_name = string.strip(lin[12:16])		#	13-16		atom name
+                    name.append(string.strip(lin[12:16]))		#	13-16		atom name
+                    if pdbscan:
+                        loc.append(lin[16])
+                    else:
+                        loc.append(' ')
+                    this_resname = string.strip(lin[17:21])	#	18-20		residue name
+                    resname.append(string.strip(lin[17:21]))	#	18-20		residue name
+                    this_chain = lin[21]				#	22		chain identifier
+                    chain.append(lin[21])				#	22		chain identifier
+                    this_resid = locale.atoi(lin[22:26])			#	23-26		residue sequence number
+                    original_resid.append(lin[22:26])			#	23-26		residue sequence number
+                    resid.append(lin[22:26])			#	23-26		residue sequence number
+                    rescode.append(lin[26])				#	27		code for insertion of residues
+                    x.append(lin[30:38])				#	31-38		Real(8.3) X: angstroms
+                    y.append(lin[38:46])				#	39-46		Real(8.3) Y: angstroms
+                    z.append(lin[46:54])				#	47-54		Real(8.3) Z: angstroms
+
+                    residue_flag.append(False)
+
+                    if not pdbscan:
+
+                        try:
+                            occupancy.append(string.strip(lin[54:60]))      #	55-60		occupancy
+                            this_occupancy =string.strip(lin[54:60])      #	55-60		occupancy
+                            if(occupancy[-1] == ''):
+                                occupancy[-1] = "  1.00"
+                                this_occupancy[-1] = "  1.00"
+                        except:
+                            occupancy.append("  0.00")
+                            this_occupancy = "  0.00"
+                        try:
+                            beta.append(string.strip(lin[60:66]))		#	61-66		temperature factor
+                            this_beta = string.strip(lin[60:66])		#	61-66		temperature factor
+                            if(beta[-1] == ''):
+                                beta[-1] = "  0.00"
+                        except:
+                            beta.append("  0.00")
+                            this_beta = "  0.00"
+                        try:
+                            segname.append(string.strip(lin[72:76]))	#	73-76		segment identifier
+                            this_segname = string.strip(lin[72:76])	#	73-76		segment identifier
+                            if(segname[-1] == '' and this_chain !=''):
+                                segname[-1] = this_chain
+                                this_segname = this_chain
+                        except:
+                            this_segname = ""
+                            segname.append("")
+                        try:
+                            element.append(string.strip(lin[76:78]))	#	77-78		element symbol
+                            if(element[-1] == ''):
+                                element[-1] = "  "
+                        except:
+                            element.append("  ")
+                        try:
+                            charge.append(string.strip(lin[78:80]))		#	79-80		charge on the atom
+                            if(charge[-1] == ''):
+                                charge[-1] = "  "
+                        except:
+                            charge.append("  ")
+
+                    else:
+                        occupancy.append(string.strip(lin[54:60]))      #	55-60		occupancy
+                        this_occupancy =string.strip(lin[54:60])      #	55-60		occupancy
+                        beta.append(string.strip(lin[60:66]))		#	61-66		temperature factor
+                        this_beta = string.strip(lin[60:66])		#	61-66		temperature factor
+                        segname.append(string.strip(lin[72:76]))	#	73-76		segment identifier
+                        this_segname = string.strip(lin[72:76])	#	73-76		segment identifier
+                        element.append(string.strip(lin[76:78]))	#	77-78		element symbol
+                        charge.append(string.strip(lin[78:80]))		#	79-80		charge on the atom
+
+                    if(this_name not in seen_names): seen_names.add(this_name) ; unique_names.append(this_name)
+                    if(this_resname not in seen_resnames): seen_resnames.add(this_resname) ; unique_resnames.append(this_resname)
+                    if(this_resid not in seen_resids): seen_resids.add(this_resid) ; unique_resids.append(this_resid)
+                    if(this_chain not in seen_chains): seen_chains.add(this_chain) ; unique_chains.append(this_chain)
+                    if(this_segname not in seen_segnames): seen_segnames.add(this_segname) ; unique_segnames.append(this_segname)
+                    if(this_occupancy not in seen_occupancies): seen_occupancies.add(this_occupancy) ; unique_occupancies.append(this_occupancy)
+                    if(this_beta not in seen_betas): seen_betas.add(this_beta) ; unique_betas.append(this_beta)
+
+                    this_resname=(string.strip(lin[17:21]))
+                    if this_resname in protein_resnames:
+                        moltype.append('protein')
+                        this_moltype = 'protein'
+                    elif this_resname in rna_resnames:
+                        moltype.append('rna')
+                        this_moltype = 'rna'
+                    elif this_resname in dna_resnames:
+                        moltype.append('dna')
+                        this_moltype = 'dna'
+                    elif this_resname in water_resnames:
+                        moltype.append('water')
+                        this_moltype = 'water'
+                    else:
+                        moltype.append('other')
+                        this_moltype = 'other'
+
+                    if(this_moltype not in seen_moltypes): seen_moltypes.add(this_moltype) ; unique_moltypes.append(this_moltype)
+
+                elif not fastread:
+                    x.append(lin[30:38])				#	31-38		Real(8.3) X: angstroms
+                    y.append(lin[38:46])				#	39-46		Real(8.3) Y: angstroms
+                    z.append(lin[46:54])				#	47-54		Real(8.3) Z: angstroms
+
+                continue
+
+            lins = string.split(lin,None,1)
+            last_line_blank = (len(lins) == 0)
 #
-### 	OPEN 	need to re-factor the exception statements to a uniform reporting mechanism
+###     OPEN    need to re-factor the exception statements to a uniform reporting mechanism
 #
-            try:
-                if(lins[0]=='MODEL'):
-                    if modelON:
-                        raise Exception, 'Encountered two consecutive MODEL lines' 
-                    if (num_counts_this_model != 0):
-                        raise Exception, 'There should not be atoms after ENDMDL and before MODEL lines'
+            end_of_frame = False
+            if(last_line_blank):
+                pass
+            elif(lins[0]=='MODEL'):
+                # two consecutive MODEL lines, or atoms after ENDMDL and before MODEL, are ignored
+                if (not modelON and num_counts_this_model == 0):
                     modelON = True
-                elif(lins[0]=='ENDMDL'):
-                    if not modelON:
-                        raise Exception, 'Encountered two consecutive ENDMDL lines'
+            elif(lins[0]=='ENDMDL'):
+                # two consecutive ENDMDL lines are ignored
+                if modelON:
                     modelON = False
                     num_counts_per_model.append(num_counts_this_model)
                     num_counts_this_model = 0
-                elif(lins[0]=='END'):
-                    num_counts_per_end.append(num_counts_this_end)
-                    num_counts_this_end = 0
-            except:
-                pass
-			#
-            if((record_name == 'ATOM' or record_name == 'HETATM')):
-                count_index += 1
-                num_counts_this_model += 1
-                num_counts_this_end += 1
-		#
-		#
+                    end_of_frame = True
+            elif(lins[0]=='END'):
+                num_counts_per_end.append(num_counts_this_end)
+                num_counts_this_end = 0
+                end_of_frame = True
+
+            if(end_of_frame and true_index > 0):
+                finished_frame = this_frame
+                if(frame_offsets is not None):
+                    frame_offsets.append([frame_first,frame_last])
+                if(len(x) > 0 or len(atom_lines) > 0):
+                    self._finish_pdb_frame(frame_coor,x,y,z,atom_lines)
+                if(finished_frame == 1):
+                    first_frame_lines = atom_lines
+                x=[] ; y=[] ; z=[] ; atom_lines = []
+                true_index = 0
+                this_frame += 1
+                if(printme): print('finished reading frame = ',finished_frame)
+                if(finished_frame == 1):
+                    post_frame_lines = pending ; pending = []
+                    if pdbscan:
+                        for line in post_frame_lines:
+                            if(string.strip(line[0:6]) == 'CONECT'):
+                                self._read_conect_pdb_line(line,conect)
+            elif(this_frame == 1):
+                pending.append(lin)
+            elif((record_name == 'CONECT') and pdbscan):
+                self._read_conect_pdb_line(lin,conect)
 
+        infile.close()
+
+        if(true_index > 0):
+            finished_frame = this_frame
+            if(frame_offsets is not None):
+                frame_offsets.append([frame_first,frame_last])
+            if(len(x) > 0 or len(atom_lines) > 0):
+                self._finish_pdb_frame(frame_coor,x,y,z,atom_lines)
+            if(finished_frame == 1):
+                first_frame_lines = atom_lines
+            x=[] ; y=[] ; z=[] ; atom_lines = []
+            this_frame += 1
+            if(printme): print('finished reading frame = ',finished_frame)
+            if(finished_frame == 1):
+                if pdbscan:
+                    for line in pending:
+                        if(string.strip(line[0:6]) == 'CONECT'):
+                            self._read_conect_pdb_line(line,conect)
+
+        if(last_line_blank and modelON):
+            raise Exception, 'There should be an ENDMDL pairing with MODEL'
+
+        if(vectorized and len(first_frame_lines) > 0):
+            atom,index,original_index,name,loc,resname,chain,resid,rescode,occupancy,beta,segname,element,charge,moltype = self._decode_pdb_atom_records(first_frame_lines,pdbscan)
+            original_resid = resid
+            residue_flag = [False]*len(atom)
+            first_frame_lines = []
+
+            unique_names = self._first_unique(name)
+            unique_resnames = self._first_unique(resname)
+            unique_resids = self._first_unique(resid)
+            unique_chains = self._first_unique(chain)
+            unique_segnames = self._first_unique(segname)
+            unique_occupancies = self._first_unique(occupancy)
+            unique_betas = self._first_unique(beta)
+            unique_moltypes = self._first_unique(moltype)
         if ( (len(num_counts_per_end)==0) and (len(num_counts_per_model)!=0) ):
             raise Exception, 'According to Protein Data Bank Contents Guide, END line must appear in each coor entry'
         if (len(num_counts_per_model)!=0 and (len(num_counts_per_end)>1 or sum(num_counts_per_model)!=sum(num_counts_per_end))):
@@ -481,193 +758,41 @@ class PDB(object):
 
         if(printme): print('num_atoms = ',num_atoms)
 
-        if(printme): print('>>> found ',num_frames,' model(s) or frame(s)')			
-        this_frame = 1		
+        if(printme): print('>>> found ',num_frames,' model(s) or frame(s)')
 
-        true_index = 0
-	
-        coor=numpy.zeros((num_frames,num_atoms,3),numpy.float)	
+        coor=numpy.zeros((num_frames,num_atoms,3),numpy.float)
 
-        unique_names = [] ; unique_resnames = [] ; unique_resids = [] ; unique_chains = [] 
-        unique_occupancies = [] ; unique_betas = [] ; unique_segnames = [] ; unique_moltypes = []
+        if(printme and (len(frame_coor) != num_frames) and not fastread):
+            print('>>> WARNING: pdb file had ',num_frames,' file_io read ',len(frame_coor),' frames')
 
-        for i in range(len(infile)):
-            lin=infile[i]
-            lins=string.split(infile[i])
+        for i in xrange(min(num_frames,len(frame_coor))):
+            coor[i] = frame_coor[i]
+            frame_coor[i] = None
 
-            record_name = string.strip(lin[0:6])
+        index=numpy.array(index,numpy.int)
+        original_index=numpy.array(original_index,numpy.int)
+        resid=numpy.array(resid,numpy.int)
+        original_resid=numpy.array(original_resid,numpy.int)
 
-            if((record_name == 'ATOM' or record_name == 'HETATM') and this_frame == 1):
-                true_index += 1
-                atom.append(string.strip(lin[0:6]))		#	1-6		record name	
-                original_index.append(lin[6:11])				#	7-11		atom serial number
-                index.append(str(true_index))   	        #   set index so that > 99,999 atoms can be read and counted
-                this_name = string.strip(lin[12:16])		#	13-16		atom name
-                name.append(string.strip(lin[12:16]))		#	13-16		atom name
-                if pdbscan:
-                    loc.append(lin[16])
-                else:
-                    loc.append(' ')
-                this_resname = string.strip(lin[17:21])	#	18-20		residue name
-                resname.append(string.strip(lin[17:21]))	#	18-20		residue name
-                this_chain = lin[21]				#	22		chain identifier
-                chain.append(lin[21])				#	22		chain identifier
-                this_resid = locale.atoi(lin[22:26])			#	23-26		residue sequence number
-                original_resid.append(lin[22:26])			#	23-26		residue sequence number
-                resid.append(lin[22:26])			#	23-26		residue sequence number
-                rescode.append(lin[26])				#	27		code for insertion of residues
-                x.append(lin[30:38])				#	31-38		Real(8.3) X: angstroms	
-                y.append(lin[38:46])				#	39-46		Real(8.3) Y: angstroms	
-                z.append(lin[46:54])				#	47-54		Real(8.3) Z: angstroms	
-				
-                residue_flag.append(False)
-
-                if not pdbscan:
-
-                    try:	
-                        occupancy.append(string.strip(lin[54:60]))      #	55-60		occupancy
-                        this_occupancy =string.strip(lin[54:60])      #	55-60		occupancy
-                        if(occupancy[-1] == ''):
-                            occupancy[-1] = "  1.00"
-                            this_occupancy[-1] = "  1.00"
-                    except:
-                        occupancy.append("  0.00")
-                        this_occupancy = "  0.00"
-                    try:
-                        beta.append(string.strip(lin[60:66]))		#	61-66		temperature factor
-                        this_beta = string.strip(lin[60:66])		#	61-66		temperature factor
-                        if(beta[-1] == ''):
-                            beta[-1] = "  0.00"
-                    except:
-                        beta.append("  0.00")
-                        this_beta = "  0.00"
-                    try:
-                        segname.append(string.strip(lin[72:76]))	#	73-76		segment identifier
-                        this_segname = string.strip(lin[72:76])	#	73-76		segment identifier
-                        if(segname[-1] == '' and this_chain !=''):
-                            segname[-1] = this_chain
-                            this_segname = this_chain
-                    except:
-                        this_segname = ""
-                        segname.append("")
-                    try:
-                        element.append(string.strip(lin[76:78]))	#	77-78		element symbol
-                        if(element[-1] == ''):
-                            element[-1] = "  "
-                    except:
-                        element.append("  ")
-                    try:
-                        charge.append(string.strip(lin[78:80]))		#	79-80		charge on the atom
-                        if(charge[-1] == ''):
-                            charge[-1] = "  "
-                    except:
-                        charge.append("  ")
+        self._atom=atom ; self._index=index  ; self._original_index = original_index ; self._name=name ; self._loc=loc ; self._resname=resname ; self._residue_flag = residue_flag
+        self._chain=chain ; self._resid=resid ; self._rescode=rescode ; self._original_resid=original_resid
+        self._occupancy=occupancy ; self._beta=beta ; self._segname=segname ; self._element=element
+        self._charge=charge ; self._moltype=moltype
 
-                else:
-                    occupancy.append(string.strip(lin[54:60]))      #	55-60		occupancy
-                    this_occupancy =string.strip(lin[54:60])      #	55-60		occupancy
-                    beta.append(string.strip(lin[60:66]))		#	61-66		temperature factor
-                    this_beta = string.strip(lin[60:66])		#	61-66		temperature factor
-                    segname.append(string.strip(lin[72:76]))	#	73-76		segment identifier
-                    this_segname = string.strip(lin[72:76])	#	73-76		segment identifier
-                    element.append(string.strip(lin[76:78]))	#	77-78		element symbol
-                    charge.append(string.strip(lin[78:80]))		#	79-80		charge on the atom
-
-                if(this_name not in unique_names): unique_names.append(this_name)
-                if(this_resname not in unique_resnames): unique_resnames.append(this_resname)
-                if(this_resid not in unique_resids): unique_resids.append(this_resid)
-                if(this_chain not in unique_chains): unique_chains.append(this_chain)
-                if(this_segname not in unique_segnames): unique_segnames.append(this_segname)
-                if(this_occupancy not in unique_occupancies): unique_occupancies.append(this_occupancy)
-                if(this_beta not in unique_betas): unique_betas.append(this_beta)
-	
-                this_resname=(string.strip(lin[17:21]))
-                if this_resname in protein_resnames:
-                    moltype.append('protein')
-                    this_moltype = 'protein'
-                elif this_resname in rna_resnames:	
-                    moltype.append('rna')
-                    this_moltype = 'rna'
-                elif this_resname in dna_resnames:	
-                    moltype.append('dna')
-                    this_moltype = 'dna'
-                elif this_resname in water_resnames:	
-                    moltype.append('water')
-                    this_moltype = 'water'
-                else:
-                    moltype.append('other')
-                    this_moltype = 'other'
-				
-                if(this_moltype not in unique_moltypes): unique_moltypes.append(this_moltype)
-					
-                if(true_index == num_atoms):				
-                    if(printme): print('finished reading frame = ',this_frame)
-                    index=numpy.array(index,numpy.int)
-                    original_index=numpy.array(original_index,numpy.int)
-                    resid=numpy.array(resid,numpy.int)
-                    original_resid=numpy.array(original_resid,numpy.int)
-
-                    x=numpy.array(x,numpy.float32)
-                    y=numpy.array(y,numpy.float32)
-                    z=numpy.array(z,numpy.float32)
-                    coor[0,:,0]=x.astype(numpy.float) ; coor[0,:,1]=y.astype(numpy.float) ; coor[0,:,2]=z.astype(numpy.float)
-                    true_index = 0
-                    x=[] ; y=[] ; z=[]
-                    if(this_frame == 1):
-                        self._atom=atom ; self._index=index  ; self._original_index = original_index ; self._name=name ; self._loc=loc ; self._resname=resname ; self._residue_flag = residue_flag
-                        self._chain=chain ; self._resid=resid ; self._rescode=rescode ; self._original_resid=original_resid
-                        self._occupancy=occupancy ; self._beta=beta ; self._segname=segname ; self._element=element
-                        self._charge=charge ; self._moltype=moltype
-                        
-                        self._number_of_names = len(unique_names) ; self._names = unique_names
-                        self._number_of_resnames = len(unique_resnames) ; self._resnames = unique_resnames
-                        self._number_of_resids = len(unique_resids) ; self._resids = unique_resids
-                        self._number_of_chains = len(unique_chains) ; self._chains = unique_chains
-                        self._number_of_segnames = len(unique_segnames) ; self._segnames = unique_segnames
-                        self._number_of_occupancies = len(unique_occupancies) ; self._occupancies = unique_occupancies
-                        self._number_of_betas = len(unique_betas) ; self._betas = unique_betas
-                        self._number_of_moltypes = len(unique_moltypes) ; self._moltypes = unique_moltypes
-                        if(fastread):
-                            self._natoms=len(index)
-                            break
-
-                    this_frame += 1
-            elif((record_name != 'ATOM' or record_name != 'HETATM' and record_name != 'CONECT') and this_frame == 1):
-                header.append(lin)
-	
-            elif((record_name == 'ATOM' or record_name == 'HETATM') and this_frame > 1):
-                true_index += 1
-                x.append(lin[30:38])				#	31-38		Real(8.3) X: angstroms	
-                y.append(lin[38:46])				#	39-46		Real(8.3) Y: angstroms	
-                z.append(lin[46:54])				#	47-54		Real(8.3) Z: angstroms	
-		
-                if(true_index == num_atoms):
-                    if(printme): print('finished reading frame = ',this_frame)
-                    x=numpy.array(x,numpy.float32)
-                    y=numpy.array(y,numpy.float32)
-                    z=numpy.array(z,numpy.float32)
-                    coor[this_frame-1,:,0]=x ; coor[this_frame-1,:,1]=y ; coor[this_frame-1,:,2]=z
-                    true_index = 0
-                    this_frame += 1		
-                    x=[] ; y=[] ; z=[]
-
-            elif ((record_name == 'CONECT') and pdbscan):
-                # Format of CONECT line:
-                # Record name CONECT followed by list of atom indexes in 6 
-                # character columns. First is the base atom, following atoms 
-                # are those connected to it. 
-                # Input line is filtered to ignore blank columns.
-                ndxs = [int(lin[i:i+5]) for i in range(6, len(lin), 5) if lin[i:i+5].strip()]
-                conect[ndxs[0]] = ndxs[1:]
-
-        if(((this_frame - 1) != num_frames) and not fastread):
-            if(printme): print('>>> WARNING: pdb file had ',num_frames,' file_io read ',this_frame-1,' frames')
-
-        self._coor=numpy.array(coor)
+        self._number_of_names = len(unique_names) ; self._names = unique_names
+        self._number_of_resnames = len(unique_resnames) ; self._resnames = unique_resnames
+        self._number_of_resids = len(unique_resids) ; self._resids = unique_resids
+        self._number_of_chains = len(unique_chains) ; self._chains = unique_chains
+        self._number_of_segnames = len(unique_segnames) ; self._segnames = unique_segnames
+        self._number_of_occupancies = len(unique_occupancies) ; self._occupancies = unique_occupancies
+        self._number_of_betas = len(unique_betas) ; self._betas = unique_betas
+        self._number_of_moltypes = len(unique_moltypes) ; self._moltypes = unique_moltypes
+
+        self._coor=coor
 
         if 'check_zero_coor' in kwargs:
             self.check_for_all_zero_columns(self._coor)
-			
+
         unique_elements = self.element_filter()
 
         self._number_of_elements = len(unique_elements) ; self._elements = unique_elements
@@ -678,14 +803,503 @@ class PDB(object):
         error = []
 
         if 'saspdbrx_topology' in kwargs:
-            if kwargs['saspdbrx_topology']:	
+            if kwargs['saspdbrx_topology']:
                 error = self.check_charmm_atomic_order_reorganize()
                 return error
 
         self._header = header
         self._conect = conect
 
-        return 
+        return
+
+    def _finish_pdb_frame(self,frame_coor,x,y,z,lines=[]):
+        '''
+        Convert the coordinate strings (or, in vectorized mode, the atom
+        records) collected for one frame and store them as a float32
+        (natoms,3) array
+        '''
+
+        if(len(lines) > 0):
+            columns = self._pdb_record_columns(lines)
+            this_coor = numpy.zeros((len(lines),3),numpy.float32)
+            this_coor[:,0] = self._pdb_field(columns,30,38).astype(numpy.float32)
+            this_coor[:,1] = self._pdb_field(columns,38,46).astype(numpy.float32)
+            this_coor[:,2] = self._pdb_field(columns,46,54).astype(numpy.float32)
+        else:
+            this_coor = numpy.zeros((len(x),3),numpy.float32)
+            this_coor[:,0] = numpy.array(x,numpy.float32)
+            this_coor[:,1] = numpy.array(y,numpy.float32)
+            this_coor[:,2] = numpy.array(z,numpy.float32)
+
+        frame_coor.append(this_coor)
+
+        return
+
+    def _pdb_record_columns(self,lines):
+        '''
+        Pack a list of PDB records into a fixed-width (nlines,80) byte array
+        '''
+
+        buffer = numpy.array([string.ljust(lin.rstrip('\r\n'),80)[:80] for lin in lines],'S80')
+
+        return buffer.view('S1').reshape(len(lines),80)
+
+    def _pdb_field(self,columns,first,last):
+        '''
+        Return the bytes of columns first:last of every record as one string per record
+        '''
+
+        width = last - first
+
+        return numpy.ascontiguousarray(columns[:,first:last]).view('S'+str(width)).reshape(len(columns))
+
+    def _first_unique(self,values):
+        '''
+        Return the distinct entries of values in the order in which they first appear
+        '''
+
+        values = numpy.asarray(values)
+        if(len(values) == 0):
+            return []
+
+        unique_values, first_index = numpy.unique(values,return_index=True)
+
+        return values[numpy.sort(first_index)].tolist()
+
+    def _assign_moltypes(self,resname):
+        '''
+        Return the moltype (protein, rna, dna, water or other) of each
+        residue name in the array resname, with the precedence used by read_pdb
+        '''
+
+        protein_resnames,dna_resnames,rna_resnames,nucleic_resnames,water_resnames = self.get_resnames()
+
+        moltype = numpy.array(['other']*len(resname),'S7')
+        for this_moltype,resnames in (('water',water_resnames),('dna',dna_resnames),('rna',rna_resnames),('protein',protein_resnames)):
+            moltype[numpy.in1d(resname,resnames)] = this_moltype
+
+        return moltype
+
+    def _decode_pdb_atom_records(self,lines,pdbscan):
+        '''
+        Decode all ATOM/HETATM records of a frame with numpy byte slicing
+
+        The records are packed into a fixed-width byte buffer and each
+        column is pulled out for every atom at once; numeric columns are
+        converted in bulk.  Blank occupancy, beta, segname, element and
+        charge columns are filled in as in the line-by-line reader.
+        '''
+
+        natoms = len(lines)
+        columns = self._pdb_record_columns(lines)
+
+        strip = numpy.char.strip
+
+        atom = strip(self._pdb_field(columns,0,6))                  #	1-6		record name
+        original_index = self._pdb_field(columns,6,11).astype(numpy.int) #	7-11		atom serial number
+        index = numpy.arange(1,natoms+1,dtype=numpy.int)            #   set index so that > 99,999 atoms can be read and counted
+        name = strip(self._pdb_field(columns,12,16))                #	13-16		atom name
+        if pdbscan:
+            loc = self._pdb_field(columns,16,17)
+        else:
+            loc = numpy.array([' ']*natoms,'S1')
+        resname = strip(self._pdb_field(columns,17,21))             #	18-20		residue name
+        chain = self._pdb_field(columns,21,22)                      #	22		chain identifier
+        resid = self._pdb_field(columns,22,26).astype(numpy.int)    #	23-26		residue sequence number
+        rescode = self._pdb_field(columns,26,27)                    #	27		code for insertion of residues
+        occupancy = strip(self._pdb_field(columns,54,60))           #	55-60		occupancy
+        beta = strip(self._pdb_field(columns,60,66))                #	61-66		temperature factor
+        segname = strip(self._pdb_field(columns,72,76))             #	73-76		segment identifier
+        element = strip(self._pdb_field(columns,76,78))             #	77-78		element symbol
+        charge = strip(self._pdb_field(columns,78,80))              #	79-80		charge on the atom
+
+        if not pdbscan:
+            occupancy = numpy.where(occupancy == '',"  1.00",occupancy)
+            beta = numpy.where(beta == '',"  0.00",beta)
+            segname = numpy.where(segname == '',chain,segname)
+            element = numpy.where(element == '',"  ",element)
+            charge = numpy.where(charge == '',"  ",charge)
+
+        moltype = self._assign_moltypes(resname)
+
+        return atom.tolist(),index,original_index,name.tolist(),loc.tolist(),resname.tolist(),chain.tolist(),resid,rescode.tolist(),occupancy.tolist(),beta.tolist(),segname.tolist(),element.tolist(),charge.tolist(),moltype.tolist()
+
+    def _read_conect_pdb_line(self,lin,conect):
+        '''
+        Add the connectivity of a single CONECT record to the conect dictionary
+        '''
+
+        # Format of CONECT line:
+        # Record name CONECT followed by list of atom indexes in 6
+        # character columns. First is the base atom, following atoms
+        # are those connected to it.
+        # Input line is filtered to ignore blank columns.
+        ndxs = [int(lin[i:i+5]) for i in range(6, len(lin), 5) if lin[i:i+5].strip()]
+        conect[ndxs[0]] = ndxs[1:]
+
+        return
+
+    def pdb_cache_key(self,filename,options):
+        '''
+        Return the key identifying a parsed PDB file in its cache: the
+        absolute path, size, modification time and md5 checksum of the file
+        and the read_pdb options used.
+        '''
+
+        file_stat = os.stat(filename)
+
+        md5 = hashlib.md5()
+        infile = open(filename,'rb')
+        block = infile.read(1048576)
+        while(len(block) > 0):
+            md5.update(block)
+            block = infile.read(1048576)
+        infile.close()
+
+        return (os.path.abspath(filename),file_stat.st_size,file_stat.st_mtime,md5.hexdigest(),repr(sorted(options.items())))
+
+    def pdb_cache_encode(self,value):
+        '''
+        Return value (None, numbers, strings, lists, tuples, dicts and numpy
+        arrays of them) as plain JSON data; tuples, dicts and arrays are
+        tagged so that pdb_cache_decode can restore them.
+        '''
+
+        if(value is None or isinstance(value,(bool,int,long,float,str))):
+            return value
+        elif(isinstance(value,numpy.generic)):
+            return self.pdb_cache_encode(value.item())
+        elif(isinstance(value,list)):
+            return [self.pdb_cache_encode(element) for element in value]
+        elif(isinstance(value,tuple)):
+            return {'tuple':[self.pdb_cache_encode(element) for element in value]}
+        elif(isinstance(value,dict)):
+            return {'dict':[[self.pdb_cache_encode(key),self.pdb_cache_encode(element)] for key,element in value.items()]}
+        elif(isinstance(value,numpy.ndarray) and value.dtype.kind in 'biufS'):
+            return {'array':self.pdb_cache_encode(value.tolist()),'dtype':value.dtype.str,'shape':list(value.shape)}
+
+        raise TypeError, 'can not cache a value of type '+type(value).__name__
+
+    def pdb_cache_decode(self,value):
+        '''
+        Restore a value encoded by pdb_cache_encode from JSON data
+        '''
+
+        if(isinstance(value,unicode)):
+            return value.encode('utf-8')
+        elif(isinstance(value,list)):
+            return [self.pdb_cache_decode(element) for element in value]
+        elif(isinstance(value,dict)):
+            if(value.keys() == ['tuple']):
+                return tuple(self.pdb_cache_decode(value['tuple']))
+            elif(value.keys() == ['dict']):
+                return dict((self.pdb_cache_decode(key),self.pdb_cache_decode(element)) for key,element in value['dict'])
+            elif(sorted(value.keys()) == ['array','dtype','shape']):
+                dtype = numpy.dtype(self.pdb_cache_decode(value['dtype']))
+                if(dtype.kind not in 'biufS'):
+                    raise ValueError, 'unexpected array type in cache'
+                return numpy.array(self.pdb_cache_decode(value['array']),dtype).reshape(value['shape'])
+            raise ValueError, 'unexpected value in cache'
+
+        return value
+
+    def write_pdb_cache(self,cache_name,cache_key,attributes):
+        '''
+        Save the attributes set by read_pdb to a binary cache file.
+
+        Numerical arrays are stored as raw data after a JSON description
+        of the file so that read_pdb_cache can memory-map them; everything
+        else (lists, header, conect, ...) is stored in the JSON description
+        (see pdb_cache_encode).  Failing to write the cache is not an error.
+        '''
+
+        arrays = {} ; objects = {}
+
+        for name,value in attributes.items():
+            if(isinstance(value,numpy.ndarray) and value.dtype.kind in 'biuf' and value.size > 0):
+                arrays[name] = numpy.ascontiguousarray(value)
+            else:
+                objects[name] = value
+
+        array_layout = {}
+        offset = 0
+        for name in sorted(arrays):
+            offset = (offset+63)//64*64
+            array_layout[name] = (arrays[name].dtype.str,arrays[name].shape,offset)
+            offset += arrays[name].nbytes
+
+        try:
+            metadata = json.dumps(self.pdb_cache_encode({'version':PDB_CACHE_VERSION,'key':cache_key,
+                                                         'objects':objects,'arrays':array_layout}))
+        except (TypeError,ValueError,UnicodeDecodeError):
+            return
+
+        data_start = self.pdb_cache_data_start(len(metadata))
+
+        temporary_name = cache_name+'.'+str(os.getpid())
+
+        try:
+            outfile = open(temporary_name,'wb')
+            outfile.write(PDB_CACHE_MAGIC+struct.pack('<q',len(metadata))+metadata)
+            for name in sorted(arrays):
+                outfile.seek(data_start+array_layout[name][2])
+                outfile.write(arrays[name].tostring())
+            outfile.close()
+            os.rename(temporary_name,cache_name)
+        except (IOError,OSError):
+            if(os.path.isfile(temporary_name)):
+                os.remove(temporary_name)
+
+        return
+
+    def pdb_cache_data_start(self,metadata_length):
+        '''
+        Return the (64 byte aligned) offset of the array data in a cache file
+        '''
+
+        return (len(PDB_CACHE_MAGIC)+8+metadata_length+63)//64*64
+
+    def read_pdb_cache(self,cache_name,cache_key):
+        '''
+        Load the attributes saved by write_pdb_cache if the cache file
+        exists and matches cache_key.  The arrays are memory-mapped
+        copy-on-write, so changing them does not change the cache.
+
+        The description of the file is JSON, so reading a cache never runs
+        code; its magic, version and key are checked before anything else
+        in it is used.
+
+        Returns True if the molecule was loaded from the cache.
+        '''
+
+        if not os.path.isfile(cache_name):
+            return False
+
+        try:
+            file_size = os.path.getsize(cache_name)
+            infile = open(cache_name,'rb')
+            magic = infile.read(len(PDB_CACHE_MAGIC))
+            if(magic != PDB_CACHE_MAGIC):
+                infile.close()
+                return False
+            metadata_length = struct.unpack('<q',infile.read(8))[0]
+            if(metadata_length < 0 or metadata_length > file_size):
+                infile.close()
+                return False
+            metadata = json.loads(infile.read(metadata_length))
+            infile.close()
+
+            if not (isinstance(metadata,dict) and sorted(metadata.keys()) == ['dict']):
+                return False
+            metadata = dict((key,value) for key,value in metadata['dict'] if isinstance(key,unicode))
+            if(metadata.get('version') != PDB_CACHE_VERSION):
+                return False
+            if(self.pdb_cache_decode(metadata.get('key')) != cache_key):
+                return False
+
+            objects = self.pdb_cache_decode(metadata['objects'])
+            array_layout = self.pdb_cache_decode(metadata['arrays'])
+
+            # only private attributes of the molecule are restored
+            for name in objects.keys()+array_layout.keys():
+                if not (isinstance(name,str) and name.startswith('_') and not name.startswith('__')):
+                    return False
+
+            data_start = self.pdb_cache_data_start(metadata_length)
+
+            arrays = {}
+            for name,(dtype,shape,offset) in array_layout.items():
+                dtype = numpy.dtype(dtype)
+                if(dtype.kind not in 'biuf' or offset < 0):
+                    return False
+                arrays[name] = numpy.memmap(cache_name,dtype=dtype,mode='c',offset=data_start+offset,shape=tuple(shape))
+        except:
+            return False
+
+        for name,value in arrays.items():
+            setattr(self,name,value)
+
+        for name,value in objects.items():
+            setattr(self,name,value)
+
+        return True
+
+    def index_pdb_frames(self,filename,**kwargs):
+        '''
+        This method finds where the atom records of every frame (MODEL/ENDMDL
+        block or END delimited block) of a PDB file are stored.
+
+        It returns a (nframes,2) array with the byte offset of the first atom
+        record of each frame and the byte offset just past its last atom
+        record.  Unless sidecar=False is given, the index is saved next to the
+        PDB file (filename+'.frames.npz') together with the size and the
+        modification time of the file and is reused as long as these do not
+        change, so that indexing a large file is only done once.
+        '''
+
+        sidecar = True
+
+        if 'sidecar' in kwargs:
+            sidecar = kwargs['sidecar']
+
+        sidecar_name = filename+'.frames.npz'
+        file_stat = os.stat(filename)
+
+        if(sidecar and os.path.isfile(sidecar_name)):
+            try:
+                saved = numpy.load(sidecar_name)
+                size = int(saved['size']) ; mtime = float(saved['mtime']) ; offsets = saved['offsets']
+                saved.close()
+                if(size == file_stat.st_size and mtime == file_stat.st_mtime):
+                    return offsets
+            except:
+                pass
+
+        offsets = []
+        position = 0
+        first = None ; last = None
+        modelON = False
+
+        infile = utilities.open_file(filename,'rb')
+
+        for lin in infile:
+            record_name = string.strip(lin[0:6])
+            if(record_name == 'ATOM' or record_name == 'HETATM'):
+                if(first is None):
+                    first = position
+                last = position + len(lin)
+            else:
+                lins = string.split(lin,None,1)
+                if(len(lins) > 0):
+                    end_of_frame = False
+                    if(lins[0] == 'MODEL'):
+                        modelON = True
+                    elif(lins[0] == 'ENDMDL' and modelON):
+                        modelON = False
+                        end_of_frame = True
+                    elif(lins[0] == 'END'):
+                        end_of_frame = True
+                    if(end_of_frame and first is not None):
+                        offsets.append([first,last])
+                        first = None
+            position += len(lin)
+
+        infile.close()
+
+        if(first is not None):
+            offsets.append([first,last])
+
+        offsets = numpy.array(offsets,numpy.int64).reshape(len(offsets),2)
+
+        if(sidecar):
+            try:
+                outfile = open(sidecar_name,'wb')
+                numpy.savez(outfile,offsets=offsets,size=file_stat.st_size,mtime=file_stat.st_mtime)
+                outfile.close()
+            except (IOError,OSError):
+                pass
+
+        return offsets
+
+    def read_pdb_frames(self,filename,frames,**kwargs):
+        '''
+        This method reads the coordinates of selected frames of a multi-frame
+        PDB file into coor() without parsing the other frames.
+
+        frames is a frame number or a list of frame numbers (counting from 0).
+        The atom records of each requested frame are located with
+        index_pdb_frames (kwargs are passed on to it) and read after a seek.
+        The atomic information is not changed, so the molecule is normally
+        set up first with read_pdb(filename,fastread=True).
+        '''
+
+        offsets = self.index_pdb_frames(filename,**kwargs)
+        number_of_frames = len(offsets)
+
+        if(isinstance(frames,(int,long,numpy.integer))):
+            frames = [frames]
+
+        frame_coor = []
+
+        infile = utilities.open_file(filename,'rb')
+
+        for frame in frames:
+            if(frame < 0 or frame >= number_of_frames):
+                infile.close()
+                raise Exception, 'frame '+str(frame)+' is not in '+filename+' which has '+str(number_of_frames)+' frame(s)'
+
+            infile.seek(offsets[frame][0])
+            lines = infile.read(offsets[frame][1]-offsets[frame][0]).splitlines()
+            atom_lines = [lin for lin in lines if string.strip(lin[0:6]) in ('ATOM','HETATM')]
+
+            if(len(frame_coor) > 0 and len(atom_lines) != len(frame_coor[0])):
+                infile.close()
+                raise Exception, 'number of atoms per frame is not equal'
+
+            self._finish_pdb_frame(frame_coor,[],[],[],atom_lines)
+
+        infile.close()
+
+        if(len(frame_coor) > 0):
+            coor = numpy.zeros((len(frame_coor),len(frame_coor[0]),3),numpy.float)
+        else:
+            coor = numpy.zeros((0,0,3),numpy.float)
+
+        for i in xrange(len(frame_coor)):
+            coor[i] = frame_coor[i]
+
+        self._coor = coor
+
+        return
+
+    def read_pdb_frames_parallel(self,filename,workers,**kwargs):
+        '''
+        This method parses the coordinates of frames 2 to N of a multi-frame
+        PDB file in a pool of worker processes.
+
+        The frames are located with offsets=[[first,last],...] (as collected
+        by read_pdb(filename,frame_offsets=list)) or else with
+        index_pdb_frames (kwargs are passed on to it), split into contiguous
+        blocks and each worker reads its blocks with seek and writes the
+        coordinates into a coordinate array that is allocated in shared
+        memory.  That array becomes coor(), so no copy is made.  The first
+        frame is taken from the current coor(), as read by
+        read_pdb(filename,fastread=True).
+        '''
+
+        if 'offsets' in kwargs:
+            offsets = numpy.array(kwargs['offsets'],numpy.int64).reshape(-1,2)
+        else:
+            if 'sidecar' not in kwargs:
+                kwargs['sidecar'] = False
+            offsets = self.index_pdb_frames(filename,**kwargs)
+
+        number_of_frames = len(offsets)
+        natoms = self._coor.shape[1]
+
+        if(number_of_frames != self.number_of_frames()):
+            raise Exception, 'found '+str(number_of_frames)+' frames in '+filename+' but expected '+str(self.number_of_frames())
+
+        shared_coor = multiprocessing.sharedctypes.RawArray('d',number_of_frames*natoms*3)
+        coor = numpy.frombuffer(shared_coor,numpy.float).reshape(number_of_frames,natoms,3)
+        coor[0] = self._coor[0]
+
+        number_of_blocks = min(number_of_frames-1,4*workers)
+        tasks = [(int(frames[0]),offsets[frames].tolist()) for frames in numpy.array_split(numpy.arange(1,number_of_frames),number_of_blocks)]
+
+        pool = multiprocessing.Pool(workers,_initialize_pdb_frame_worker,(filename,shared_coor,coor.shape))
+        try:
+            bad_frames = [frame for frame in pool.map(_read_pdb_frame_block,tasks) if frame is not None]
+        finally:
+            pool.close()
+            pool.join()
+
+        if(len(bad_frames) > 0):
+            raise Exception, 'number of atoms per frame is not equal'
+
+        self._coor = coor
+
+        return
 
     def create_conect_pdb_lines(self):
         """
@@ -727,3 +1341,225 @@ class PDB(object):
             conect_lines.append('CONECT' + str(base).rjust(5) + ndxs)
 
         return conect_lines
+
+
+_pdb_frame_worker = {}
+
+def _initialize_pdb_frame_worker(filename,shared_coor,shape):
+    '''
+    Keep the file name and the shared coordinate array in a worker process of read_pdb_frames_parallel
+    '''
+
+    _pdb_frame_worker['filename'] = filename
+    _pdb_frame_worker['coor'] = numpy.frombuffer(shared_coor,numpy.float).reshape(shape)
+
+    return
+
+def _read_pdb_frame_block(task):
+    '''
+    Parse the frames of one block into the shared coordinate array and return
+    the number of the first frame with the wrong number of atoms, or None
+    '''
+
+    first_frame,offsets = task
+    coor = _pdb_frame_worker['coor']
+    parser = PDB()
+
+    infile = open(_pdb_frame_worker['filename'],'rb')
+
+    for i in xrange(len(offsets)):
+        infile.seek(offsets[i][0])
+        lines = infile.read(offsets[i][1]-offsets[i][0]).splitlines()
+        atom_lines = [lin for lin in lines if string.strip(lin[0:6]) in ('ATOM','HETATM')]
+        if(len(atom_lines) != coor.shape[1]):
+            infile.close()
+            return first_frame+i
+        frame_coor = []
+        parser._finish_pdb_frame(frame_coor,[],[],[],atom_lines)
+        coor[first_frame+i] = frame_coor[0]
+
+    infile.close()
+
+    return None
+
+class PDB_Writer(object):
+
+    '''
+    PDB_Writer keeps a PDB file open and writes frames of a molecule to it.
+
+    The part of each ATOM/HETATM record that does not depend on the
+    coordinates is formatted once, when the writer is created.  Each frame
+    is then formatted in bulk with numpy and written with a single call,
+    so the atomic information of the molecule should not be changed while
+    a writer is open (its coordinates may be).
+
+    >>> writer = pdb_io.PDB_Writer(molecule,'ensemble.pdb','w')
+    >>> writer.write_frames(range(molecule.number_of_frames()))
+    >>> writer.close()
+    '''
+
+    def __init__(self,molecule,filename,flag='w'):
+
+        if(flag=='w' or flag=='W'):
+            self._outfile=utilities.open_file(filename,'w')
+        elif(flag=='a' or flag=='A'):
+            self._outfile=utilities.open_file(filename,'a')
+        else:
+            raise Exception, 'flag must be "w" or "a" to write '+filename
+
+        self._molecule = molecule
+        self._model = 0
+
+        self.format_atom_records()
+
+    def format_atom_records(self):
+        '''
+        Format the columns before (record name to insertion code) and after
+        (occupancy to charge) the coordinates of every atom.  Atoms that
+        can not be formatted are reported and left out, as in write_pdb.
+        '''
+
+        m = self._molecule
+
+        prefix = [] ; suffix = [] ; atoms = []
+
+        for i in xrange(len(m._atom)):
+
+            this_index = m._index[i]
+
+            this_resid = m._resid[i]
+
+            if(this_index > 99999):
+                this_index = '99999'
+            elif(this_index < -9999):
+                this_index = '-9999'
+            else:
+                this_index = str(this_index)
+
+            if(this_resid > 9999):
+                this_resid = '9999'
+            elif(this_resid < -999):
+                this_resid = '-999'
+
+            try:
+                prefix.append("%-6s%5s %-4s%1s%-4s%1s%4s%1s   " % (m._atom[i],this_index,m._name[i],m._loc[i],m._resname[i],m._chain[i],this_resid,m._rescode[i]))
+                suffix.append("%6s%6s      %-4s%2s%2s\n" % (m._occupancy[i],m._beta[i],m._segname[i],m._element[i],m._charge[i]))
+                atoms.append(i)
+            except:
+                del prefix[len(atoms):]
+                self.print_record_error(i,this_index)
+
+        self._prefix = numpy.array(prefix,numpy.string_)
+        self._suffix = numpy.array(suffix,numpy.string_)
+        self._atoms = numpy.array(atoms,numpy.int)
+
+        return
+
+    def print_record_error(self,i,this_index):
+        '''
+        Report an atom that could not be formatted
+        '''
+
+        m = self._molecule
+
+        print('\n>>>> ERROR IN WRITE_PDB <<<<\n')
+        print('>> i = ',i)
+        print('atom = ',m._atom[i],' : type = ',type(m._atom[i]))
+        print('index = ',this_index,' : type = ',type(this_index))
+        print('name = ',m._name[i],' : type = ',type(m._name[i]))
+        print('loc = ',m._loc[i],' : type = ',type(m._loc[i]))
+        print('resname = ',m._resname[i],' : type = ',type(m._resname[i]))
+        print('chain = ',m._chain[i],' : type = ',type(m._chain[i]))
+        print('resid = ',m._resid[i],' : type = ',type(m._resid[i]))
+        print('rescode = ',m._rescode[i],' : type = ',type(m._rescode[i]))
+        print('occupancy = ',m._occupancy[i],' : type = ',type(m._occupancy[i]))
+        print('beta = ',m._beta[i],' : type = ',type(m._beta[i]))
+        print('segname = ',m._segname[i],' : type = ',type(m._segname[i]))
+        print('element = ',m._element[i],' : type = ',type(m._element[i]))
+        print('charge = ',m._charge[i],' : type = ',type(m._charge[i]))
+
+        return
+
+    def format_frame(self,frame):
+        '''
+        Return the ATOM/HETATM records of a frame as one string
+        '''
+
+        natoms = len(self._atoms)
+
+        if(natoms == 0):
+            return ''
+
+        coor = self._molecule._coor[frame][self._atoms].astype(numpy.float)
+
+        # "%8.3f" cut to 8 characters for each of x, y and z, then one
+        # 24 character field per atom
+
+        xyz = numpy.char.mod('%8.3f',coor).astype('S8')
+        xyz = numpy.ascontiguousarray(xyz).view('S24').reshape(natoms)
+
+        records = numpy.char.add(numpy.char.add(self._prefix,xyz),self._suffix)
+
+        return ''.join(records.tolist())
+
+    def conect_records(self):
+        '''
+        Return the CONECT records of the molecule as one string
+        '''
+
+        return ''.join([line + '\n' for line in self._molecule.create_conect_pdb_lines()])
+
+    def write_frame(self,frame,**kwargs):
+        '''
+        Write a single frame; the kwargs (model, final and conect) have the
+        same meaning as in write_pdb
+        '''
+
+        records = []
+
+        if 'model' in kwargs:
+            records.append("MODEL "+str(kwargs['model'])+"\n")
+
+        records.append(self.format_frame(frame))
+
+        if ('final' in kwargs) or ('model' not in kwargs):
+
+            if 'conect' in kwargs and kwargs['conect']:
+                records.append(self.conect_records())
+
+            records.append("END\n")
+
+        else:
+
+            records.append("ENDMDL\n")
+
+        self._outfile.write(''.join(records))
+
+        return
+
+    def write_frames(self,frames,**kwargs):
+        '''
+        Write each frame in frames as a MODEL/ENDMDL block and terminate
+        the file with END (preceded by the CONECT records if conect=True).
+        Models are numbered consecutively from 1 for each writer.
+        '''
+
+        for frame in frames:
+            self._model += 1
+            self._outfile.write("MODEL "+str(self._model)+"\n"+self.format_frame(frame)+"ENDMDL\n")
+
+        if 'conect' in kwargs and kwargs['conect']:
+            self._outfile.write(self.conect_records())
+
+        self._outfile.write("END\n")
+
+        return
+
+    def close(self):
+        '''
+        Close the file
+        '''
+
+        self._outfile.close()
+
+        return
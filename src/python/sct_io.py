@@ -0,0 +1,369 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+#from __future__ import unicode_literals
+#
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+import struct
+import zlib
+import numpy
+
+#	SCT_IO
+#
+#
+#LC	 1         2         3         4         5         6         7
+#LC4567890123456789012345678901234567890123456789012345678901234567890123456789
+#								       *      **
+'''
+	SCT_IO contains the class that reads and writes coordinates in the
+	SASMOL compressed trajectory (SCT) format, a compact format meant for
+	storing large ensembles.
+
+	Coordinates are rounded to a fixed precision (0.001 Angstrom unless
+	another one is given) and stored as integers.  The frames are grouped
+	in chunks; within a chunk the first frame is stored as differences
+	between consecutive atoms and the other frames as differences from
+	the previous frame.  The bytes of the integers are regrouped by
+	significance (all low bytes first, etc.) and every chunk is
+	compressed with zlib (default) or lzma.  Unit cells (see unitcell)
+	are stored unchanged with the frames of their chunk.
+
+	The file starts with a header (SCT_HEADER) and ends with an index
+	that holds the position and size of every chunk, so single frames
+	can be read without decompressing the whole file (read_sct_frames).
+
+    These classes are accessed by the Atom class found in
+    the sasmol.system module through the file_io File() class.
+'''
+
+SCT_MAGIC = 'SCTR'
+
+SCT_VERSION = 1
+
+#	magic, version, natoms, nframes, frames per chunk, codec, unit cells,
+#	precision and position of the chunk index
+
+SCT_HEADER = '<4siiiiiidQ'
+
+SCT_CODECS = {'none':0, 'zlib':1, 'lzma':2}
+
+#	default number of frames that are compressed together
+
+SCT_FRAMES_PER_CHUNK = 100
+
+class SCT(object):
+
+    def sct_codec_module(self,codec):
+        '''
+        This method returns the module used to compress and decompress
+        chunks with the given codec (see SCT_CODECS), or None if they are
+        stored uncompressed.
+        '''
+
+        if(codec == SCT_CODECS['none']):
+            return None
+        elif(codec == SCT_CODECS['zlib']):
+            return zlib
+
+        try:
+            import lzma
+        except ImportError:
+            try:
+                from backports import lzma
+            except ImportError:
+                raise Exception, 'the lzma module is needed for lzma compressed sct files'
+
+        return lzma
+
+    def sct_encode_chunk(self,coor,unitcell,precision,codec):
+        '''
+        This method returns the compressed data of a chunk holding the
+        (nframes,natoms,3) coordinates coor and the (nframes,6) unit cells
+        unitcell (or None).
+        '''
+
+        quantized = numpy.rint(coor.transpose(0,2,1)/precision)
+
+        if(quantized.size > 0 and numpy.abs(quantized).max() >= 2**31):
+            raise Exception, 'the coordinates can not be stored with a precision of '+str(precision)
+
+        quantized = quantized.astype(numpy.int64)
+
+        deltas = numpy.empty(quantized.shape,numpy.int64)
+        deltas[0,:,0] = quantized[0,:,0]
+        deltas[0,:,1:] = numpy.diff(quantized[0],axis=1)
+        deltas[1:] = numpy.diff(quantized,axis=0)
+
+        # the deltas of values within 32 bits can need 33 bits, so they are
+        # stored modulo 2**32 and sct_decode_chunk sums them modulo 2**32
+
+        data = numpy.bitwise_and(deltas,0xffffffff).astype('<u4').view(numpy.uint8).reshape(-1,4).T.tostring()
+
+        if(unitcell is not None):
+            data += numpy.asarray(unitcell,'<f8').tostring()
+
+        module = self.sct_codec_module(codec)
+
+        if(module is not None):
+            data = module.compress(data)
+
+        return data
+
+    def sct_decode_chunk(self,data,header,nframes):
+        '''
+        This method returns the (nframes,natoms,3) coordinates and the
+        (nframes,6) unit cells (or None) of a chunk compressed by
+        sct_encode_chunk.
+        '''
+
+        natoms = header['natoms']
+
+        module = self.sct_codec_module(header['codec'])
+
+        if(module is not None):
+            data = module.decompress(data)
+
+        size = 4*nframes*3*natoms
+
+        deltas = numpy.frombuffer(data,numpy.uint8,size).reshape(4,-1).T.copy().view('<i4')
+        deltas = deltas.reshape(nframes,3,natoms).astype(numpy.int32)
+
+        # 32 bit sums wrap around like the stored deltas, so they give back
+        # the quantized values exactly
+
+        with numpy.errstate(over='ignore'):
+            deltas[0] = numpy.cumsum(deltas[0],axis=1,dtype=numpy.int32)
+            quantized = numpy.cumsum(deltas,axis=0,dtype=numpy.int32)
+
+        coor = (quantized.astype(numpy.float)*header['precision']).transpose(0,2,1)
+
+        unitcell = None
+
+        if(header['unitcell']):
+            unitcell = numpy.frombuffer(data,'<f8',6*nframes,size).reshape(nframes,6).astype(numpy.float)
+
+        return coor,unitcell
+
+    def read_sct_header(self,infile):
+        '''
+        This method reads the header and the chunk index of a SCT file
+        object and returns a dictionary describing the file (natoms,
+        nframes, frames_per_chunk, codec, unitcell, precision and index,
+        an (nchunks,2) array of the position and size of every chunk).
+        '''
+
+        infile.seek(0)
+        data = infile.read(struct.calcsize(SCT_HEADER))
+
+        if(len(data) != struct.calcsize(SCT_HEADER) or data[0:4] != SCT_MAGIC):
+            raise Exception, 'failed to read header: not a sct file'
+
+        magic,version,natoms,nframes,frames_per_chunk,codec,unitcell,precision,index_offset = struct.unpack(SCT_HEADER,data)
+
+        if(version != SCT_VERSION):
+            raise Exception, 'sct file version '+str(version)+' is not supported'
+
+        if(index_offset == 0):
+            raise Exception, 'the sct file was not closed properly: the chunk index is missing'
+
+        nchunks = -(-nframes//frames_per_chunk)
+
+        infile.seek(index_offset)
+        index = numpy.frombuffer(infile.read(16*nchunks),'<u8')
+
+        if(len(index) != 2*nchunks):
+            raise Exception, 'failed to read the chunk index of the sct file'
+
+        header = {'natoms':natoms, 'nframes':nframes, 'frames_per_chunk':frames_per_chunk,
+                  'codec':codec, 'unitcell':unitcell, 'precision':precision,
+                  'index':index.reshape(nchunks,2).astype(numpy.int64)}
+
+        return header
+
+    def read_sct_chunk(self,infile,header,chunk):
+        '''
+        This method reads and decodes a chunk (counting from 0) of a SCT
+        file object (see sct_decode_chunk).
+        '''
+
+        offset,size = header['index'][chunk]
+        first = chunk*header['frames_per_chunk']
+        nframes = min(header['frames_per_chunk'],header['nframes']-first)
+
+        infile.seek(offset)
+
+        return self.sct_decode_chunk(infile.read(size),header,nframes)
+
+    def read_sct(self,filename):
+        '''
+        This method reads all frames of a SCT file into coor() and, if the
+        file has them, the unit cells into unitcell().
+        '''
+
+        infile = open(filename,'rb')
+
+        try:
+            header = self.read_sct_header(infile)
+
+            coor = numpy.zeros((header['nframes'],header['natoms'],3),numpy.float)
+            unitcell = None
+
+            if(header['unitcell']):
+                unitcell = numpy.zeros((header['nframes'],6),numpy.float)
+
+            for chunk in xrange(len(header['index'])):
+                first = chunk*header['frames_per_chunk']
+                chunk_coor,chunk_unitcell = self.read_sct_chunk(infile,header,chunk)
+                coor[first:first+len(chunk_coor)] = chunk_coor
+                if(unitcell is not None):
+                    unitcell[first:first+len(chunk_coor)] = chunk_unitcell
+
+        finally:
+            infile.close()
+
+        self._coor = coor
+        self._unitcell = unitcell
+
+        return
+
+    def read_sct_frames(self,filename,frames):
+        '''
+        This method reads the given frames (counting from 0) of a SCT file
+        into coor() and unitcell(), in the order given.  Only the chunks
+        that hold the frames are read and decompressed.
+
+        frames can be a single frame or a sequence of frames.
+        '''
+
+        frames = numpy.atleast_1d(numpy.asarray(frames,numpy.int))
+
+        infile = open(filename,'rb')
+
+        try:
+            header = self.read_sct_header(infile)
+
+            if(len(frames) > 0 and (frames.min() < 0 or frames.max() >= header['nframes'])):
+                raise Exception, 'frames must be between 0 and '+str(header['nframes']-1)+' in '+filename
+
+            coor = numpy.zeros((len(frames),header['natoms'],3),numpy.float)
+            unitcell = None
+
+            if(header['unitcell']):
+                unitcell = numpy.zeros((len(frames),6),numpy.float)
+
+            chunks = frames//header['frames_per_chunk']
+
+            for chunk in numpy.unique(chunks):
+                chunk_coor,chunk_unitcell = self.read_sct_chunk(infile,header,chunk)
+                wanted = numpy.nonzero(chunks == chunk)[0]
+                in_chunk = frames[wanted]-chunk*header['frames_per_chunk']
+                coor[wanted] = chunk_coor[in_chunk]
+                if(unitcell is not None):
+                    unitcell[wanted] = chunk_unitcell[in_chunk]
+
+        finally:
+            infile.close()
+
+        self._coor = coor
+        self._unitcell = unitcell
+
+        return coor
+
+    def write_sct_frames(self,filename,start,end,**kwargs):
+        '''
+        This method writes frames start to end-1 to a SCT file.
+
+        precision=value sets the precision of the stored coordinates in
+        Angstrom (default 0.001), compression='zlib', 'lzma' or 'none'
+        the compression of the chunks (default zlib) and
+        frames_per_chunk=number the number of frames that are compressed
+        together (default SCT_FRAMES_PER_CHUNK).  Larger chunks compress
+        better but more frames have to be decompressed to read one.
+
+        The unit cells of the molecule (see unitcell) are written if it
+        has them.
+        '''
+
+        precision = 0.001 ; compression = 'zlib'
+        frames_per_chunk = SCT_FRAMES_PER_CHUNK
+
+        if 'precision' in kwargs:
+            precision = float(kwargs['precision'])
+        if 'compression' in kwargs:
+            compression = kwargs['compression']
+        if 'frames_per_chunk' in kwargs:
+            frames_per_chunk = int(kwargs['frames_per_chunk'])
+
+        if(compression is None):
+            compression = 'none'
+
+        if(compression not in SCT_CODECS):
+            raise Exception, 'compression must be one of '+', '.join(sorted(SCT_CODECS))+': '+str(compression)
+        if(precision <= 0.0):
+            raise Exception, 'precision must be positive: '+str(precision)
+        if(frames_per_chunk < 1):
+            raise Exception, 'frames_per_chunk must be at least 1: '+str(frames_per_chunk)
+
+        codec = SCT_CODECS[compression]
+        self.sct_codec_module(codec)
+
+        natoms = self._coor.shape[1]
+        nframes = end-start
+
+        unitcell = getattr(self,'_unitcell',None)
+
+        if(unitcell is not None):
+            unitcell = numpy.asarray(unitcell,numpy.float)
+            if(unitcell.shape == (6,)):
+                unitcell = numpy.tile(unitcell,(self._coor.shape[0],1))
+            elif(unitcell.shape != (self._coor.shape[0],6)):
+                raise Exception, 'the unit cell must hold 6 values or 6 values for each of the '+str(self._coor.shape[0])+' frames'
+
+        outfile = open(filename,'wb')
+
+        outfile.write(struct.pack(SCT_HEADER,SCT_MAGIC,SCT_VERSION,natoms,nframes,frames_per_chunk,codec,int(unitcell is not None),precision,0))
+
+        index = []
+
+        for first in xrange(start,end,frames_per_chunk):
+            last = min(first+frames_per_chunk,end)
+            chunk_unitcell = None
+            if(unitcell is not None):
+                chunk_unitcell = unitcell[first:last]
+            data = self.sct_encode_chunk(self._coor[first:last],chunk_unitcell,precision,codec)
+            index.append((outfile.tell(),len(data)))
+            outfile.write(data)
+
+        index_offset = outfile.tell()
+        outfile.write(numpy.array(index,'<u8').tostring())
+
+        outfile.seek(0)
+        outfile.write(struct.pack(SCT_HEADER,SCT_MAGIC,SCT_VERSION,natoms,nframes,frames_per_chunk,codec,int(unitcell is not None),precision,index_offset))
+        outfile.close()
+
+        return
+
+    def write_sct(self,filename,**kwargs):
+        '''
+        This method writes all frames to a SCT file (see write_sct_frames
+        for the options).
+        '''
+
+        self.write_sct_frames(filename,0,self._coor.shape[0],**kwargs)
+
+        return
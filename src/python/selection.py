@@ -0,0 +1,934 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+#from __future__ import unicode_literals
+#
+#
+#    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#	SELECTION
+#
+#
+# LC	 1         2         3         4         5         6         7
+# LC4567890123456789012345678901234567890123456789012345678901234567890123456789
+#								       *      **
+import re
+import ast
+import operator
+import collections
+import numpy
+
+'''
+	Selection is the module that compiles the basis_filter strings
+	used by subset.Mask.get_subset_mask into expressions that are
+	evaluated on whole descriptor arrays at once.
+
+	A filter such as 'name[i] == "CA" and resid[i] < 10' is parsed once
+	into a python expression tree.  Every descriptor[i] becomes the
+	array of that descriptor for all atoms, comparisons become numpy
+	comparisons and "and", "or" and "not" become logical_and, logical_or
+	and logical_not.  Filters that use anything else (other variables,
+	arbitrary function calls, ...) are not compiled, and get_subset_mask
+	evaluates them one atom at a time as before.
+
+	Keywords (all, protein, nucleic, water, backbone, calpha, hydrogen,
+	heavy, hydrophobic, polar, acidic, basic and charged) stand for the
+	masks of common sets of atoms, which each molecule computes once
+	from its moltype, name, resname and element descriptors and keeps
+	until they change (see Mask.keyword_masks), so that filters such as
+	'backbone and not hydrogen' only combine masks.
+
+	The masks of compiled filters are kept by each molecule in a
+	Selection_Cache, so selecting the same atoms again is free until
+	the descriptors of the molecule change.
+
+	Distance clauses select atoms by their distance to a second set of
+	atoms in one frame:
+
+	'segname[i] == "WAT" less_than 5 angstroms from moltype[j] == "protein"'
+	'name[i] == "CA" greater_than 10 angstroms from name[j] == "ZN"'
+	'name[i] == "OH2" between 3 and 5 angstroms from resname[j] == "LYS"'
+
+	The distance of an atom is the distance to its nearest atom of the
+	second set, which is found with a cell list (nearest_distances), so
+	the cost grows with the number of atoms rather than with the number
+	of pairs.
+
+	Hydrogen bond clauses select the atoms that are hydrogen bonded to
+	a second set of atoms in one frame:
+
+	'segname[i] == "RNA" hydrogen_bonded to resname[j] == "TIP3"'
+
+	Donors (with their hydrogens) and acceptors are taken from the DONO
+	and ACCE entries of a CHARMM topology (hydrogen_bond_atoms) and the
+	bonds of whole trajectories are found with one cell list for many
+	frames at a time (find_hydrogen_bonds).
+
+'''
+
+#	descriptors that can be used as descriptor[i] in a filter
+
+SELECTION_DESCRIPTORS = ['index', 'name', 'loc', 'resname', 'chain', 'resid',
+                         'rescode', 'occupancy', 'beta', 'segname', 'element',
+                         'charge', 'moltype', 'residue_flag']
+
+#	keywords that can be used for common sets of atoms and the
+#	descriptors their masks are made from (see keyword_masks)
+
+SELECTION_KEYWORDS = {'all': (), 'protein': ('moltype',), 'nucleic': ('moltype',),
+                      'water': ('moltype',), 'backbone': ('moltype', 'name'),
+                      'calpha': ('moltype', 'name'), 'hydrogen': ('element',),
+                      'heavy': ('element',), 'hydrophobic': ('moltype', 'resname'),
+                      'polar': ('moltype', 'resname'), 'acidic': ('moltype', 'resname'),
+                      'basic': ('moltype', 'resname'), 'charged': ('moltype', 'resname')}
+
+SELECTION_PROTEIN_BACKBONE = ['N', 'CA', 'C', 'O']
+
+SELECTION_NUCLEIC_BACKBONE = ['P', 'O1P', 'O2P', 'OP1', 'OP2', "O5'", "C5'", "C4'", "C3'", "O3'"]
+
+SELECTION_HYDROPHOBIC = ['ALA', 'VAL', 'LEU', 'ILE', 'MET', 'PHE', 'TRP', 'PRO']
+
+SELECTION_ACIDIC = ['ASP', 'GLU']
+
+SELECTION_BASIC = ['ARG', 'LYS', 'HIS', 'HSD', 'HSE', 'HSP']
+
+#	functions that can be applied to the value of each atom
+
+SELECTION_FUNCTIONS = {'len': len, 'int': int, 'float': float, 'str': str, 'abs': abs}
+
+SELECTION_COMPARISONS = {ast.Eq: operator.eq, ast.NotEq: operator.ne,
+                         ast.Lt: operator.lt, ast.LtE: operator.le,
+                         ast.Gt: operator.gt, ast.GtE: operator.ge}
+
+SELECTION_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub,
+                       ast.Mult: operator.mul, ast.Div: operator.truediv,
+                       ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod}
+
+#	number of compiled filters that are kept (see compile_selection)
+
+SELECTION_CACHE_SIZE = 256
+
+#	number of masks kept by each molecule (see Selection_Cache)
+
+SELECTION_MASK_CACHE_SIZE = 32
+
+_compiled_selections = {}
+
+SELECTION_NUMBER = r'([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'
+
+SELECTION_DISTANCE = re.compile(r'\s(?:(less_than|greater_than)\s+' + SELECTION_NUMBER +
+                                r'|(between)\s+' + SELECTION_NUMBER + r'\s+and\s+' + SELECTION_NUMBER +
+                                r')\s+angstroms\s+from\s')
+
+SELECTION_HYDROGEN_BOND = re.compile(r'\shydrogen_bonded\s+to\s')
+
+#	number of atom pairs compared at once by cell_pairs
+
+SELECTION_PAIR_BLOCK_SIZE = 1048576
+
+#	largest donor - acceptor distance (angstroms) and smallest
+#	donor - hydrogen - acceptor angle (degrees) of a hydrogen bond
+
+SELECTION_HYDROGEN_BOND_DISTANCE = 3.5
+
+SELECTION_HYDROGEN_BOND_ANGLE = 150.0
+
+
+class Compiled_Selection(object):
+
+    '''
+    Compiled_Selection holds the expression tree of a basis_filter and
+    evaluates it on the descriptors of a molecule.
+
+    >>> selection = compile_selection('name[i] == "CA" and resid[i] < 10')
+    >>> mask = selection.evaluate(molecule)
+    '''
+
+    def __init__(self, basis_filter, tree, descriptors, keywords=()):
+
+        self.basis_filter = basis_filter
+        self._tree = tree
+        self.descriptors = descriptors
+        self.keywords = keywords
+
+        # descriptors that the mask depends on, also through keywords
+
+        dependencies = set(descriptors)
+        for keyword in keywords:
+            dependencies.update(SELECTION_KEYWORDS[keyword])
+        self.dependencies = sorted(dependencies)
+
+    def evaluate(self, molecule):
+        '''
+        Return the boolean mask of the atoms of molecule selected by the
+        filter.  Any error (a missing descriptor, a comparison that fails
+        for some atoms, ...) is raised to the caller.
+        '''
+
+        natoms = molecule.natoms()
+
+        columns = {}
+
+        for descriptor in self.descriptors:
+            columns[descriptor] = descriptor_array(getattr(molecule, descriptor)(), natoms)
+
+        if len(self.keywords) > 0:
+            masks = molecule.keyword_masks()
+            for keyword in self.keywords:
+                columns[keyword] = masks[keyword]
+
+        with numpy.errstate(divide='raise'):
+            selected = truth(self._value(self._tree.body, columns, natoms))
+
+        if not isinstance(selected, numpy.ndarray):
+            selected = numpy.array([selected] * natoms, numpy.bool)
+
+        return selected
+
+    def _value(self, node, columns, natoms):
+
+        if isinstance(node, ast.BoolOp):
+            values = [truth(self._value(value, columns, natoms)) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return reduce(numpy.logical_and, values)
+            return reduce(numpy.logical_or, values)
+
+        elif isinstance(node, ast.UnaryOp):
+            value = self._value(node.operand, columns, natoms)
+            if isinstance(node.op, ast.Not):
+                return numpy.logical_not(truth(value))
+            elif isinstance(node.op, ast.USub):
+                return -value
+            return +value
+
+        elif isinstance(node, ast.BinOp):
+            left = self._value(node.left, columns, natoms)
+            right = self._value(node.right, columns, natoms)
+            return SELECTION_OPERATORS[type(node.op)](left, right)
+
+        elif isinstance(node, ast.Compare):
+            selected = True
+            left = self._value(node.left, columns, natoms)
+            for op, comparator in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.In, ast.NotIn)):
+                    right = [self._value(element, columns, natoms) for element in comparator.elts]
+                    found = False
+                    for element in right:
+                        found = numpy.logical_or(found, truth(compare(operator.eq, left, element)))
+                    if isinstance(op, ast.NotIn):
+                        found = numpy.logical_not(found)
+                    selected = numpy.logical_and(selected, found)
+                else:
+                    right = self._value(comparator, columns, natoms)
+                    selected = numpy.logical_and(selected, truth(compare(SELECTION_COMPARISONS[type(op)], left, right)))
+                    left = right
+            return selected
+
+        elif isinstance(node, ast.Subscript):
+            if isinstance(node.value, ast.Name) and node.value.id in SELECTION_DESCRIPTORS:
+                return columns[node.value.id]
+            value = self._value(node.value, columns, natoms)
+            if isinstance(node.slice, ast.Index):
+                key = self._value(node.slice.value, columns, natoms)
+            else:
+                key = slice(*[None if part is None else self._value(part, columns, natoms)
+                              for part in (node.slice.lower, node.slice.upper, node.slice.step)])
+            return per_atom(lambda x: x[key], value)
+
+        elif isinstance(node, ast.Call):
+            arguments = [self._value(argument, columns, natoms) for argument in node.args]
+            if isinstance(node.func, ast.Name):
+                return per_atom(SELECTION_FUNCTIONS[node.func.id], arguments[0])
+            method = node.func.attr
+            return per_atom(lambda x: getattr(x, method)(*arguments), self._value(node.func.value, columns, natoms))
+
+        elif isinstance(node, ast.Name):
+            if node.id == 'i':
+                return numpy.arange(natoms)
+            elif node.id in SELECTION_KEYWORDS:
+                return columns[node.id]
+            return {'True': True, 'False': False, 'None': None}[node.id]
+
+        elif isinstance(node, ast.Num):
+            return node.n
+
+        elif isinstance(node, ast.Str):
+            return node.s
+
+        raise Exception('can not evaluate ' + ast.dump(node))
+
+
+class Selection_Cache(object):
+
+    '''
+    Selection_Cache keeps the masks and indices of the compiled filters
+    most recently evaluated for a molecule, the least recently used
+    one is dropped first.
+
+    A mask is used again only if the molecule still has the same number
+    of atoms, the same topology version (see Atom.topology_version,
+    which the descriptor setters and set_descriptor_using_mask advance)
+    and the same descriptor objects that the filter uses, directly or
+    through keywords, so reading a new file or setting a descriptor
+    discards it.
+
+    >>> cache = Selection_Cache()
+    >>> cache.put(molecule, selection, mask)
+    >>> mask, indices = cache.get(molecule, selection)
+    '''
+
+    def __init__(self, size=SELECTION_MASK_CACHE_SIZE):
+
+        self._size = size
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+
+        return len(self._entries)
+
+    def key(self, molecule, selection):
+
+        descriptors = tuple(getattr(molecule, descriptor)() for descriptor in selection.dependencies)
+
+        return molecule.topology_version(), molecule.natoms(), descriptors
+
+    def get(self, molecule, selection):
+        '''
+        Return the mask and the indices of the selected atoms, or None if
+        they are not kept or the molecule has changed since.  The arrays
+        are read-only.
+        '''
+
+        entry = self._entries.pop(selection.basis_filter, None)
+
+        if entry is None:
+            return None
+
+        version, natoms, descriptors = self.key(molecule, selection)
+
+        if version != entry[0] or natoms != entry[1] or \
+                any(this is not that for this, that in zip(descriptors, entry[2])):
+            return None
+
+        self._entries[selection.basis_filter] = entry
+
+        return entry[3], entry[4]
+
+    def put(self, molecule, selection, mask):
+        '''
+        Keep a copy of the mask of a compiled selection for molecule.
+        '''
+
+        mask = numpy.array(mask, numpy.int32)
+        indices = numpy.nonzero(mask)[0]
+
+        mask.flags.writeable = False
+        indices.flags.writeable = False
+
+        self._entries.pop(selection.basis_filter, None)
+        self._entries[selection.basis_filter] = self.key(molecule, selection) + (mask, indices)
+
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+        return
+
+    def clear(self):
+
+        self._entries.clear()
+
+        return
+
+
+def descriptor_array(values, natoms):
+    '''
+    Return the first natoms values of a descriptor as a numpy array.
+    Descriptors that are not numeric arrays (lists of strings, ...) are
+    stored in object arrays so that comparisons behave as in python.
+    '''
+
+    if values is None or len(values) < natoms:
+        raise Exception('the descriptor does not have a value for every atom')
+
+    if isinstance(values, numpy.ndarray) and values.dtype.kind in 'biuf':
+        return values[:natoms]
+
+    array = numpy.empty(natoms, numpy.object)
+    array[:] = list(values[:natoms])
+
+    return array
+
+
+def truth(value):
+    '''
+    Return the truth value of every element of an array (or of a
+    single value).
+    '''
+
+    if isinstance(value, numpy.ndarray):
+        return value.astype(numpy.bool)
+
+    return bool(value)
+
+
+def compare(comparison, left, right):
+    '''
+    Compare left and right element by element.  A numeric array compared
+    with a string or an object array is converted to an object array
+    first so that the comparison follows python.
+    '''
+
+    if isinstance(left, numpy.ndarray) and left.dtype.kind != 'O' and not is_numeric(right):
+        left = left.astype(numpy.object)
+    if isinstance(right, numpy.ndarray) and right.dtype.kind != 'O' and not is_numeric(left):
+        right = right.astype(numpy.object)
+
+    result = comparison(left, right)
+
+    if result is NotImplemented:
+        raise Exception('can not compare the values')
+
+    return result
+
+
+def is_numeric(value):
+
+    if isinstance(value, numpy.ndarray):
+        return value.dtype.kind in 'biuf'
+
+    return isinstance(value, (bool, int, long, float, numpy.number))
+
+
+def per_atom(function, value):
+    '''
+    Apply function to the value of every atom (or to a single value).
+    '''
+
+    if isinstance(value, numpy.ndarray):
+        return numpy.frompyfunc(function, 1, 1)(value.astype(numpy.object))
+
+    return function(value)
+
+
+def check_node(node, descriptors):
+    '''
+    Check that node only uses the constructs that Compiled_Selection can
+    evaluate and collect the descriptors it uses.  Return False if it
+    uses anything else.
+    '''
+
+    if isinstance(node, ast.BoolOp):
+        return all(check_node(value, descriptors) for value in node.values)
+
+    elif isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, (ast.Not, ast.USub, ast.UAdd)) and check_node(node.operand, descriptors)
+
+    elif isinstance(node, ast.BinOp):
+        return type(node.op) in SELECTION_OPERATORS and check_node(node.left, descriptors) and check_node(node.right, descriptors)
+
+    elif isinstance(node, ast.Compare):
+        if not check_node(node.left, descriptors):
+            return False
+        for op, comparator in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                if not isinstance(comparator, (ast.List, ast.Tuple)):
+                    return False
+                if not all(isinstance(element, (ast.Num, ast.Str)) for element in comparator.elts):
+                    return False
+            elif type(op) not in SELECTION_COMPARISONS or not check_node(comparator, descriptors):
+                return False
+        return True
+
+    elif isinstance(node, ast.Subscript):
+        if isinstance(node.value, ast.Name) and node.value.id in SELECTION_DESCRIPTORS:
+            if isinstance(node.slice, ast.Index) and isinstance(node.slice.value, ast.Name) and node.slice.value.id == 'i':
+                descriptors.add(node.value.id)
+                return True
+            return False
+        if isinstance(node.slice, ast.Index):
+            key_ok = isinstance(node.slice.value, ast.Num) or (isinstance(node.slice.value, ast.UnaryOp) and isinstance(node.slice.value.operand, ast.Num))
+        elif isinstance(node.slice, ast.Slice):
+            key_ok = all(part is None or isinstance(part, ast.Num) or (isinstance(part, ast.UnaryOp) and isinstance(part.operand, ast.Num))
+                         for part in (node.slice.lower, node.slice.upper, node.slice.step))
+        else:
+            key_ok = False
+        return key_ok and check_node(node.value, descriptors)
+
+    elif isinstance(node, ast.Call):
+        if node.keywords or node.starargs or node.kwargs:
+            return False
+        if isinstance(node.func, ast.Name):
+            return node.func.id in SELECTION_FUNCTIONS and len(node.args) == 1 and check_node(node.args[0], descriptors)
+        if isinstance(node.func, ast.Attribute) and not node.func.attr.startswith('_'):
+            return all(isinstance(argument, (ast.Num, ast.Str)) for argument in node.args) and check_node(node.func.value, descriptors)
+        return False
+
+    elif isinstance(node, ast.Name):
+        return node.id in ('i', 'True', 'False', 'None') or node.id in SELECTION_KEYWORDS
+
+    return isinstance(node, (ast.Num, ast.Str))
+
+
+def keyword_masks(molecule):
+    '''
+    Return {keyword: mask} with the boolean masks of all the keywords of
+    SELECTION_KEYWORDS, computed from the moltype, name, resname and
+    element descriptors of molecule.
+
+    >>> masks = keyword_masks(molecule)
+    >>> numpy.sum(masks['calpha'])
+    '''
+
+    natoms = molecule.natoms()
+
+    moltype = numpy.asarray(molecule.moltype())[:natoms]
+    name = numpy.asarray(molecule.name())[:natoms]
+    resname = numpy.asarray(molecule.resname())[:natoms]
+    element = numpy.asarray(molecule.element())[:natoms]
+
+    masks = {}
+
+    masks['all'] = numpy.ones(natoms, numpy.bool)
+    masks['protein'] = numpy.in1d(moltype, ['protein'])
+    masks['nucleic'] = numpy.in1d(moltype, ['rna', 'dna'])
+    masks['water'] = numpy.in1d(moltype, ['water'])
+    masks['backbone'] = (masks['protein'] & numpy.in1d(name, SELECTION_PROTEIN_BACKBONE)) | \
+        (masks['nucleic'] & numpy.in1d(name, SELECTION_NUCLEIC_BACKBONE))
+    masks['calpha'] = masks['protein'] & numpy.in1d(name, ['CA'])
+    masks['hydrogen'] = numpy.in1d(element, ['H', 'D'])
+    masks['heavy'] = ~masks['hydrogen']
+    masks['hydrophobic'] = masks['protein'] & numpy.in1d(resname, SELECTION_HYDROPHOBIC)
+    masks['polar'] = masks['protein'] & ~masks['hydrophobic']
+    masks['acidic'] = masks['protein'] & numpy.in1d(resname, SELECTION_ACIDIC)
+    masks['basic'] = masks['protein'] & numpy.in1d(resname, SELECTION_BASIC)
+    masks['charged'] = masks['acidic'] | masks['basic']
+
+    for mask in masks.values():
+        mask.flags.writeable = False
+
+    return masks
+
+
+def hide_groups(basis_filter):
+    '''
+    Return basis_filter with quoted strings and parenthesized groups
+    blanked out, so that only top level clauses are found in it.
+    '''
+
+    hidden = list(basis_filter)
+    depth = 0 ; quote = None
+
+    for position, character in enumerate(basis_filter):
+        if quote is not None:
+            if character == quote:
+                quote = None
+            hidden[position] = '_'
+        elif character in '"\'':
+            quote = character
+            hidden[position] = '_'
+        elif character == '(':
+            depth += 1
+            hidden[position] = '_'
+        elif character == ')':
+            depth -= 1
+            hidden[position] = '_'
+        elif depth > 0:
+            hidden[position] = '_'
+
+    return ''.join(hidden)
+
+
+def distance_clause(basis_filter):
+    '''
+    Split a filter with a distance clause into its parts and return
+    (atoms, others, low, high): the filter of the atoms to select, the
+    filter of the atoms the distance is measured to (with [j] replaced
+    by [i]) and the range of the distance to the nearest of them (low is
+    exclusive for less_than, high exclusive for greater_than and both
+    inclusive for between; a missing bound is None).  Return None if
+    the filter has no distance clause outside quotes and parentheses.
+
+    >>> distance_clause('name[i] == "CA" less_than 5 angstroms from name[j] == "N"')
+    ('name[i] == "CA"', 'name[i] == "N"', None, 5.0)
+    '''
+
+    match = SELECTION_DISTANCE.search(hide_groups(basis_filter))
+
+    if match is None:
+        return None
+
+    atoms = basis_filter[:match.start()].strip()
+    others = re.sub(r'\[\s*j\s*\]', '[i]', basis_filter[match.end():]).strip()
+
+    if match.group(1) == 'less_than':
+        return atoms, others, None, float(match.group(2))
+    elif match.group(1) == 'greater_than':
+        return atoms, others, float(match.group(2)), None
+
+    return atoms, others, float(match.group(4)), float(match.group(5))
+
+
+def hydrogen_bond_clause(basis_filter):
+    '''
+    Split a filter with a hydrogen bond clause into (atoms, others): the
+    filter of the atoms to select and the filter of the atoms they are
+    hydrogen bonded to (with [j] replaced by [i]).  Return None if the
+    filter has no hydrogen bond clause outside quotes and parentheses.
+
+    >>> hydrogen_bond_clause('segname[i] == "RNA" hydrogen_bonded to resname[j] == "TIP3"')
+    ('segname[i] == "RNA"', 'resname[i] == "TIP3"')
+    '''
+
+    match = SELECTION_HYDROGEN_BOND.search(hide_groups(basis_filter))
+
+    if match is None:
+        return None
+
+    atoms = basis_filter[:match.start()].strip()
+    others = re.sub(r'\[\s*j\s*\]', '[i]', basis_filter[match.end():]).strip()
+
+    return atoms, others
+
+
+def cell_pairs(points, targets, cutoff, point_groups=None, target_groups=None):
+    '''
+    Generate the pairs of the (n,3) points and (m,3) targets that are in
+    the same or neighboring cells of a grid of cubic cells with an edge
+    of cutoff, in blocks of about SELECTION_PAIR_BLOCK_SIZE pairs.  If
+    integer groups (for example frame numbers) of the points and targets
+    are given, points are only paired with targets of the same group.
+
+    Each block is (block, starts, pair_points, pair_targets, squared):
+    the points that have pairs in the block, the position of the first
+    pair of each of them, and the point, target and squared distance of
+    every pair.  A point is in a block at most once.
+    '''
+
+    points = numpy.asarray(points, numpy.float).reshape(-1, 3)
+    targets = numpy.asarray(targets, numpy.float).reshape(-1, 3)
+
+    if len(points) == 0 or len(targets) == 0 or cutoff < 0.0:
+        return
+
+    if point_groups is None:
+        point_groups = numpy.zeros(len(points), numpy.int64)
+    if target_groups is None:
+        target_groups = numpy.zeros(len(targets), numpy.int64)
+
+    low = numpy.minimum(points.min(axis=0), targets.min(axis=0))
+    high = numpy.maximum(points.max(axis=0), targets.max(axis=0))
+
+    size = max(cutoff, (high - low).max() * 1.0e-6, 1.0e-9)
+    shape = numpy.floor((high - low) / size).astype(numpy.int64) + 3
+
+    def cell_keys(cells, groups):
+        return ((numpy.asarray(groups, numpy.int64) * shape[0] + cells[:, 0]) * shape[1] + cells[:, 1]) * shape[2] + cells[:, 2]
+
+    # cells are shifted by one so that the neighbors of every cell exist
+    # in the same group; the key of a neighboring cell differs by a
+    # constant, so the keys of the points stay sorted for every neighbor
+
+    target_keys = cell_keys(numpy.floor((targets - low) / size).astype(numpy.int64) + 1, target_groups)
+    order = numpy.argsort(target_keys, kind='mergesort')
+    sorted_keys = target_keys[order]
+    sorted_targets = targets[order]
+
+    point_keys = cell_keys(numpy.floor((points - low) / size).astype(numpy.int64) + 1, point_groups)
+    point_order = numpy.argsort(point_keys, kind='mergesort')
+    point_keys = point_keys[point_order]
+    sorted_points = points[point_order]
+
+    offsets = numpy.array([[x, y, z] for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)], numpy.int64)
+
+    for offset in cell_keys(offsets, numpy.zeros(len(offsets), numpy.int64)):
+        keys = point_keys + offset
+        first = numpy.searchsorted(sorted_keys, keys, 'left')
+        last = numpy.searchsorted(sorted_keys, keys, 'right')
+        counts = last - first
+
+        candidates = numpy.nonzero(counts)[0]
+        if len(candidates) == 0:
+            continue
+
+        ends = numpy.cumsum(counts[candidates])
+        starts = ends - counts[candidates]
+
+        block_first = 0
+        while block_first < len(candidates):
+            block_last = numpy.searchsorted(ends, starts[block_first] + SELECTION_PAIR_BLOCK_SIZE, 'right')
+            block_last = max(block_last, block_first + 1)
+
+            block = candidates[block_first:block_last]
+            block_counts = counts[block]
+            block_starts = numpy.concatenate([[0], numpy.cumsum(block_counts)[:-1]])
+
+            pair_points = numpy.repeat(block, block_counts)
+            pair_targets = numpy.repeat(first[block] - block_starts, block_counts) + numpy.arange(block_counts.sum())
+
+            squared = ((sorted_points[pair_points] - sorted_targets[pair_targets]) ** 2).sum(axis=1)
+
+            yield point_order[block], block_starts, point_order[pair_points], order[pair_targets], squared
+
+            block_first = block_last
+
+
+def nearest_distances(points, targets, cutoff):
+    '''
+    Return the distance from each of the (n,3) points to the nearest of
+    the (m,3) targets, or infinity if no target is within cutoff.
+
+    The targets are sorted into a grid of cubic cells with an edge of
+    cutoff and each point is only compared with the targets in its own
+    and the 26 neighboring cells (see cell_pairs).
+
+    >>> distances = nearest_distances(coor[frame][water], coor[frame][protein], 5.0)
+    '''
+
+    points = numpy.asarray(points, numpy.float).reshape(-1, 3)
+
+    squared_distances = numpy.empty(len(points))
+    squared_distances.fill(numpy.inf)
+
+    for block, starts, pair_points, pair_targets, squared in cell_pairs(points, targets, cutoff):
+        nearest = numpy.minimum.reduceat(squared, starts)
+        squared_distances[block] = numpy.minimum(squared_distances[block], nearest)
+
+    distances = numpy.sqrt(squared_distances)
+    distances[distances > cutoff] = numpy.inf
+
+    return distances
+
+
+def hydrogen_bond_names(topology_info):
+    '''
+    Return {resname: (donors, acceptors)} from the DONO and ACCE entries
+    of a topology read with charmm_topology.read_charmm_topology, where
+    donors are (hydrogen, donor) atom names and acceptors atom names.
+
+    The parser keeps the names of all the DONO (or ACCE) lines of a
+    residue in one list, so the optional second name of a line is told
+    apart by being bonded (BOND or DOUB) to the first one.  Donors
+    without a hydrogen and atoms of neighboring residues (+N, -C) are
+    left out.
+
+    >>> hydrogen_bond_names(molecule.topology_info)['SER']
+    ([('HN', 'N'), ('HG1', 'OG')], ['OG', 'O'])
+    '''
+
+    names = {}
+
+    for resname, entry in topology_info.items():
+        if not isinstance(entry, dict):
+            continue
+
+        bonds = set()
+        for bond in entry.get('BOND', []) + entry.get('DOUB', []):
+            bonds.add(frozenset(bond))
+
+        groups = {}
+        for key in ('DONO', 'ACCE'):
+            groups[key] = []
+            words = entry.get(key, [])
+            ind = 0
+            while ind < len(words):
+                if ind + 1 < len(words) and frozenset(words[ind:ind + 2]) in bonds:
+                    groups[key].append((words[ind], words[ind + 1]))
+                    ind += 2
+                else:
+                    groups[key].append((words[ind], None))
+                    ind += 1
+
+        donors = [(hydrogen, donor) for hydrogen, donor in groups['DONO']
+                  if donor is not None and hydrogen != 'BLNK' and hydrogen[0] not in '+-' and donor[0] not in '+-']
+        acceptors = [acceptor for acceptor, antecedent in groups['ACCE'] if acceptor[0] not in '+-']
+
+        if len(donors) > 0 or len(acceptors) > 0:
+            names[resname] = (donors, acceptors)
+
+    return names
+
+
+def residue_numbers(molecule):
+    '''
+    Return the number of the residue of each atom, counting a new
+    residue whenever resid, resname, chain or segname changes from one
+    atom to the next.
+    '''
+
+    natoms = molecule.natoms()
+    changed = numpy.zeros(natoms, numpy.bool)
+
+    for values in (molecule.resid(), molecule.resname(), molecule.chain(), molecule.segname()):
+        values = numpy.asarray(values)
+        changed[1:] |= values[1:] != values[:-1]
+
+    return numpy.cumsum(changed)
+
+
+def hydrogen_bond_atoms(molecule, topology_info):
+    '''
+    Return (donors, acceptors): the (n,2) array of the [hydrogen, donor]
+    atom indices and the array of the acceptor atom indices of molecule,
+    found by matching the names of hydrogen_bond_names(topology_info)
+    within each residue.
+    '''
+
+    names = hydrogen_bond_names(topology_info)
+
+    name = numpy.asarray(molecule.name())
+    resname = numpy.asarray(molecule.resname())
+    residues = residue_numbers(molecule)
+
+    donors = [numpy.zeros((0, 2), numpy.int)]
+    acceptors = [numpy.zeros(0, numpy.int)]
+
+    for residue_name in set(resname.tolist()) & set(names):
+        in_residue = resname == residue_name
+        residue_donors, residue_acceptors = names[residue_name]
+
+        for hydrogen_name, donor_name in residue_donors:
+            hydrogens = numpy.nonzero(in_residue & (name == hydrogen_name))[0]
+            heavy = numpy.nonzero(in_residue & (name == donor_name))[0]
+            if len(hydrogens) == 0 or len(heavy) == 0:
+                continue
+
+            # the donor of each hydrogen is the one in the same residue
+
+            found = numpy.minimum(numpy.searchsorted(residues[heavy], residues[hydrogens]), len(heavy) - 1)
+            paired = residues[heavy][found] == residues[hydrogens]
+            donors.append(numpy.column_stack((hydrogens[paired], heavy[found[paired]])))
+
+        if len(residue_acceptors) > 0:
+            acceptors.append(numpy.nonzero(in_residue & numpy.in1d(name, residue_acceptors))[0])
+
+    donors = numpy.concatenate(donors)
+    donors = donors[numpy.lexsort((donors[:, 0], donors[:, 1]))]
+    acceptors = numpy.unique(numpy.concatenate(acceptors))
+
+    return donors, acceptors
+
+
+def find_hydrogen_bonds(coor, donors, acceptors, distance=SELECTION_HYDROGEN_BOND_DISTANCE, angle=SELECTION_HYDROGEN_BOND_ANGLE):
+    '''
+    Return the hydrogen bonds in each frame of coor (nframes,natoms,3) as
+    a list of (n,3) arrays of [donor, hydrogen, acceptor] atom indices,
+    for the [hydrogen, donor] pairs of donors and the atoms of acceptors.
+
+    A hydrogen bond is a donor and a different acceptor atom at most
+    distance apart whose donor - hydrogen - acceptor angle is at least
+    angle degrees.  The donors and acceptors of as many frames as fit in
+    SELECTION_PAIR_BLOCK_SIZE are sorted into one cell list, with the
+    frame as the group (see cell_pairs), and the distances and angles of
+    all their pairs are tested at once.
+
+    >>> bonds = find_hydrogen_bonds(molecule.coor(), donors, acceptors)
+    '''
+
+    coor = numpy.asarray(coor)
+    if coor.ndim == 2:
+        coor = coor[numpy.newaxis]
+
+    donors = numpy.asarray(donors, numpy.int).reshape(-1, 2)
+    acceptors = numpy.asarray(acceptors, numpy.int).reshape(-1)
+
+    nframes = len(coor)
+    ndonors = len(donors)
+    nacceptors = len(acceptors)
+
+    bonds = [numpy.zeros((0, 3), numpy.int) for frame in xrange(nframes)]
+
+    if ndonors == 0 or nacceptors == 0 or distance < 0.0:
+        return bonds
+
+    cosine = numpy.cos(numpy.radians(angle))
+    frames_per_batch = max(1, SELECTION_PAIR_BLOCK_SIZE // (ndonors + nacceptors))
+
+    for first_frame in xrange(0, nframes, frames_per_batch):
+        batch = coor[first_frame:first_frame + frames_per_batch]
+        nbatch = len(batch)
+
+        donor_coor = batch[:, donors[:, 1]].reshape(-1, 3)
+        hydrogen_coor = batch[:, donors[:, 0]].reshape(-1, 3)
+        acceptor_coor = batch[:, acceptors].reshape(-1, 3)
+
+        donor_groups = numpy.repeat(numpy.arange(nbatch), ndonors)
+        acceptor_groups = numpy.repeat(numpy.arange(nbatch), nacceptors)
+
+        found = []
+
+        for block, starts, pair_donors, pair_acceptors, squared in cell_pairs(donor_coor, acceptor_coor, distance, donor_groups, acceptor_groups):
+            close = (squared <= distance * distance) & (donors[pair_donors % ndonors, 1] != acceptors[pair_acceptors % nacceptors])
+            pair_donors = pair_donors[close]
+            pair_acceptors = pair_acceptors[close]
+
+            to_donor = donor_coor[pair_donors] - hydrogen_coor[pair_donors]
+            to_acceptor = acceptor_coor[pair_acceptors] - hydrogen_coor[pair_donors]
+
+            dot = (to_donor * to_acceptor).sum(axis=1)
+            norms = numpy.sqrt((to_donor ** 2).sum(axis=1) * (to_acceptor ** 2).sum(axis=1))
+            bonded = (norms > 0.0) & (dot <= cosine * norms)
+
+            pair_donors = pair_donors[bonded]
+            found.append(numpy.column_stack((pair_donors // ndonors,
+                                             donors[pair_donors % ndonors, 1],
+                                             donors[pair_donors % ndonors, 0],
+                                             acceptors[pair_acceptors[bonded] % nacceptors])))
+
+        if len(found) == 0:
+            continue
+
+        found = numpy.concatenate(found)
+        found = found[numpy.lexsort((found[:, 3], found[:, 2], found[:, 1], found[:, 0]))]
+
+        frame_starts = numpy.searchsorted(found[:, 0], numpy.arange(nbatch + 1))
+
+        for frame in xrange(nbatch):
+            bonds[first_frame + frame] = found[frame_starts[frame]:frame_starts[frame + 1], 1:]
+
+    return bonds
+
+
+def compile_selection(basis_filter):
+    '''
+    Return the Compiled_Selection of a basis_filter string, or None if the
+    filter can not be compiled and has to be evaluated atom by atom.
+
+    Compiled filters are kept, so compiling the same filter again is free.
+
+    >>> selection = compile_selection('name[i] == "CA" and resid[i] < 10')
+    '''
+
+    if basis_filter in _compiled_selections:
+        return _compiled_selections[basis_filter]
+
+    try:
+        tree = ast.parse(basis_filter.strip(), mode='eval')
+    except (SyntaxError, TypeError, ValueError):
+        tree = None
+
+    selection = None
+    descriptors = set()
+
+    if tree is not None and check_node(tree.body, descriptors):
+        keywords = set(node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id in SELECTION_KEYWORDS)
+        selection = Compiled_Selection(basis_filter, tree, sorted(descriptors), sorted(keywords))
+
+    if len(_compiled_selections) >= SELECTION_CACHE_SIZE:
+        _compiled_selections.clear()
+
+    _compiled_selections[basis_filter] = selection
+
+    return selection
@@ -36,6 +36,7 @@ import numpy
 import time
 import sasmol.mask
 import sasmol.utilities as utilities
+import sasmol.selection as selection
 import random
 
 '''
@@ -200,7 +201,7 @@ class Mask(object):
 
         return object_list
 
-    def get_subset_mask(self, basis_filter):
+    def get_subset_mask(self, basis_filter, **kwargs):
         '''
         This method creates an array of ones and/or zeros
         of the length of the number of atoms in "self" and
@@ -236,7 +237,81 @@ class Mask(object):
 
                 could be used for advanced selection needs.  See API for full details.
 
+                Filters made of descriptor[i] values, constants, comparisons,
+                arithmetic, "and", "or", "not", "in" lists, indexing of
+                strings and a few functions (len, int, float, str, abs and
+                string methods) are compiled once and evaluated on whole
+                descriptor arrays (see the selection module).  Any other
+                filter, or one whose compiled form fails, is evaluated
+                atom by atom.
+
+                Compiled filters can use the keywords all, protein, nucleic,
+                water, backbone, calpha, hydrogen, heavy, hydrophobic,
+                polar, acidic, basic and charged, whose masks are computed
+                once for the molecule (see keyword_masks):
+
+                basis_filter = 'backbone and not hydrogen and resid[i] < 10'
+                basis_filter = 'protein and (hydrophobic or name[i] == "CA")'
+
+                The masks of compiled filters are kept (see selection_cache)
+                until a descriptor of the molecule is set.  Descriptors
+                changed in place, other than with set_descriptor_using_mask,
+                need a call to topology_changed() to discard them.
+
+                A filter can end in a distance clause that keeps the atoms
+                whose nearest atom of a second selection (written with j)
+                is in a range of distances in frame=number (default 0):
+
+                basis_filter = 'segname[i] == "WAT" less_than 5 angstroms from moltype[j] == "protein"'
+                basis_filter = 'name[i] == "CA" greater_than 10 angstroms from name[j] == "ZN"'
+                basis_filter = 'name[i] == "OH2" between 3 and 5 angstroms from (resname[j] == "LYS" and name[j] == "NZ")'
+
+                (see get_distance_subset_mask).
+
+                A filter can also end in a hydrogen bond clause that keeps
+                the atoms hydrogen bonded to a second selection in
+                frame=number, using the donors and acceptors of the
+                topology read with read_charmm_topology:
+
+                basis_filter = 'segname[i] == "RNA" hydrogen_bonded to resname[j] == "TIP3"'
+
+                (see get_hydrogen_bond_subset_mask).
+
         '''
+        frame = 0
+
+        if 'frame' in kwargs:
+            frame = kwargs['frame']
+
+        hydrogen_bond_clause = selection.hydrogen_bond_clause(basis_filter)
+
+        if hydrogen_bond_clause is not None:
+            return self.get_hydrogen_bond_subset_mask(basis_filter, hydrogen_bond_clause, frame)
+
+        clause = selection.distance_clause(basis_filter)
+
+        if clause is not None:
+            return self.get_distance_subset_mask(basis_filter, clause, frame)
+
+        compiled_selection = selection.compile_selection(basis_filter)
+
+        if compiled_selection is not None:
+            cached = self.selection_cache().get(self, compiled_selection)
+
+            if cached is not None:
+                mask_array = cached[0].copy()
+            else:
+                try:
+                    mask_array = compiled_selection.evaluate(self).astype(numpy.int32)
+                    self.selection_cache().put(self, compiled_selection, mask_array)
+                except Exception:
+                    mask_array = None
+
+            if mask_array is not None:
+                if(numpy.sum(mask_array) == 0):
+                    return ['found no atoms using filter selection ' + basis_filter], mask_array.tolist()
+                return [], mask_array
+
         index = self.index()
         name = self.name()
         loc = self.loc()
@@ -253,22 +328,7 @@ class Mask(object):
         residue_flag = self.residue_flag()
 
 #
-# OPEN	Need to add other properties (surface, buried, helix, sheet, turn, polar
-#
-# OPEN	Need to add other properties (hydrophobic, etc.)
-#
-# OPEN	Need to filter string and replace certain keywords with atom names (calpha, backbone)
-#
-# OPEN	Need to handle "all" keyword as well
-#
-# OPEN	Need to add a distance selection logic: find atoms greater than 5 angstroms from ...
-#
-#
-#	basis_filter == 'name[i] == "CA" less_than 5 angstroms from name[j] == "N" '
-#
-#	basis_filter == 'name[i] == "CA" greater_than 5 angstroms from name[j] == "N" '
-#
-#	basis_filter == 'name[i] == "CA" between 3 and 5 angstroms from name[j] == "N" '
+# OPEN	Need to add other properties (surface, buried, helix, sheet, turn)
 #
 #	ANGLES
 #
@@ -276,20 +336,6 @@ class Mask(object):
 #
 #	basis_filter == '(segname[i] == "WAT" and name[i] == "OH2") between 100 and 106 degrees from (segname[j] == "WAT" and name[j] == "H1") '
 #
-# 	--- or have the code pull out the donors and acceptors from selections?
-#
-#	basis_filter == '(resid[i] == "TIP3") between 100 and 106 degrees from (resid[j] == "TIP3")'
-#
-#	--- or define a hydrogen_bonded keyword that takes care of distance/angle & donor/acceptor
-#
-#	basis_filter == '(resid[i] == "TIP3") hydrogen_bonded to (resid[j] == "TIP3")'
-#	basis_filter == '(segment[i] == "RNA") hydrogen_bonded to (resid[j] == "TIP3")'
-#	basis_filter == '(segment[i] == "RNA") hydrogen_bonded to (segment[j] == "RNA")'
-#
-#	--- or define an atom as a donor or acceptor and use hydrogen_bonded keyword for distance/angle
-#
-#	basis_filter == '(segment[i] == "RNA" and donor[i] == 1) hydrogen_bonded to (resid[j] == "TIP3")'
-#	basis_filter == '(segment[i] == "RNA" and acceptor[i] == 1) hydrogen_bonded to (resid[j] == "TIP3")'
 #
 #
         error = []
@@ -340,6 +386,254 @@ class Mask(object):
 		return error, mask_array
 		'''
 
+    def get_distance_subset_mask(self, basis_filter, clause, frame):
+        '''
+        This method returns the mask of a filter with a distance clause,
+        split by selection.distance_clause into the filter of the atoms
+        to select, the filter of the atoms to measure the distance to and
+        the range of the distance.
+
+        The distance of an atom is the distance to the nearest atom of
+        the second selection in the given frame; it is found with a cell
+        list (see selection.nearest_distances).  If the second selection
+        is empty every atom is farther than any distance.
+
+        >>> error, mask = molecule.get_subset_mask('segname[i] == "WAT" less_than 5 angstroms from moltype[j] == "protein"', frame=3)
+        '''
+
+        atoms, others, low, high = clause
+        natoms = self.natoms()
+
+        error, atoms_mask = self.get_subset_mask(atoms, frame=frame)
+        if(len(error) > 0):
+            return error, atoms_mask
+
+        error, others_mask = self.get_subset_mask(others, frame=frame)
+        if(len(error) > 0 and not error[0].startswith('found no atoms')):
+            return error, others_mask
+
+        try:
+            coor = self.coor()[frame]
+        except:
+            return ['failed to read frame ' + str(frame) + ' for filter selection ' + basis_filter], []
+
+        atoms_indices = numpy.nonzero(atoms_mask)[0]
+        others_indices = numpy.nonzero(others_mask)[0]
+
+        if high is not None:
+            cutoff = high
+        else:
+            cutoff = low
+
+        distances = selection.nearest_distances(coor[atoms_indices], coor[others_indices], cutoff)
+
+        if high is not None and low is not None:
+            selected = (distances >= low) & (distances <= high)
+        elif high is not None:
+            selected = distances < high
+        else:
+            selected = distances > low
+
+        mask_array = numpy.zeros(natoms, numpy.int32)
+        mask_array[atoms_indices[selected]] = 1
+
+        if(numpy.sum(mask_array) == 0):
+            return ['found no atoms using filter selection ' + basis_filter], mask_array.tolist()
+
+        return [], mask_array
+
+    def get_hydrogen_bond_atoms(self):
+        '''
+        This method returns (error, donors, acceptors): the [hydrogen, donor]
+        atom indices and the acceptor atom indices of the molecule, from
+        the DONO and ACCE entries of the topology read with
+        read_charmm_topology (see selection.hydrogen_bond_atoms).  They
+        are kept until the topology, the topology version or the name,
+        resname, resid, chain or segname descriptors change.
+
+        >>> molecule.read_charmm_topology(topology_file_path, 'top_all27_prot_na.inp')
+        >>> error, donors, acceptors = molecule.get_hydrogen_bond_atoms()
+        '''
+
+        topology_info = getattr(self, 'topology_info', None)
+
+        if topology_info is None:
+            return ['no donors and acceptors: read a topology with read_charmm_topology'], numpy.zeros((0, 2), numpy.int), numpy.zeros(0, numpy.int)
+
+        columns = (topology_info, self.name(), self.resname(), self.resid(), self.chain(), self.segname())
+        kept = getattr(self, '_hydrogen_bond_atoms', None)
+
+        if kept is None or kept[0] != self.topology_version() or kept[1] != self.natoms() or \
+                any(this is not that for this, that in zip(columns, kept[2])):
+            donors, acceptors = selection.hydrogen_bond_atoms(self, topology_info)
+            kept = (self.topology_version(), self.natoms(), columns, donors, acceptors)
+            self._hydrogen_bond_atoms = kept
+
+        return [], kept[3].copy(), kept[4].copy()
+
+    def get_hydrogen_bonds(self, **kwargs):
+        '''
+        This method returns (error, bonds) where bonds has, for each frame,
+        an (n,3) array with a row of [donor, hydrogen, acceptor] atom
+        indices for every hydrogen bond (see selection.find_hydrogen_bonds).
+
+        kwargs
+
+            frames : list of frames (default all)
+            donors : basis filter of the donor atoms to use (default all)
+            acceptors : basis filter of the acceptor atoms to use (default all)
+            distance : largest donor - acceptor distance in angstroms
+            angle : smallest donor - hydrogen - acceptor angle in degrees
+
+        The frames are searched together, so whole trajectories are
+        handled in one call:
+
+        >>> molecule.read_charmm_topology(topology_file_path, 'top_all27_prot_na.inp')
+        >>> error, bonds = molecule.get_hydrogen_bonds(donors='resname[i] == "TIP3"', acceptors='segname[i] == "RNA"')
+        '''
+
+        error, donors, acceptors = self.get_hydrogen_bond_atoms()
+        if(len(error) > 0):
+            return error, []
+
+        distance = selection.SELECTION_HYDROGEN_BOND_DISTANCE
+        angle = selection.SELECTION_HYDROGEN_BOND_ANGLE
+
+        if 'distance' in kwargs:
+            distance = kwargs['distance']
+        if 'angle' in kwargs:
+            angle = kwargs['angle']
+
+        for key in ('donors', 'acceptors'):
+            if key in kwargs:
+                error, mask = self.get_subset_mask(kwargs[key])
+                if(len(error) > 0 and not error[0].startswith('found no atoms')):
+                    return error, []
+                mask = numpy.array(mask, numpy.int32)
+                if key == 'donors':
+                    donors = donors[mask[donors[:, 1]] != 0]
+                else:
+                    acceptors = acceptors[mask[acceptors] != 0]
+
+        coor = self.coor()
+
+        if 'frames' in kwargs:
+            try:
+                coor = coor[numpy.array(kwargs['frames'], numpy.int).reshape(-1)]
+            except:
+                return ['failed to read frames ' + str(kwargs['frames']) + ' for hydrogen bonds'], []
+
+        return [], selection.find_hydrogen_bonds(coor, donors, acceptors, distance, angle)
+
+    def get_hydrogen_bond_subset_mask(self, basis_filter, clause, frame):
+        '''
+        This method returns the mask of a filter with a hydrogen bond
+        clause, split by selection.hydrogen_bond_clause into the filter
+        of the atoms to select and the filter of the atoms they are bonded
+        to.  A donor and its hydrogen are selected when they are bonded
+        to an acceptor of the second selection, and an acceptor when it
+        is bonded to a donor of the second selection, in the given frame.
+
+        >>> error, mask = molecule.get_subset_mask('segname[i] == "RNA" hydrogen_bonded to resname[j] == "TIP3"', frame=3)
+        '''
+
+        atoms, others = clause
+        natoms = self.natoms()
+
+        error, atoms_mask = self.get_subset_mask(atoms, frame=frame)
+        if(len(error) > 0):
+            return error, atoms_mask
+
+        error, others_mask = self.get_subset_mask(others, frame=frame)
+        if(len(error) > 0 and not error[0].startswith('found no atoms')):
+            return error, others_mask
+
+        atoms_mask = numpy.array(atoms_mask, numpy.int32) != 0
+        others_mask = numpy.array(others_mask, numpy.int32) != 0
+
+        error, donors, acceptors = self.get_hydrogen_bond_atoms()
+        if(len(error) > 0):
+            return error, []
+
+        either = atoms_mask | others_mask
+        donors = donors[either[donors[:, 1]]]
+        acceptors = acceptors[either[acceptors]]
+
+        try:
+            coor = self.coor()[frame]
+        except:
+            return ['failed to read frame ' + str(frame) + ' for filter selection ' + basis_filter], []
+
+        bonds = selection.find_hydrogen_bonds(coor, donors, acceptors)[0]
+        donor, hydrogen, acceptor = bonds[:, 0], bonds[:, 1], bonds[:, 2]
+
+        mask_array = numpy.zeros(natoms, numpy.int32)
+
+        donating = atoms_mask[donor] & others_mask[acceptor]
+        mask_array[donor[donating]] = 1
+        mask_array[hydrogen[donating & atoms_mask[hydrogen]]] = 1
+
+        accepting = atoms_mask[acceptor] & others_mask[donor]
+        mask_array[acceptor[accepting]] = 1
+
+        if(numpy.sum(mask_array) == 0):
+            return ['found no atoms using filter selection ' + basis_filter], mask_array.tolist()
+
+        return [], mask_array
+
+    def selection_cache(self):
+        '''
+        This method returns the selection.Selection_Cache that keeps the
+        masks of the compiled filters used with get_subset_mask.
+        '''
+
+        if getattr(self, '_selection_cache', None) is None:
+            self._selection_cache = selection.Selection_Cache()
+
+        return self._selection_cache
+
+    def keyword_masks(self):
+        '''
+        This method returns {keyword: mask} with the read-only boolean
+        masks of the selection keywords (see selection.keyword_masks).
+        They are computed once and kept until the topology version or
+        the moltype, name, resname or element descriptors change.
+
+        >>> numpy.sum(molecule.keyword_masks()['calpha'])
+        '''
+
+        columns = (self.moltype(), self.name(), self.resname(), self.element())
+        kept = getattr(self, '_keyword_masks', None)
+
+        if kept is None or kept[0] != self.topology_version() or kept[1] != self.natoms() or \
+                any(this is not that for this, that in zip(columns, kept[2])):
+            kept = (self.topology_version(), self.natoms(), columns, selection.keyword_masks(self))
+            self._keyword_masks = kept
+
+        return kept[3]
+
+    def get_subset_indices(self, basis_filter):
+        '''
+        This method returns the indices of the atoms selected by
+        basis_filter (see get_subset_mask) as a numpy integer array.
+
+        >>> error, indices = molecule.get_subset_indices('name[i] == "CA"')
+        '''
+
+        error, mask = self.get_subset_mask(basis_filter)
+
+        if(len(error) > 0):
+            return error, numpy.array([], numpy.int)
+
+        compiled_selection = selection.compile_selection(basis_filter)
+
+        if compiled_selection is not None:
+            cached = self.selection_cache().get(self, compiled_selection)
+            if cached is not None:
+                return error, cached[1].copy()
+
+        return error, numpy.nonzero(mask)[0]
+
     def merge_two_molecules(self, mol1, mol2):
         '''
         This method combines two molecules into a single, new molecule. 
@@ -968,6 +1262,8 @@ class Mask(object):
         '''
         error = []
 
+        self.topology_changed()
+
         natoms = self.natoms()
         for i in xrange(natoms):
             if(mask[i] == 1):
@@ -293,6 +293,19 @@ class Atom(file_io.Files, calculate.Calculate, operate.Move, subset.Mask, proper
             self._natoms = len(self._name)
             self._index = numpy.array([x + 1 for x in xrange(self._natoms)], numpy.int)
 
+        self.topology_changed()
+
+
+    def topology_version(self):
+        return getattr(self, '_topology_version', 0)
+
+    def topology_changed(self):
+        '''
+        Advance the topology version, discarding the masks kept for
+        get_subset_mask.  The descriptor setters call it; call it after
+        changing a descriptor in place.
+        '''
+        self._topology_version = self.topology_version() + 1
 
     def setId(self, newValue):
         self._id = newValue
@@ -319,6 +332,7 @@ class Atom(file_io.Files, calculate.Calculate, operate.Move, subset.Mask, proper
 
     def setIndex(self, newValue):
         self._index = newValue
+        self.topology_changed()
 
     def original_index(self):
         return self._original_index
@@ -337,30 +351,35 @@ class Atom(file_io.Files, calculate.Calculate, operate.Move, subset.Mask, proper
 
     def setName(self, newValue):
         self._name = newValue
+        self.topology_changed()
 
     def loc(self):
         return self._loc
 
     def setLoc(self, newValue):
         self._loc = newValue
+        self.topology_changed()
 
     def resname(self):
         return self._resname
 
     def setResname(self, newValue):
         self._resname = newValue
+        self.topology_changed()
 
     def chain(self):
         return self._chain
 
     def setChain(self, newValue):
         self._chain = newValue
+        self.topology_changed()
 
     def resid(self):
         return self._resid
 
     def setResid(self, newValue):
         self._resid = newValue
+        self.topology_changed()
 
     def coor(self):
         return self._coor
@@ -373,36 +392,42 @@ class Atom(file_io.Files, calculate.Calculate, operate.Move, subset.Mask, proper
 
     def setRescode(self, newValue):
         self._rescode = newValue
+        self.topology_changed()
 
     def occupancy(self):
         return self._occupancy
 
     def setOccupancy(self, newValue):
         self._occupancy = newValue
+        self.topology_changed()
 
     def beta(self):
         return self._beta
 
     def setBeta(self, newValue):
         self._beta = newValue
+        self.topology_changed()
 
     def segname(self):
         return self._segname
 
     def setSegname(self, newValue):
         self._segname = newValue
+        self.topology_changed()
 
     def element(self):
         return self._element
 
     def setElement(self, newValue):
         self._element = newValue
+        self.topology_changed()
 
     def charge(self):
         return self._charge
 
     def setCharge(self, newValue):
         self._charge = newValue
+        self.topology_changed()
 
     def atom_charge(self):
         return self._atom_charge
@@ -441,6 +466,7 @@ class Atom(file_io.Files, calculate.Calculate, operate.Move, subset.Mask, proper
 
     def setNatoms(self, newValue):
         self._natoms = newValue
+        self.topology_changed()
 
     def number_of_atoms(self):
         return self._number_of_atoms
@@ -453,6 +479,7 @@ class Atom(file_io.Files, calculate.Calculate, operate.Move, subset.Mask, proper
 
     def setMoltype(self, newValue):
         self._moltype = newValue
+        self.topology_changed()
 
 
 class Molecule(Atom):
@@ -740,6 +767,7 @@ class Molecule(Atom):
 
     def setResidue_flag(self, newValue):
         self._residue_flag = newValue
+        self.topology_changed()
 
 
 
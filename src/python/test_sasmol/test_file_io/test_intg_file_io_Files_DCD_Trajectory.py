@@ -0,0 +1,115 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+import sasmol.dcd_io as dcd_io
+
+import numpy
+
+import os
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','dcd_common')+os.path.sep
+pdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_DCD_Trajectory(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+      self.o.read_dcd(DataPath+'2AAD.dcd')
+      self.filenames = []
+      for i,frames in enumerate([(0,2),(2,3),(0,3)]):
+         filename = moduleDataPath+'test-results/2AAD-trajectory-'+str(i)+'.dcd'
+         self.o.write_dcd_frames(filename,frames[0],frames[1])
+         self.filenames.append(filename)
+      self.expected_coor = self.o.coor()[[0,1,2,0,1,2]].astype(numpy.float32)
+
+   def test_number_of_frames(self):
+      '''
+	   test the number of frames and atoms of a trajectory of 3 files
+	   '''
+      #
+      trajectory = dcd_io.DCD_Trajectory(self.filenames)
+      self.assertEqual(trajectory.number_of_frames(),6)
+      self.assertEqual(len(trajectory),6)
+      self.assertEqual(trajectory.natoms(),15)
+      self.assertEqual(trajectory.locate_frame(2),(1,0))
+      self.assertEqual(trajectory.locate_frame(5),(2,2))
+      trajectory.close()
+
+   def test_read_frames(self):
+      '''
+	   test random access to frames across files
+	   '''
+      #
+      trajectory = dcd_io.DCD_Trajectory(self.filenames)
+      coor = trajectory.read_frames([5,0,3,2])
+      self.assertTrue(numpy.array_equal(coor,self.expected_coor[[5,0,3,2]]))
+      trajectory.close()
+
+   def test_iterate(self):
+      '''
+	   test iterating over all frames of a trajectory with a single open file
+	   '''
+      #
+      trajectory = dcd_io.DCD_Trajectory(self.filenames,max_open_files=1)
+      coor = numpy.array([frame.copy() for frame in trajectory])
+      self.assertTrue(numpy.array_equal(coor,self.expected_coor))
+      self.assertEqual(len(trajectory._open_files),1)
+      trajectory.close()
+
+   def test_open_files_bound(self):
+      '''
+	   test that the least recently used file is closed
+	   '''
+      #
+      trajectory = dcd_io.DCD_Trajectory(self.filenames,max_open_files=2)
+      trajectory.read_frames([0,2,0,4])
+      self.assertEqual(list(trajectory._open_files.keys()),[0,2])
+      trajectory.close()
+      self.assertEqual(len(trajectory._open_files),0)
+
+   def test_frame_out_of_range(self):
+      '''
+	   test that reading a frame that is not in the trajectory raises an exception
+	   '''
+      #
+      trajectory = dcd_io.DCD_Trajectory(self.filenames)
+      with self.assertRaises(Exception):
+         trajectory.read_frame(6)
+      trajectory.close()
+
+   def test_different_number_of_atoms(self):
+      '''
+	   test that files with different numbers of atoms raise an exception
+	   '''
+      #
+      with self.assertRaises(Exception):
+         dcd_io.DCD_Trajectory(self.filenames+[DataPath+'1ATM.dcd'])
+
+   def tearDown(self):
+      for filename in self.filenames:
+         os.remove(filename)
+
+
+if __name__ == '__main__': 
+   main()
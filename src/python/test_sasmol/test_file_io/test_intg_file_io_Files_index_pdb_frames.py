@@ -0,0 +1,92 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+import sasmol.system as system
+
+import numpy, os, shutil
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_index_pdb_frames(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def test_1ATM_one_frame(self):
+      '''
+	   test the frame index of a pdb file with 1 atom and 1 frame
+	   '''
+      #
+      offsets = self.o.index_pdb_frames(DataPath+'1ATM.pdb',sidecar=False)
+      #
+      self.assertEqual(offsets.shape,(1,2))
+      lines = open(DataPath+'1ATM.pdb','rb').read()[offsets[0][0]:offsets[0][1]].splitlines()
+      self.assertEqual(len(lines),1)
+      self.assertEqual(lines[0][0:4],'ATOM')
+
+   def test_2AAD_three_frames_separatedby_END(self):
+      '''
+	   test the frame index of a pdb file with 2 amino acids and 3 frames (separated by END)
+	   '''
+      #
+      offsets = self.o.index_pdb_frames(moduleDataPath+'2AAD-1to3-END.pdb',sidecar=False)
+      #
+      self.assertEqual(offsets.shape,(3,2))
+      data = open(moduleDataPath+'2AAD-1to3-END.pdb','rb').read()
+      for first,last in offsets:
+         lines = data[first:last].splitlines()
+         self.assertEqual(len([lin for lin in lines if lin[0:4]=='ATOM']),15)
+
+   def test_2AAD_three_frames_separatedby_MODEL(self):
+      '''
+	   test the frame index of a pdb file with 2 amino acids and 3 frames (separated by MODEL)
+	   '''
+      #
+      offsets = self.o.index_pdb_frames(moduleDataPath+'2AAD-1to3-MODEL.pdb',sidecar=False)
+      #
+      self.assertEqual(offsets.shape,(3,2))
+      self.assertTrue(numpy.all(offsets[1:,0] > offsets[:-1,1]))
+
+   def test_sidecar(self):
+      '''
+	   test that the frame index is saved as a sidecar file and reused
+	   '''
+      #
+      filename = moduleDataPath+'test-results'+os.path.sep+'2AAD-1to3-MODEL-index-test.pdb'
+      shutil.copy(moduleDataPath+'2AAD-1to3-MODEL.pdb',filename)
+      offsets = self.o.index_pdb_frames(filename)
+      self.assertTrue(os.path.isfile(filename+'.frames.npz'))
+      #
+      saved = numpy.load(filename+'.frames.npz')
+      self.assertEqual(saved['offsets'].tolist(),offsets.tolist())
+      saved.close()
+      self.assertEqual(self.o.index_pdb_frames(filename).tolist(),offsets.tolist())
+      #
+      os.remove(filename+'.frames.npz')
+      os.remove(filename)
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
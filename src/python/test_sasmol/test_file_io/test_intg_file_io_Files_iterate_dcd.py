@@ -0,0 +1,138 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+
+import numpy, threading, time
+
+import os
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','dcd_common')+os.path.sep
+pdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+
+class Test_intg_file_io_Files_iterate_dcd(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+      self.reference=system.Molecule(0)
+      self.reference.read_dcd(DataPath+'rna-1to10.dcd')
+
+   def test_frames(self):
+      '''
+	   test iterating over all frames of a dcd one frame at a time
+	   '''
+      #
+      frames = [coor.copy() for coor in self.o.iterate_dcd(DataPath+'rna-1to10.dcd')]
+      self.assertEqual(len(frames),10)
+      self.assertEqual(frames[0].shape,(10632,3))
+      self.assertTrue(numpy.array_equal(numpy.array(frames),self.reference.coor()))
+
+   def test_chunks(self):
+      '''
+	   test iterating over a dcd in chunks of 4 frames
+	   '''
+      #
+      chunks = [coor.copy() for coor in self.o.iterate_dcd(DataPath+'rna-1to10.dcd',chunk=4)]
+      self.assertEqual([len(chunk) for chunk in chunks],[4,4,2])
+      self.assertTrue(numpy.array_equal(numpy.concatenate(chunks),self.reference.coor()))
+
+   def test_start_stop_step(self):
+      '''
+	   test iterating over every third frame from frame 1 to frame 8
+	   '''
+      #
+      chunks = [coor.copy() for coor in self.o.iterate_dcd(DataPath+'rna-1to10.dcd',start=1,stop=9,step=3,chunk=2)]
+      self.assertEqual([len(chunk) for chunk in chunks],[2,1])
+      self.assertTrue(numpy.array_equal(numpy.concatenate(chunks),self.reference.coor()[1:9:3]))
+
+   def test_buffer_reused(self):
+      '''
+	   test that the same buffer is yielded and that it is the coordinates of the molecule
+	   '''
+      #
+      buffers = []
+      for coor in self.o.iterate_dcd(DataPath+'2AAD.dcd'):
+         buffers.append(coor)
+         self.assertTrue(numpy.array_equal(self.o.coor()[0],coor))
+      self.assertTrue(buffers[0] is not buffers[1])
+      self.assertTrue(buffers[0].base is buffers[1].base)
+
+   def test_calculation_on_chunk(self):
+      '''
+	   test calculating the center of mass of each frame of a chunk
+	   '''
+      #
+      self.o.read_pdb(pdbDataPath+'rna.pdb')
+      self.reference.read_pdb(pdbDataPath+'rna.pdb')
+      self.reference.read_dcd(DataPath+'rna-1to10.dcd')
+      for coor in self.o.iterate_dcd(DataPath+'rna-1to10.dcd',chunk=5,stop=5):
+         for frame in range(len(coor)):
+            self.assertTrue(numpy.allclose(self.o.calculate_center_of_mass(frame),self.reference.calculate_center_of_mass(frame)))
+
+   def test_prefetch(self):
+      '''
+	   test iterating in chunks of 3 frames read ahead by a background thread
+	   '''
+      #
+      chunks = []
+      for coor in self.o.iterate_dcd(DataPath+'rna-1to10.dcd',chunk=3,prefetch=2):
+         time.sleep(0.01)
+         chunks.append(coor.copy())
+      self.assertEqual([len(chunk) for chunk in chunks],[3,3,3,1])
+      self.assertTrue(numpy.array_equal(numpy.concatenate(chunks),self.reference.coor()))
+
+   def test_prefetch_frames(self):
+      '''
+	   test that a prefetched frame is not overwritten while it is used
+	   '''
+      #
+      frame = 0
+      for coor in self.o.iterate_dcd(DataPath+'rna-1to10.dcd',prefetch=1,step=2):
+         time.sleep(0.02)
+         self.assertTrue(numpy.array_equal(coor,self.reference.coor()[frame]))
+         frame += 2
+      self.assertEqual(frame,10)
+
+   def test_prefetch_break(self):
+      '''
+	   test that leaving the loop early stops the background thread
+	   '''
+      #
+      number_of_threads = threading.active_count()
+      for coor in self.o.iterate_dcd(DataPath+'rna-1to10.dcd',prefetch=3):
+         break
+      self.assertEqual(threading.active_count(),number_of_threads)
+
+   def test_bad_step(self):
+      '''
+	   test that a step smaller than 1 raises an exception
+	   '''
+      #
+      with self.assertRaises(Exception):
+         list(self.o.iterate_dcd(DataPath+'2AAD.dcd',step=0))
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
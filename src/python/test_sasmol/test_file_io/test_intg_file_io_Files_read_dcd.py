@@ -22,7 +22,7 @@ from mocker import Mocker, MockerTestCase
 
 import sasmol.system as system
 
-import numpy
+import numpy, gzip
 
 import os
 
@@ -173,6 +173,24 @@ class Test_intg_file_io_Files_read_dcd(MockerTestCase):
       self.assertAlmostEqual(sum_expected_coor, sum_result_coor, self.prcsn)
    """
 
+   def test_2AAD_gzip(self):
+      '''
+	   test a gzip compressed dcd with 3 frames based on a 2-aa pdb
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-readdcd-test.dcd.gz'
+      outfile = gzip.open(dcdFile,'wb')
+      outfile.write(open(DataPath+'2AAD.dcd','rb').read())
+      outfile.close()
+      #
+      self.o.read_dcd(DataPath+'2AAD.dcd')
+      o=system.Molecule(0)
+      o.read_dcd(dcdFile)
+      os.remove(dcdFile)
+      #
+      self.assertEqual(o.coor().shape,(3,15,3))
+      self.assert_list_almost_equal(o.coor(), self.o.coor(), self.prcsn)
+
    def tearDown(self):
       pass
         
@@ -0,0 +1,128 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+
+import numpy, gzip, struct
+
+import os
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','dcd_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_read_dcd_frames(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def write_fixed_atom_dcd(self,filename,coor,free):
+      '''
+      write an x-plor dcd in which only the atoms in free move
+      '''
+      nframes,natoms = coor.shape[0],coor.shape[1]
+      icntrl = [nframes,0,1,nframes,0,0,0,0,natoms-len(free)]+[0]*11
+      outfile = open(filename,'wb')
+      outfile.write(struct.pack('<i4s20ii',84,'CORD',*(icntrl+[84])))
+      outfile.write(struct.pack('<ii80si',84,1,'REMARKS FIXED ATOMS'.ljust(80),84))
+      outfile.write(struct.pack('<iii',4,natoms,4))
+      outfile.write(struct.pack('<i',4*len(free))+(numpy.array(free)+1).astype('<i4').tostring()+struct.pack('<i',4*len(free)))
+      for i in range(nframes):
+         if(i == 0):
+            atoms = range(natoms)
+         else:
+            atoms = free
+         for j in range(3):
+            outfile.write(struct.pack('<i',4*len(atoms))+coor[i,atoms,j].astype('<f4').tostring()+struct.pack('<i',4*len(atoms)))
+      outfile.close()
+
+   def test_2AAD(self):
+      '''
+	   test reading frames 2 and 0 of a dcd with 3 frames based on a 2-aa pdb
+	   '''
+      #
+      dcdFile = DataPath+'2AAD.dcd'
+      o=system.Molecule(0)
+      o.read_dcd(dcdFile)
+      coor = self.o.read_dcd_frames(dcdFile,[2,0])
+      self.assertEqual(self.o.coor().shape,(2,15,3))
+      self.assertTrue(numpy.array_equal(coor,o.coor()[[2,0]]))
+
+   def test_rna_last_frame(self):
+      '''
+	   test reading the last frame of a dcd with 10 frames based on a large rna pdb
+	   '''
+      #
+      dcdFile = DataPath+'rna-1to10.dcd'
+      o=system.Molecule(0)
+      o.read_dcd(dcdFile)
+      self.o.read_dcd_frames(dcdFile,9)
+      self.assertTrue(numpy.array_equal(self.o.coor()[0],o.coor()[9]))
+
+   def test_frame_out_of_range(self):
+      '''
+	   test that reading a frame that is not in the file raises an exception
+	   '''
+      #
+      with self.assertRaises(Exception):
+         self.o.read_dcd_frames(DataPath+'2AAD.dcd',[3])
+      with self.assertRaises(Exception):
+         self.o.read_dcd_frames(DataPath+'2AAD.dcd',[-1])
+
+   def test_fixed_atoms(self):
+      '''
+	   test reading frames of a dcd with fixed atoms
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/fixed-atoms-readdcdframes-test.dcd'
+      coor = numpy.zeros((4,5,3),numpy.float32)
+      coor[0] = numpy.arange(15).reshape(5,3)
+      free = [1,3]
+      for i in range(1,4):
+         coor[i] = coor[0]
+         coor[i,free] += 100.0*i
+      self.write_fixed_atom_dcd(dcdFile,coor,free)
+      #
+      result = self.o.read_dcd_frames(dcdFile,[3,0,1])
+      self.assertTrue(numpy.array_equal(result,coor[[3,0,1]]))
+      os.remove(dcdFile)
+
+   def test_gzip(self):
+      '''
+	   test reading a frame of a gzip compressed dcd
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-readdcdframes-test.dcd.gz'
+      outfile = gzip.open(dcdFile,'wb')
+      outfile.write(open(DataPath+'2AAD.dcd','rb').read())
+      outfile.close()
+      o=system.Molecule(0)
+      o.read_dcd(DataPath+'2AAD.dcd')
+      self.o.read_dcd_frames(dcdFile,[1])
+      self.assertTrue(numpy.array_equal(self.o.coor()[0],o.coor()[1]))
+      os.remove(dcdFile)
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
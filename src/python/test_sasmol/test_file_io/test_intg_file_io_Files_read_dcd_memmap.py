@@ -0,0 +1,111 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+
+import numpy, gzip, shutil
+
+import os
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','dcd_common')+os.path.sep
+pdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_read_dcd_memmap(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def test_2AAD(self):
+      '''
+	   test mapping a charmm dcd with 3 frames based on a 2-aa pdb
+	   '''
+      #
+      dcdFile = DataPath+'2AAD.dcd'
+      o=system.Molecule(0)
+      o.read_dcd(dcdFile)
+      coor = self.o.read_dcd_memmap(dcdFile)
+      self.assertEqual(coor.shape,(3,15,3))
+      self.assertFalse(coor.flags.owndata)
+      self.assertTrue(self.o.coor() is coor)
+      self.assertTrue(numpy.array_equal(coor,o.coor()))
+      self.assertTrue(numpy.array_equal(coor[2],o.coor()[2]))
+
+   def test_rna_frame1to10(self):
+      '''
+	   test mapping a charmm dcd with 10 frames based on a large rna pdb
+	   '''
+      #
+      dcdFile = DataPath+'rna-1to10.dcd'
+      o=system.Molecule(0)
+      o.read_dcd(dcdFile)
+      self.o.read_dcd_memmap(dcdFile,mode='r')
+      self.assertTrue(numpy.array_equal(self.o.coor(),o.coor()))
+
+   def test_written_dcd(self):
+      '''
+	   test mapping a dcd written by write_dcd
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-memmap-test.dcd'
+      o=system.Molecule(0)
+      o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb')
+      o.write_dcd(dcdFile)
+      self.o.read_dcd_memmap(dcdFile)
+      self.assertTrue(numpy.allclose(self.o.coor(),o.coor(),atol=1e-4))
+      os.remove(dcdFile)
+
+   def test_copy_on_write(self):
+      '''
+	   test that changing the coordinates of a copy-on-write map leaves the file unchanged
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-memmap-cow-test.dcd'
+      shutil.copy(DataPath+'2AAD.dcd',dcdFile)
+      self.o.read_dcd_memmap(dcdFile)
+      self.o.coor()[0,0,0] = 1000.0
+      self.assertEqual(self.o.coor()[0,0,0],1000.0)
+      o=system.Molecule(0)
+      o.read_dcd(dcdFile)
+      self.assertNotEqual(o.coor()[0,0,0],1000.0)
+      del self.o
+      os.remove(dcdFile)
+
+   def test_gzip(self):
+      '''
+	   test that a compressed dcd can not be mapped
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-memmap-test.dcd.gz'
+      outfile = gzip.open(dcdFile,'wb')
+      outfile.write(open(DataPath+'2AAD.dcd','rb').read())
+      outfile.close()
+      with self.assertRaises(Exception):
+         self.o.read_dcd_memmap(dcdFile)
+      os.remove(dcdFile)
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
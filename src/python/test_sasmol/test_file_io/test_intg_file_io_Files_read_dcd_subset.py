@@ -0,0 +1,99 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+
+import numpy, gzip
+
+import os
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','dcd_common')+os.path.sep
+pdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_read_dcd_subset(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+      self.reference=system.Molecule(0)
+      self.reference.read_pdb(pdbDataPath+'rna.pdb')
+      self.reference.read_dcd(DataPath+'rna-1to10.dcd')
+
+   def test_rna_mask(self):
+      '''
+	   test reading the phosphorus atoms of every other frame of a dcd with 10 frames
+	   '''
+      #
+      error,mask = self.reference.get_subset_mask('name[i] == "P"')
+      coor = self.o.read_dcd_subset(DataPath+'rna-1to10.dcd',mask=mask,step=2)
+      expected_coor = self.reference.coor()[::2][:,numpy.nonzero(mask)[0]]
+      self.assertEqual(coor.shape,(5,int(sum(mask)),3))
+      self.assertTrue(numpy.array_equal(self.o.coor(),expected_coor))
+
+   def test_rna_indices(self):
+      '''
+	   test reading three atoms of frames 3 to 7 of a dcd with 10 frames
+	   '''
+      #
+      indices = [10631,0,5000]
+      self.o.read_dcd_subset(DataPath+'rna-1to10.dcd',indices=indices,start=3,stop=8)
+      self.assertTrue(numpy.array_equal(self.o.coor(),self.reference.coor()[3:8][:,indices]))
+
+   def test_subset_molecule(self):
+      '''
+	   test that the coordinates fit a molecule copied with the same mask
+	   '''
+      #
+      error,mask = self.reference.get_subset_mask('resid[i] < 3')
+      self.reference.copy_molecule_using_mask(self.o,mask,0)
+      self.o.read_dcd_subset(DataPath+'rna-1to10.dcd',mask=mask)
+      self.assertEqual(self.o.coor().shape,(10,self.o.natoms(),3))
+
+   def test_gzip(self):
+      '''
+	   test reading selected atoms of a gzip compressed dcd
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/rna-readdcdsubset-test.dcd.gz'
+      outfile = gzip.open(dcdFile,'wb')
+      outfile.write(open(DataPath+'rna-1to10.dcd','rb').read())
+      outfile.close()
+      self.o.read_dcd_subset(dcdFile,indices=[1,2],step=3)
+      self.assertTrue(numpy.array_equal(self.o.coor(),self.reference.coor()[::3][:,[1,2]]))
+      os.remove(dcdFile)
+
+   def test_bad_mask(self):
+      '''
+	   test that a mask of the wrong length raises an exception
+	   '''
+      #
+      with self.assertRaises(Exception):
+         self.o.read_dcd_subset(DataPath+'2AAD.dcd',mask=[1,0,1])
+      with self.assertRaises(Exception):
+         self.o.read_dcd_subset(DataPath+'2AAD.dcd',indices=[15])
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
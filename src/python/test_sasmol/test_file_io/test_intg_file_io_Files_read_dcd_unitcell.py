@@ -0,0 +1,187 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+import sasmol.dcd_io as dcd_io
+
+import numpy
+
+import os
+
+pdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+dcdDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','dcd_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_read_dcd_unitcell(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def npt_unitcell(self,nframes):
+      '''
+      return a box that changes from frame to frame
+      '''
+      unitcell = numpy.zeros((nframes,6),numpy.float)
+      unitcell[:,0] = 70.0+numpy.arange(nframes)
+      unitcell[:,1] = 71.0+numpy.arange(nframes)
+      unitcell[:,2] = 72.0+numpy.arange(nframes)
+      unitcell[:,3] = 90.0
+      unitcell[:,4] = 100.0
+      unitcell[:,5] = 120.0
+      return unitcell
+
+   def test_rna_1to10(self):
+      '''
+	   test reading the unit cells of a charmm dcd with 10 frames
+	   '''
+      #
+      self.o.read_dcd(dcdDataPath+'rna-1to10.dcd')
+      unitcell = self.o.unitcell()
+      self.assertEqual(unitcell.shape,(10,6))
+      expected = numpy.tile([73.691,73.691,73.691,90.0,90.0,90.0],(10,1))
+      self.assertTrue(numpy.allclose(unitcell,expected,atol=1e-3))
+
+   def test_angles_in_degrees(self):
+      '''
+	   test that unit cell blocks holding angles rather than cosines are converted
+	   '''
+      #
+      layout = {'charmm':dcd_io.DCD_IS_CHARMM|dcd_io.DCD_HAS_EXTRA_BLOCK}
+      unitcell = self.o.dcd_unitcell(layout,[[10.0,60.0,20.0,70.0,80.0,30.0],[10.0,0.5,20.0,0.0,0.0,30.0]])
+      self.assertTrue(numpy.allclose(unitcell,[[10.0,20.0,30.0,80.0,70.0,60.0],[10.0,20.0,30.0,90.0,90.0,60.0]]))
+
+   def test_no_unitcell(self):
+      '''
+	   test that a dcd without unit cells gives no unit cell
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-no-unitcell.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.write_dcd(dcdFile)
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile)
+      self.assertEqual(o1.unitcell(),None)
+      o1.read_dcd_frames(dcdFile,[0,2])
+      self.assertEqual(o1.unitcell(),None)
+      os.remove(dcdFile)
+
+   def test_write_npt(self):
+      '''
+	   test writing and reading back a unit cell for every frame
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-npt.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.setUnitcell(self.npt_unitcell(3))
+      self.o.write_dcd(dcdFile)
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile)
+      self.assertTrue(numpy.allclose(o1.unitcell(),self.npt_unitcell(3)))
+      self.assertTrue(numpy.array_equal(o1.coor(),self.o.coor().astype(numpy.float32)))
+      os.remove(dcdFile)
+
+   def test_write_npt_gzip(self):
+      '''
+	   test writing and reading back unit cells of a gzip compressed dcd
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-npt.dcd.gz'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.setUnitcell(self.npt_unitcell(3))
+      self.o.write_dcd(dcdFile)
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile)
+      self.assertTrue(numpy.allclose(o1.unitcell(),self.npt_unitcell(3)))
+      self.assertTrue(numpy.array_equal(o1.coor(),self.o.coor().astype(numpy.float32)))
+      os.remove(dcdFile)
+
+   def test_single_unitcell(self):
+      '''
+	   test that a single unit cell is written for every frame
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-single-unitcell.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.setUnitcell(numpy.array([50.0,60.0,70.0,90.0,90.0,90.0]))
+      self.o.write_dcd(dcdFile)
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile)
+      self.assertTrue(numpy.allclose(o1.unitcell(),numpy.tile(self.o.unitcell(),(3,1))))
+      os.remove(dcdFile)
+
+   def test_wrong_number_of_unitcells(self):
+      '''
+	   test that writing a unit cell for some of the frames raises an exception
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-wrong-unitcell.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.setUnitcell(self.npt_unitcell(2))
+      with self.assertRaises(Exception):
+         self.o.write_dcd(dcdFile)
+      if(os.path.isfile(dcdFile)):
+         os.remove(dcdFile)
+
+   def test_frames_subset_memmap(self):
+      '''
+	   test that read_dcd_frames, read_dcd_subset and read_dcd_memmap read the unit cells of their frames
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-npt-frames.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.setUnitcell(self.npt_unitcell(3))
+      self.o.write_dcd(dcdFile)
+      #
+      o1 = system.Molecule(0)
+      o1.read_dcd_frames(dcdFile,[2,0])
+      self.assertTrue(numpy.allclose(o1.unitcell(),self.npt_unitcell(3)[[2,0]]))
+      o1.read_dcd_subset(dcdFile,indices=[0,1],start=1)
+      self.assertTrue(numpy.allclose(o1.unitcell(),self.npt_unitcell(3)[1:]))
+      o1.read_dcd_memmap(dcdFile)
+      self.assertTrue(numpy.allclose(o1.unitcell(),self.npt_unitcell(3)))
+      self.assertTrue(numpy.array_equal(o1.coor(),self.o.coor().astype(numpy.float32)))
+      del o1
+      os.remove(dcdFile)
+
+   def test_writer_append(self):
+      '''
+	   test appending frames with unit cells to a dcd with unit cells
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-npt-append.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.setUnitcell(self.npt_unitcell(3))
+      self.o.write_dcd_frames(dcdFile,0,2)
+      writer = dcd_io.DCD_Writer(self.o,dcdFile,'a')
+      writer.write_frame(2)
+      writer.close()
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile)
+      self.assertTrue(numpy.allclose(o1.unitcell(),self.npt_unitcell(3)))
+      self.assertTrue(numpy.array_equal(o1.coor(),self.o.coor().astype(numpy.float32)))
+      os.remove(dcdFile)
+
+   def tearDown(self):
+      pass
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,172 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+import sasmol.system as system
+
+import numpy, os
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+MMCIF_TEXT = '''data_test
+#
+_cell.length_a 1.000
+#
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.type_symbol
+_atom_site.label_atom_id
+_atom_site.label_alt_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.label_seq_id
+_atom_site.pdbx_PDB_ins_code
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.B_iso_or_equiv
+_atom_site.pdbx_formal_charge
+_atom_site.auth_seq_id
+_atom_site.auth_comp_id
+_atom_site.auth_asym_id
+_atom_site.auth_atom_id
+_atom_site.pdbx_PDB_model_num
+ATOM   123456 N N   . ALA A 1 ? 1.000 2.000 3.000 1.00 10.00 1 12345 ALA AB N   1
+ATOM   123457 C CA  . ALA A 1 ? 4.000 5.000 6.000 0.50 20.00 ? 12345 ALA AB CA  1
+HETATM 123458 O "O5'" . ADE B . ? 7.000 8.000 9.000 ? ? ? 12346 ADE AB "O5'" 1
+ATOM   123456 N N   . ALA A 1 ? 1.500 2.500 3.500 1.00 10.00 1 12345 ALA AB N   2
+ATOM   123457 C CA  . ALA A 1 ? 4.500 5.500 6.500 0.50 20.00 ? 12345 ALA AB CA  2
+HETATM 123458 O "O5'" . ADE B . ?
+7.500 8.500 9.500 ? ? ? 12346 ADE AB "O5'" 2
+#
+loop_
+_struct_conn.id
+covale1
+#
+'''
+
+class Test_intg_file_io_Files_read_mmcif(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def assert_list_almost_equal(self,a,b,places=5):
+      if (len(a)!=len(b)):
+         raise TypeError
+      else:
+         for i in range(len(a)):
+            if isinstance(a[i],(int,float,numpy.generic)):
+               if (numpy.isnan(a[i]) and numpy.isnan(b[i])): continue
+               self.assertAlmostEqual(a[i],b[i],places)
+            else:
+               self.assert_list_almost_equal(a[i],b[i],places)
+
+   def write_test_file(self,filename,text):
+      outfile = open(filename,'w')
+      outfile.write(text)
+      outfile.close()
+
+   def test_atom_site_fields(self):
+      '''
+	   test reading the atom_site fields of a mmcif file with 2 models
+	   '''
+      #
+      filename = moduleDataPath+'test-results/readmmcif-test.cif'
+      self.write_test_file(filename,MMCIF_TEXT)
+      self.o.read_mmcif(filename)
+      #
+      self.assertEqual(self.o.natoms(),3)
+      self.assertEqual(self.o.number_of_frames(),2)
+      self.assertEqual(self.o.atom(),['ATOM','ATOM','HETATM'])
+      self.assertEqual(list(self.o.index()),[1,2,3])
+      self.assertEqual(list(self.o.original_index()),[123456,123457,123458])
+      self.assertEqual(self.o.name(),['N','CA',"O5'"])
+      self.assertEqual(self.o.resname(),['ALA','ALA','ADE'])
+      self.assertEqual(list(self.o.resid()),[12345,12345,12346])
+      self.assertEqual(self.o.chain(),['AB','AB','AB'])
+      self.assertEqual(self.o.segname(),['A','A','B'])
+      self.assertEqual(self.o.loc(),[' ',' ',' '])
+      self.assertEqual(self.o.rescode(),[' ',' ',' '])
+      self.assertEqual(self.o.occupancy(),['1.00','0.50','1.00'])
+      self.assertEqual(self.o.beta(),['10.00','20.00','0.00'])
+      self.assertEqual(self.o.element(),['N','C','O'])
+      self.assertEqual(self.o.charge(),['1+','  ','  '])
+      self.assertEqual(self.o.moltype(),['protein','protein','rna'])
+      self.assertEqual(self.o.resnames(),['ALA','ADE'])
+      self.assertEqual(self.o.conect(),{})
+      #
+      self.assert_list_almost_equal(self.o.coor()[0],[[1.0,2.0,3.0],[4.0,5.0,6.0],[7.0,8.0,9.0]],3)
+      self.assert_list_almost_equal(self.o.coor()[1],[[1.5,2.5,3.5],[4.5,5.5,6.5],[7.5,8.5,9.5]],3)
+      os.remove(filename)
+
+   def test_unequal_models(self):
+      '''
+	   test that models with different numbers of atoms raise an exception
+	   '''
+      #
+      filename = moduleDataPath+'test-results/readmmcif-unequal-test.cif'
+      text = MMCIF_TEXT.replace('''HETATM 123458 O "O5'" . ADE B . ?\n7.500 8.500 9.500 ? ? ? 12346 ADE AB "O5'" 2\n''','')
+      self.write_test_file(filename,text)
+      with self.assertRaises(Exception):
+         self.o.read_mmcif(filename)
+      os.remove(filename)
+
+   def test_no_atom_site(self):
+      '''
+	   test that a file without an atom_site loop raises an exception
+	   '''
+      #
+      filename = moduleDataPath+'test-results/readmmcif-empty-test.cif'
+      self.write_test_file(filename,'data_test\n#\n_cell.length_a 1.000\n#\n')
+      with self.assertRaises(Exception):
+         self.o.read_mmcif(filename)
+      os.remove(filename)
+
+   def test_rna_same_as_read_pdb(self):
+      '''
+	   test that a mmcif file written from rna.pdb reads back the same atoms as read_pdb
+	   '''
+      #
+      filename = moduleDataPath+'test-results/rna-readmmcif-test.cif'
+      o=system.Molecule(0)
+      o.read_pdb(DataPath+'rna.pdb')
+      o.write_mmcif(filename,0)
+      self.o.read_mmcif(filename)
+      #
+      self.assertEqual(self.o.natoms(),o.natoms())
+      self.assertEqual(self.o.name(),o.name())
+      self.assertEqual(self.o.resname(),o.resname())
+      self.assertEqual(list(self.o.resid()),list(o.resid()))
+      self.assertEqual(self.o.segname(),o.segname())
+      self.assertEqual(self.o.element(),o.element())
+      self.assertEqual(self.o.moltype(),o.moltype())
+      self.assertAlmostEqual(self.o.mass().sum(),o.mass().sum(),3)
+      self.assert_list_almost_equal(self.o.coor()[0],o.coor()[0],3)
+      os.remove(filename)
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
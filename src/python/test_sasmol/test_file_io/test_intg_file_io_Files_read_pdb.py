@@ -21,7 +21,7 @@ from unittest import main, skipIf
 from mocker import Mocker, MockerTestCase, ANY, ARGS, KWARGS
 import sasmol.system as system
 
-import numpy, os, copy
+import numpy, os, copy, gzip, shutil
 
 floattype=os.environ['SASMOL_FLOATTYPE']
 
@@ -259,6 +259,142 @@ class Test_intg_file_io_Files_read_dcd(MockerTestCase):
       self.o.read_pdb(moduleDataPath+"nef_nohis.pdb")
       print self.o.name()
 
+   def test_2AAD_three_frames_separatedby_END_vectorized(self):
+      '''
+	   test that the vectorized decoding of a pdb file with 2 amino acids and 3 frames (separated by END) matches the default reader
+	   '''
+      #
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-END.pdb')
+      o=system.Molecule(0)
+      o.read_pdb(moduleDataPath+'2AAD-1to3-END.pdb',vectorized=True)
+      #
+      self.assert_list_almost_equal(o.coor(), self.o.coor(),3)
+      self.assertEqual(o.name(),self.o.name())
+      self.assertEqual(o.resname(),self.o.resname())
+      self.assertEqual(o.chain(),self.o.chain())
+      self.assertEqual(o.occupancy(),self.o.occupancy())
+      self.assertEqual(o.beta(),self.o.beta())
+      self.assertEqual(o.segname(),self.o.segname())
+      self.assertEqual(o.element(),self.o.element())
+      self.assertEqual(o.charge(),self.o.charge())
+      self.assertEqual(o.moltype(),self.o.moltype())
+      self.assertEqual(list(o.index()),list(self.o.index()))
+      self.assertEqual(list(o.resid()),list(self.o.resid()))
+      self.assertEqual(o.resids(),self.o.resids())
+      self.assertEqual(o.betas(),self.o.betas())
+      self.assertEqual(o.header(),self.o.header())
+
+   def test_2AAD_three_frames_separatedby_MODEL_vectorized(self):
+      '''
+	   test the vectorized decoding of a pdb file with 2 amino acids and 3 frames (separated by MODEL)
+	   '''
+      #
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb',vectorized=True)
+      result_coor = self.o.coor()
+      #
+      self.assertEqual(result_coor.shape,(3,15,3))
+      self.assert_list_almost_equal(result_coor[1][0],[-73.944, 41.799, 41.652],3)
+      self.assert_list_almost_equal(result_coor[2][14],[76.970, -46.273, 42.000],3)
+
+   def test_2AAD_three_frames_separatedby_MODEL_wrong_number_atoms_vectorized(self):
+      '''
+	   test the vectorized decoding of a pdb file with a wrong number of atoms in one MODEL
+	   '''
+      #
+      with self.assertRaises(Exception):
+         self.o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL_wrong_number_atoms.pdb',vectorized=True)
+
+   def test_2AAD_three_frames_gzip(self):
+      '''
+	   test reading a gzip compressed pdb file with 2 amino acids and 3 frames
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-1to3-MODEL-readpdb-test.pdb.gz'
+      outfile = gzip.open(filename,'wb')
+      outfile.write(open(moduleDataPath+'2AAD-1to3-MODEL.pdb').read())
+      outfile.close()
+      #
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb')
+      o=system.Molecule(0)
+      o.read_pdb(filename)
+      os.remove(filename)
+      #
+      self.assert_list_almost_equal(o.coor(), self.o.coor(),3)
+      self.assertEqual(o.name(),self.o.name())
+      self.assertEqual(o.header(),self.o.header())
+
+   def test_2AAD_three_frames_cache(self):
+      '''
+	   test that a pdb file read with cache=True is loaded from its cache the second time
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-1to3-MODEL-cache-test.pdb'
+      shutil.copy(moduleDataPath+'2AAD-1to3-MODEL.pdb',filename)
+      self.o.read_pdb(filename)
+      #
+      o=system.Molecule(0)
+      o.read_pdb(filename,cache=True)
+      self.assertTrue(os.path.isfile(filename+'.sascache'))
+      self.assertFalse(isinstance(o.coor(),numpy.memmap))
+      #
+      o=system.Molecule(0)
+      o.read_pdb(filename,cache=True)
+      self.assertTrue(isinstance(o.coor(),numpy.memmap))
+      self.assert_list_almost_equal(o.coor(), self.o.coor(),3)
+      self.assertEqual(list(o.index()),list(self.o.index()))
+      self.assertEqual(o.name(),self.o.name())
+      self.assertEqual(o.names(),self.o.names())
+      self.assertEqual(o.element(),self.o.element())
+      self.assertEqual(o.header(),self.o.header())
+      self.assertAlmostEqual(o.total_mass(),self.o.total_mass(),3)
+      #
+      outfile = open(filename,'a')
+      outfile.write('REMARK changed\n')
+      outfile.close()
+      o=system.Molecule(0)
+      o.read_pdb(filename,cache=True)
+      self.assertFalse(isinstance(o.coor(),numpy.memmap))
+      #
+      os.remove(filename+'.sascache')
+      os.remove(filename)
+
+   def test_2AAD_planted_cache(self):
+      '''
+	   test that a cache file that is not valid JSON metadata is ignored and never unpickled
+	   '''
+      #
+      import cPickle, struct
+      import sasmol.pdb_io as pdb_io
+      filename = moduleDataPath+'test-results/2AAD-1to3-MODEL-planted-test.pdb'
+      marker = moduleDataPath+'test-results/planted-cache-marker'
+      shutil.copy(moduleDataPath+'2AAD-1to3-MODEL.pdb',filename)
+      self.o.read_pdb(filename)
+      #
+      class Planted(object):
+         def __reduce__(self):
+            return (os.mkdir,(marker,))
+      metadata = cPickle.dumps(Planted(),2)
+      outfile = open(filename+'.sascache','wb')
+      outfile.write(pdb_io.PDB_CACHE_MAGIC+struct.pack('<q',len(metadata))+metadata)
+      outfile.close()
+      #
+      o=system.Molecule(3)
+      o.read_pdb(filename,cache=True)
+      self.assertFalse(os.path.exists(marker))
+      self.assertFalse(isinstance(o.coor(),numpy.memmap))
+      self.assertEqual(o.id(),3)
+      self.assertEqual(o.name(),self.o.name())
+      #
+      o=system.Molecule(4)
+      o.read_pdb(filename,cache=True)
+      self.assertTrue(isinstance(o.coor(),numpy.memmap))
+      self.assertEqual(o.id(),4)
+      self.assertEqual(o.conect(),self.o.conect())
+      self.assertEqual(o.resids(),self.o.resids())
+      #
+      os.remove(filename+'.sascache')
+      os.remove(filename)
+
    def tearDown(self):
       pass
         
@@ -0,0 +1,108 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+import sasmol.system as system
+
+import numpy, os
+
+floattype=os.environ['SASMOL_FLOATTYPE']
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_read_pdb_frames(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def assert_list_almost_equal(self,a,b,places=5):
+      if (len(a)!=len(b)):
+         raise TypeError
+      else:
+         for i in range(len(a)):
+            if isinstance(a[i],(int,float,numpy.generic)):
+               if (numpy.isnan(a[i]) and numpy.isnan(b[i])): continue
+               self.assertAlmostEqual(a[i],b[i],places)
+            else:
+               self.assert_list_almost_equal(a[i],b[i],places)
+
+   def test_1ATM_two_frames_frame_1(self):
+      '''
+	   test reading the second frame of a pdb file with 1 atom and 2 frames
+	   '''
+      #
+      self.o.read_pdb_frames(DataPath+'1ATM-1to2.pdb',1,sidecar=False)
+      result_coor = self.o.coor()
+      #
+      expected_coor = numpy.array([[[73.944, 38.799, 41.652]]],floattype)
+      self.assert_list_almost_equal(expected_coor, result_coor,3)
+
+   def test_2AAD_three_frames_separatedby_MODEL(self):
+      '''
+	   test that reading frames of a pdb file with 3 MODEL entries matches read_pdb
+	   '''
+      #
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb')
+      expected_coor = self.o.coor()
+      #
+      o=system.Molecule(0)
+      o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb',fastread=True)
+      o.read_pdb_frames(moduleDataPath+'2AAD-1to3-MODEL.pdb',[2,0],sidecar=False)
+      #
+      self.assertEqual(o.coor().shape,(2,15,3))
+      self.assert_list_almost_equal(o.coor()[0],expected_coor[2],3)
+      self.assert_list_almost_equal(o.coor()[1],expected_coor[0],3)
+
+   def test_2AAD_three_frames_separatedby_END_all_frames(self):
+      '''
+	   test reading all frames of a pdb file with 3 frames separated by END
+	   '''
+      #
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-END.pdb')
+      expected_coor = self.o.coor()
+      #
+      o=system.Molecule(0)
+      o.read_pdb_frames(moduleDataPath+'2AAD-1to3-END.pdb',range(3),sidecar=False)
+      #
+      self.assert_list_almost_equal(o.coor(),expected_coor,3)
+
+   def test_frame_out_of_range(self):
+      '''
+	   test reading a frame that is not in the file
+	   '''
+      #
+      with self.assertRaises(Exception):
+         self.o.read_pdb_frames(moduleDataPath+'2AAD-1to3-END.pdb',3,sidecar=False)
+
+   def test_wrong_number_atoms(self):
+      '''
+	   test reading frames with different numbers of atoms
+	   '''
+      #
+      with self.assertRaises(Exception):
+         self.o.read_pdb_frames(moduleDataPath+'2AAD-1to3-END_wrong_number_atoms.pdb',[0,1,2],sidecar=False)
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
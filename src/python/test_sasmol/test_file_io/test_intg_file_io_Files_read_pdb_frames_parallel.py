@@ -0,0 +1,119 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+import sasmol.system as system
+
+import numpy, os
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_read_pdb_frames_parallel(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def test_2AAD_MODEL(self):
+      '''
+	   test reading a pdb file with 2 amino acids and 3 MODEL frames with 2 workers
+	   '''
+      #
+      filename = moduleDataPath+'2AAD-1to3-MODEL.pdb'
+      o=system.Molecule(0)
+      o.read_pdb(filename)
+      self.o.read_pdb(filename,workers=2)
+      self.assertTrue(numpy.array_equal(self.o.coor(),o.coor()))
+      self.assertEqual(self.o.name(),o.name())
+      self.assertEqual(self.o.beta(),o.beta())
+
+   def test_2AAD_END(self):
+      '''
+	   test reading a pdb file with 2 amino acids and 3 END frames with 3 workers
+	   '''
+      #
+      filename = moduleDataPath+'2AAD-1to3-END.pdb'
+      o=system.Molecule(0)
+      o.read_pdb(filename)
+      self.o.read_pdb(filename,workers=3)
+      self.assertTrue(numpy.array_equal(self.o.coor(),o.coor()))
+
+   def test_many_frames(self):
+      '''
+	   test reading 20 frames of hiv1_gag written by write_pdb_frames with 2 workers
+	   '''
+      #
+      filename = moduleDataPath+'test-results/hiv1_gag-parallel-test.pdb'
+      o=system.Molecule(0)
+      o.read_pdb(DataPath+'hiv1_gag.pdb')
+      o.setCoor(numpy.concatenate([o.coor()+i for i in range(20)]))
+      o.write_pdb_frames(filename,0,20)
+      #
+      o=system.Molecule(0)
+      o.read_pdb(filename)
+      self.o.read_pdb(filename,workers=2)
+      self.assertEqual(self.o.number_of_frames(),20)
+      self.assertTrue(numpy.array_equal(self.o.coor(),o.coor()))
+      self.assertFalse(os.path.isfile(filename+'.frames.npz'))
+      os.remove(filename)
+
+   def test_frame_offsets(self):
+      '''
+	   test that the frame offsets collected by read_pdb are those of index_pdb_frames
+	   '''
+      #
+      for filename in [moduleDataPath+'2AAD-1to3-MODEL.pdb',moduleDataPath+'2AAD-1to3-END.pdb']:
+         offsets = []
+         self.o.read_pdb(filename,fastread=True,frame_offsets=offsets)
+         self.assertEqual(offsets,self.o.index_pdb_frames(filename,sidecar=False).tolist())
+
+   def test_compressed(self):
+      '''
+	   test reading a gzip compressed pdb file with 3 MODEL frames with 2 workers
+	   '''
+      #
+      import gzip
+      filename = moduleDataPath+'test-results/2AAD-1to3-MODEL-parallel-test.pdb.gz'
+      outfile = gzip.open(filename,'wb')
+      outfile.write(open(moduleDataPath+'2AAD-1to3-MODEL.pdb').read())
+      outfile.close()
+      o=system.Molecule(0)
+      o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb')
+      self.o.read_pdb(filename,workers=2)
+      os.remove(filename)
+      self.assertEqual(self.o.number_of_frames(),3)
+      self.assertTrue(numpy.array_equal(self.o.coor(),o.coor()))
+
+   def test_single_frame(self):
+      '''
+	   test that workers is ignored for a pdb file with a single frame
+	   '''
+      #
+      o=system.Molecule(0)
+      o.read_pdb(DataPath+'1ATM.pdb')
+      self.o.read_pdb(DataPath+'1ATM.pdb',workers=2)
+      self.assertTrue(numpy.array_equal(self.o.coor(),o.coor()))
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
@@ -0,0 +1,74 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+
+import numpy
+
+import os
+
+dcdDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','dcd_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_read_sct_frames(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+      self.sctFile = moduleDataPath+'test-results/rna-1to10-readsctframes.sct'
+      self.o.read_dcd(dcdDataPath+'rna-1to10.dcd')
+      self.o.write_sct(self.sctFile,frames_per_chunk=3)
+
+   def test_frames_across_chunks(self):
+      '''
+	   test reading frames from different chunks in the order given
+	   '''
+      #
+      o1 = system.Molecule(0)
+      coor = o1.read_sct_frames(self.sctFile,[9,0,4,3])
+      self.assertEqual(coor.shape,(4,self.o.coor().shape[1],3))
+      self.assertTrue(numpy.abs(o1.coor()-self.o.coor()[[9,0,4,3]]).max() <= 0.0005)
+      self.assertTrue(numpy.allclose(o1.unitcell(),self.o.unitcell()[[9,0,4,3]]))
+
+   def test_single_frame(self):
+      '''
+	   test reading a single frame
+	   '''
+      #
+      o1 = system.Molecule(0)
+      o1.read_sct_frames(self.sctFile,7)
+      self.assertEqual(o1.coor().shape,(1,self.o.coor().shape[1],3))
+      self.assertTrue(numpy.abs(o1.coor()[0]-self.o.coor()[7]).max() <= 0.0005)
+
+   def test_frame_out_of_range(self):
+      '''
+	   test that reading a frame that is not in the file raises an exception
+	   '''
+      #
+      o1 = system.Molecule(0)
+      with self.assertRaises(Exception):
+         o1.read_sct_frames(self.sctFile,[10])
+
+   def tearDown(self):
+      os.remove(self.sctFile)
+
+if __name__ == '__main__':
+   main()
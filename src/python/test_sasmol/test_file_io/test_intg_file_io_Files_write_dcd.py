@@ -21,9 +21,11 @@ from unittest import main,skipIf
 from mocker import Mocker, MockerTestCase
 
 import sasmol.system as system
+import sasmol.dcd_io as dcd_io
+import sasmol.dcdio as dcdio
 
 import numpy
-import os
+import os, gzip
 
 floattype=os.environ['SASMOL_FLOATTYPE']
 
@@ -193,6 +195,84 @@ class Test_intg_file_io_Files_write_dcd(MockerTestCase):
       self.assertAlmostEqual(sum_result_coor, sum_expected_coor, self.prcsn)
 
 
+   def test_2AAD_gzip(self):
+      '''
+	   test writing a gzip compressed dcd with 3 frames based on a 2-aa pdb
+	   '''
+      #
+      pdbFile = pdbDataPath+'2AAD-1to3.pdb'
+      dcdFile = moduleDataPath+'test-results/2AAD-1to3-writedcd.dcd'
+      self.o.read_pdb(pdbFile)
+      self.o.write_dcd(dcdFile)
+      self.o.write_dcd(dcdFile+'.gz')
+      #
+      self.assertEqual(gzip.open(dcdFile+'.gz','rb').read(),open(dcdFile,'rb').read())
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile+'.gz')
+      os.remove(dcdFile)
+      os.remove(dcdFile+'.gz')
+      #
+      self.assert_list_almost_equal(o1.coor(), self.o.coor(), self.prcsn)
+
+   def test_rna_frame1to10_same_as_dcdio(self):
+      '''
+	   test that the file written in blocks is identical to the one written frame by frame by dcdio
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/rna-1to10-writedcd-block.dcd'
+      dcdioFile = moduleDataPath+'test-results/rna-1to10-writedcd-dcdio.dcd'
+      self.o.read_pdb(pdbDataPath+'rna.pdb')
+      self.o.read_dcd(dcdDataPath+'rna-1to10.dcd')
+      self.o.setUnitcell(None)
+      self.o.write_dcd(dcdFile)
+      #
+      natoms = self.o.natoms()
+      outfile = dcdio.open_dcd_write(dcdioFile)
+      dcdio.write_dcdheader(outfile,dcdioFile,natoms,10,0,1,1.0)
+      for frame in range(10):
+         dcdio.write_dcdstep(outfile,self.o.coor()[frame,:,0].astype(numpy.float32),self.o.coor()[frame,:,1].astype(numpy.float32),self.o.coor()[frame,:,2].astype(numpy.float32),frame+1)
+      dcdio.close_dcd_write(outfile)
+      #
+      self.assertEqual(open(dcdFile,'rb').read(),open(dcdioFile,'rb').read())
+      os.remove(dcdFile)
+      os.remove(dcdioFile)
+
+   def test_rna_frame1to10_progress(self):
+      '''
+	   test that the progress function is called after every block of frames
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/rna-1to10-writedcd-progress.dcd'
+      self.o.read_pdb(pdbDataPath+'rna.pdb')
+      self.o.read_dcd(dcdDataPath+'rna-1to10.dcd')
+      calls = []
+      block_size = dcd_io.DCD_BLOCK_SIZE
+      dcd_io.DCD_BLOCK_SIZE = 4*3*self.o.natoms()
+      try:
+         self.o.write_dcd(dcdFile,progress=lambda written,total: calls.append((written,total)))
+      finally:
+         dcd_io.DCD_BLOCK_SIZE = block_size
+      self.assertEqual(calls,[(4,10),(8,10),(10,10)])
+      #
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile)
+      os.remove(dcdFile)
+      self.assertTrue(numpy.array_equal(o1.coor(),self.o.coor()))
+
+   def test_2AAD_float32(self):
+      '''
+	   test writing float32 coordinates
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-1to3-writedcd-float32.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.setCoor(self.o.coor().astype(numpy.float32))
+      self.o.write_dcd(dcdFile)
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile)
+      os.remove(dcdFile)
+      self.assertTrue(numpy.array_equal(o1.coor(),self.o.coor()))
+
    def tearDown(self):
       pass
         
@@ -20,8 +20,9 @@ from sasmol.test_sasmol.utilities import env
 from unittest import main,skipIf
 from mocker import Mocker, MockerTestCase
 import sasmol.system as system
+import sasmol.dcd_io as dcd_io
 
-import numpy
+import numpy, shutil
 import os
 
 floattype=os.environ['SASMOL_FLOATTYPE']
@@ -252,6 +253,89 @@ class Test_intg_file_io_Files_write_dcd(MockerTestCase):
       self.assertAlmostEqual(sum_result_coor, sum_expected_coor, self.prcsn)
 
 
+   def test_2AAD_append(self):
+      '''
+	   test appending frames to a dcd file
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-append-writedcdframes.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.write_dcd_frames(dcdFile,0,1)
+      self.o.write_dcd_frames(dcdFile,1,3,append=True)
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile)
+      self.assertTrue(numpy.array_equal(o1.coor(),self.o.coor().astype(numpy.float32)))
+      #
+      self.o.write_dcd(dcdFile+'.ref')
+      self.assertEqual(open(dcdFile,'rb').read(),open(dcdFile+'.ref','rb').read())
+      os.remove(dcdFile)
+      os.remove(dcdFile+'.ref')
+
+   def test_2AAD_append_to_charmm_file(self):
+      '''
+	   test that appending to a charmm dcd with unit cells raises an exception
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-charmm-writedcdframes.dcd'
+      shutil.copy(dcdDataPath+'2AAD.dcd',dcdFile)
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      with self.assertRaises(Exception):
+         self.o.write_dcd_frames(dcdFile,0,1,append=True)
+      os.remove(dcdFile)
+
+   def test_writer_flush(self):
+      '''
+	   test that a dcd file is complete after every flush of a DCD_Writer
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-writer-writedcdframes.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      writer = dcd_io.DCD_Writer(self.o,dcdFile,'w')
+      for frame in range(3):
+         writer.write_frame(frame)
+         writer.flush()
+         o1 = system.Molecule(0)
+         o1.read_dcd(dcdFile)
+         self.assertEqual(o1.number_of_frames(),frame+1)
+         self.assertTrue(numpy.array_equal(o1.coor()[frame],self.o.coor()[frame].astype(numpy.float32)))
+      writer.close()
+      os.remove(dcdFile)
+
+   def test_writer_recover_partial_frame(self):
+      '''
+	   test that appending to a file with a partially written frame cuts the frame off
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-recover-writedcdframes.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.write_dcd_frames(dcdFile,0,2)
+      outfile = open(dcdFile,'ab')
+      outfile.write('\x00'*37)
+      outfile.close()
+      #
+      writer = dcd_io.DCD_Writer(self.o,dcdFile,'a')
+      self.assertEqual(writer.number_of_frames(),2)
+      writer.write_frame(2)
+      writer.close()
+      o1 = system.Molecule(0)
+      o1.read_dcd(dcdFile)
+      self.assertTrue(numpy.array_equal(o1.coor(),self.o.coor().astype(numpy.float32)))
+      os.remove(dcdFile)
+
+   def test_writer_wrong_number_of_atoms(self):
+      '''
+	   test that appending a molecule with a different number of atoms raises an exception
+	   '''
+      #
+      dcdFile = moduleDataPath+'test-results/2AAD-natoms-writedcdframes.dcd'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.write_dcd_frames(dcdFile,0,1)
+      o1 = system.Molecule(0)
+      o1.read_pdb(pdbDataPath+'1ATM.pdb')
+      with self.assertRaises(Exception):
+         dcd_io.DCD_Writer(o1,dcdFile,'a')
+      os.remove(dcdFile)
+
    def tearDown(self):
       pass
         
@@ -0,0 +1,122 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+import sasmol.system as system
+
+import numpy, os
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_write_mmcif(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def assert_list_almost_equal(self,a,b,places=5):
+      if (len(a)!=len(b)):
+         raise TypeError
+      else:
+         for i in range(len(a)):
+            if isinstance(a[i],(int,float,numpy.generic)):
+               if (numpy.isnan(a[i]) and numpy.isnan(b[i])): continue
+               self.assertAlmostEqual(a[i],b[i],places)
+            else:
+               self.assert_list_almost_equal(a[i],b[i],places)
+
+   def test_2AAD_three_frames(self):
+      '''
+	   test writing and reading back a mmcif file with 2 amino acids and 3 frames
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-1to3-writemmcif-test.cif'
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb')
+      result = self.o.write_mmcif_frames(filename,0,3)
+      self.assertEqual(result,1)
+      #
+      o=system.Molecule(0)
+      o.read_mmcif(filename)
+      self.assertEqual(o.number_of_frames(),3)
+      self.assert_list_almost_equal(o.coor(),self.o.coor(),3)
+      self.assertEqual(o.name(),self.o.name())
+      self.assertEqual(o.resname(),self.o.resname())
+      self.assertEqual(o.chain(),self.o.chain())
+      self.assertEqual(o.segname(),self.o.segname())
+      self.assertEqual(o.occupancy(),self.o.occupancy())
+      self.assertEqual(o.beta(),self.o.beta())
+      self.assertEqual(o.element(),self.o.element())
+      self.assertEqual(o.charge(),self.o.charge())
+      os.remove(filename)
+
+   def test_2AAD_single_frame(self):
+      '''
+	   test writing the second frame of a mmcif file with 2 amino acids and 3 frames
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-2-writemmcif-test.cif'
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb')
+      self.o.write_mmcif(filename,1)
+      #
+      o=system.Molecule(0)
+      o.read_mmcif(filename)
+      self.assertEqual(o.number_of_frames(),1)
+      self.assert_list_almost_equal(o.coor()[0],self.o.coor()[1],3)
+      os.remove(filename)
+
+   def test_large_index_and_resid(self):
+      '''
+	   test that indices above 99999 and resids above 9999 are written without clamping
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-largeindex-writemmcif-test.cif'
+      self.o.read_pdb(DataPath+'2AAD.pdb')
+      self.o.setIndex(numpy.arange(200001,200001+self.o.natoms()))
+      self.o.setResid(numpy.array(self.o.resid())+50000)
+      self.o.write_mmcif(filename,0)
+      #
+      o=system.Molecule(0)
+      o.read_mmcif(filename)
+      self.assertEqual(list(o.original_index()),range(200001,200001+self.o.natoms()))
+      self.assertEqual(list(o.resid()),list(self.o.resid()))
+      os.remove(filename)
+
+   def test_quoted_names(self):
+      '''
+	   test that atom names with primes are quoted and read back
+	   '''
+      #
+      filename = moduleDataPath+'test-results/rna-writemmcif-test.cif'
+      self.o.read_pdb(DataPath+'rna.pdb')
+      self.o.write_mmcif(filename,0)
+      #
+      text = open(filename).read()
+      self.assertTrue('"O5\'"' in text)
+      o=system.Molecule(0)
+      o.read_mmcif(filename)
+      self.assertEqual(o.name(),self.o.name())
+      os.remove(filename)
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
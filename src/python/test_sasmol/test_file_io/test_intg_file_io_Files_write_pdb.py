@@ -21,7 +21,7 @@ from unittest import main,skipIf
 from mocker import Mocker, MockerTestCase, ANY, ARGS, KWARGS
 import sasmol.system as system
 
-import numpy, os, copy
+import numpy, os, copy, bz2, gzip
 
 import warnings; warnings.filterwarnings('ignore')
 
@@ -133,6 +133,53 @@ class Test_intg_file_io_Files_write_pdb(MockerTestCase):
 
 
 
+   def test_2AAD_bz2(self):
+      '''
+	   test writing a bz2 compressed pdb file with 2 amino acids
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-writepdb-test.pdb.bz2'
+      self.o.read_pdb(DataPath+'2AAD.pdb')
+      self.o.write_pdb(filename,0,'w')
+      self.o.write_pdb(moduleDataPath+'test-results/2AAD-writepdb-test.pdb',0,'w')
+      #
+      self.assertEqual(bz2.BZ2File(filename).read(),open(moduleDataPath+'test-results/2AAD-writepdb-test.pdb').read())
+      o=system.Molecule(0)
+      o.read_pdb(filename)
+      self.assert_list_almost_equal(o.coor(), self.o.coor(),3)
+      os.remove(filename)
+      os.remove(moduleDataPath+'test-results/2AAD-writepdb-test.pdb')
+
+   def test_2AAD_gz_append(self):
+      '''
+	   test appending a frame to a gzip compressed pdb file with 2 amino acids
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-writepdb-test.pdb.gz'
+      self.o.read_pdb(DataPath+'2AAD.pdb')
+      self.o.write_pdb(filename,0,'w')
+      self.o.write_pdb(filename,0,'a')
+      self.o.write_pdb(moduleDataPath+'test-results/2AAD-writepdb-test.pdb',0,'w')
+      self.o.write_pdb(moduleDataPath+'test-results/2AAD-writepdb-test.pdb',0,'a')
+      #
+      self.assertEqual(gzip.open(filename).read(),open(moduleDataPath+'test-results/2AAD-writepdb-test.pdb').read())
+      os.remove(filename)
+      os.remove(moduleDataPath+'test-results/2AAD-writepdb-test.pdb')
+
+   def test_2AAD_bz2_append(self):
+      '''
+	   test that appending to a bz2 compressed pdb file is an error and leaves the file as it was
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-writepdb-test.pdb.bz2'
+      self.o.read_pdb(DataPath+'2AAD.pdb')
+      self.o.write_pdb(filename,0,'w')
+      written = bz2.BZ2File(filename).read()
+      with self.assertRaises(Exception):
+         self.o.write_pdb(filename,0,'a')
+      self.assertEqual(bz2.BZ2File(filename).read(),written)
+      os.remove(filename)
+
    def tearDown(self):
       pass
         
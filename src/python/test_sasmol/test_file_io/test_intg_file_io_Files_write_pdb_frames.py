@@ -0,0 +1,123 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D. 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+import sasmol.system as system
+import sasmol.pdb_io as pdb_io
+
+import numpy, os
+
+DataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_write_pdb_frames(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def assert_list_almost_equal(self,a,b,places=5):
+      if (len(a)!=len(b)):
+         raise TypeError
+      else:
+         for i in range(len(a)):
+            if isinstance(a[i],(int,float,numpy.generic)):
+               if (numpy.isnan(a[i]) and numpy.isnan(b[i])): continue
+               self.assertAlmostEqual(a[i],b[i],places)
+            else:
+               self.assert_list_almost_equal(a[i],b[i],places)
+
+   def test_2AAD_three_frames(self):
+      '''
+	   test writing and reading back a pdb file with 2 amino acids and 3 frames
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-1to3-writepdbframes-test.pdb'
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-END.pdb')
+      result = self.o.write_pdb_frames(filename,0,3)
+      self.assertEqual(result,1)
+      #
+      o=system.Molecule(0)
+      o.read_pdb(filename)
+      self.assertEqual(o.number_of_frames(),3)
+      self.assert_list_almost_equal(o.coor(),self.o.coor(),3)
+      self.assertEqual(o.name(),self.o.name())
+      self.assertEqual(o.beta(),self.o.beta())
+      #
+      lines = open(filename).read().splitlines()
+      self.assertEqual([lin for lin in lines if lin[0:5]=='MODEL'],['MODEL 1','MODEL 2','MODEL 3'])
+      self.assertEqual(lines[-2:],['ENDMDL','END'])
+      os.remove(filename)
+
+   def test_2AAD_frame_range(self):
+      '''
+	   test writing frames 1 and 2 of a pdb file with 2 amino acids and 3 frames
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-2to3-writepdbframes-test.pdb'
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb')
+      self.o.write_pdb_frames(filename,1,3)
+      #
+      o=system.Molecule(0)
+      o.read_pdb(filename)
+      self.assertEqual(o.number_of_frames(),2)
+      self.assert_list_almost_equal(o.coor(),self.o.coor()[1:],3)
+      os.remove(filename)
+
+   def test_2AAD_same_records_as_write_pdb(self):
+      '''
+	   test that the atom records written by a PDB_Writer are identical to those of write_pdb
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-writepdbframes-test.pdb'
+      filename_w = moduleDataPath+'test-results/2AAD-writepdb-test.pdb'
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb')
+      for frame in range(3):
+         self.o.write_pdb(filename_w,frame,'w')
+         writer = pdb_io.PDB_Writer(self.o,filename,'w')
+         writer.write_frame(frame)
+         writer.close()
+         self.assertEqual(open(filename).read(),open(filename_w).read())
+      os.remove(filename)
+      os.remove(filename_w)
+
+   def test_writer_open_across_frames(self):
+      '''
+	   test that a PDB_Writer numbers the models of consecutive calls
+	   '''
+      #
+      filename = moduleDataPath+'test-results/2AAD-writer-test.pdb'
+      self.o.read_pdb(moduleDataPath+'2AAD-1to3-MODEL.pdb')
+      writer = pdb_io.PDB_Writer(self.o,filename,'w')
+      writer.write_frame(0,model=1)
+      writer.write_frame(1,model=2)
+      writer.write_frame(2,model=3)
+      writer.close()
+      #
+      lines = open(filename).read().splitlines()
+      self.assertEqual(lines.count('ENDMDL'),3)
+      self.assertEqual(len([lin for lin in lines if lin[0:4]=='ATOM']),45)
+      os.remove(filename)
+
+   def tearDown(self):
+      pass
+
+
+if __name__ == '__main__': 
+   main()
@@ -0,0 +1,146 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+from unittest import main, skipIf
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+
+import numpy
+
+import os
+
+try:
+   import lzma
+except ImportError:
+   try:
+      from backports import lzma
+   except ImportError:
+      lzma = None
+
+pdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+dcdDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','dcd_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io')+os.path.sep
+
+class Test_intg_file_io_Files_write_sct(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+
+   def test_rna_1to10(self):
+      '''
+	   test writing and reading back a dcd with 10 frames within the precision
+	   '''
+      #
+      sctFile = moduleDataPath+'test-results/rna-1to10-writesct.sct'
+      self.o.read_dcd(dcdDataPath+'rna-1to10.dcd')
+      self.o.write_sct(sctFile,frames_per_chunk=4)
+      o1 = system.Molecule(0)
+      o1.read_sct(sctFile)
+      self.assertEqual(o1.coor().shape,self.o.coor().shape)
+      self.assertTrue(numpy.abs(o1.coor()-self.o.coor()).max() <= 0.0005)
+      self.assertTrue(numpy.allclose(o1.unitcell(),self.o.unitcell()))
+      self.assertTrue(os.path.getsize(sctFile) < os.path.getsize(dcdDataPath+'rna-1to10.dcd')/2)
+      os.remove(sctFile)
+
+   def test_precision(self):
+      '''
+	   test that the coordinates are rounded to the given precision
+	   '''
+      #
+      sctFile = moduleDataPath+'test-results/2AAD-writesct-precision.sct'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.write_sct(sctFile,precision=0.1)
+      o1 = system.Molecule(0)
+      o1.read_sct(sctFile)
+      self.assertTrue(numpy.abs(o1.coor()-self.o.coor()).max() <= 0.05+1e-9)
+      self.assertTrue(numpy.allclose(o1.coor(),numpy.round(self.o.coor()*10.0)/10.0))
+      self.assertEqual(o1.unitcell(),None)
+      os.remove(sctFile)
+
+   def test_large_spread_fine_precision(self):
+      '''
+	   test that coordinates far apart at a fine precision, whose differences need more than 32 bits, are read back exactly
+	   '''
+      #
+      sctFile = moduleDataPath+'test-results/writesct-spread.sct'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      numpy.random.seed(11)
+      coor = numpy.random.choice([-2100.0,-1100.0,0.5,1100.0,2100.0],self.o.coor().shape)
+      coor[0,:2,0] = [-1100.0,1100.0]
+      self.o.setCoor(coor)
+      self.o.write_sct(sctFile,precision=1e-6)
+      o1 = system.Molecule(0)
+      o1.read_sct(sctFile)
+      self.assertTrue(numpy.abs(o1.coor()-coor).max() <= 0.5e-6+1e-9)
+      os.remove(sctFile)
+
+   def test_uncompressed(self):
+      '''
+	   test writing frames without compression
+	   '''
+      #
+      sctFile = moduleDataPath+'test-results/2AAD-writesct-none.sct'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.write_sct_frames(sctFile,1,3,compression='none')
+      o1 = system.Molecule(0)
+      o1.read_sct(sctFile)
+      self.assertTrue(numpy.abs(o1.coor()-self.o.coor()[1:3]).max() <= 0.0005)
+      os.remove(sctFile)
+
+   @skipIf(lzma is None,"the lzma module is not installed")
+   def test_lzma(self):
+      '''
+	   test writing frames with lzma compression
+	   '''
+      #
+      sctFile = moduleDataPath+'test-results/2AAD-writesct-lzma.sct'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      self.o.write_sct(sctFile,compression='lzma')
+      o1 = system.Molecule(0)
+      o1.read_sct(sctFile)
+      self.assertTrue(numpy.abs(o1.coor()-self.o.coor()).max() <= 0.0005)
+      os.remove(sctFile)
+
+   def test_bad_options(self):
+      '''
+	   test that an unknown compression or a precision that is not positive raises an exception
+	   '''
+      #
+      sctFile = moduleDataPath+'test-results/2AAD-writesct-bad.sct'
+      self.o.read_pdb(pdbDataPath+'2AAD-1to3.pdb')
+      with self.assertRaises(Exception):
+         self.o.write_sct(sctFile,compression='rar')
+      with self.assertRaises(Exception):
+         self.o.write_sct(sctFile,precision=0.0)
+      self.assertFalse(os.path.isfile(sctFile))
+
+   def test_not_sct(self):
+      '''
+	   test that reading a file that is not a sct file raises an exception
+	   '''
+      #
+      with self.assertRaises(Exception):
+         self.o.read_sct(dcdDataPath+'2AAD.dcd')
+
+   def tearDown(self):
+      pass
+
+if __name__ == '__main__':
+   main()
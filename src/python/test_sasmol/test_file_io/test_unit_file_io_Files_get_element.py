@@ -24,6 +24,7 @@ Test for conflict atoms in the case of light atoms
 Test for H/C/N/O/S/P atoms
 Test for miscellaneous atoms (CAL, POT, ...)
 Test for noncharmm/wrong atoms (ABC, ...)
+Test for saving and loading the element table as JSON [name, resname, element] entries
 '''
 
 
@@ -33,6 +34,7 @@ from mocker import Mocker, MockerTestCase
 import sasmol.system as system
 
 import os
+import json
 
 # This data for atomic properties are stored under sasproperties folder
 
@@ -259,6 +261,64 @@ class Test_unit_file_io_Files_get_elements(MockerTestCase):
       self.assertTrue(len(error)>0)
       self.assertEqual(element_name,'')
 
+   def test_element_table(self):
+      '''
+      test that an inferred element is remembered for every molecule
+      '''
+      #
+      name = 'CA'
+      resname = 'CAL'
+      (error, element_name) = self.o.get_element(name,resname)
+      self.assertEqual(element_name,'C')
+      self.assertEqual(self.o.element_table[(name,resname)],'C')
+      other=system.Molecule(0)
+      self.assertEqual(other.element_table[(name,resname)],'C')
+      (error, element_name) = other.get_element(name,resname)
+      self.assertEqual(len(error),0)
+      self.assertEqual(element_name,'C')
+
+   def test_element_table_not_storing_errors(self):
+      '''
+      test that names without an element are not remembered
+      '''
+      #
+      (error, element_name) = self.o.get_element('$ABC','RES')
+      self.assertTrue(len(error)>0)
+      self.assertFalse(('$ABC','RES') in self.o.element_table)
+
+   def test_save_and_load_element_table(self):
+      '''
+      test saving the element table and loading it back
+      '''
+      #
+      filename = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io','test-results','element_table-test.json')
+      self.o.get_element('OH2','TIP3')
+      self.o.save_element_table(filename)
+      self.assertTrue(['OH2','TIP3','O'] in json.load(open(filename)))
+      saved = dict(self.o.element_table)
+      self.o.element_table.clear()
+      self.o.load_element_table(filename)
+      self.assertEqual(self.o.element_table,saved)
+      self.assertEqual(self.o.element_table[('OH2','TIP3')],'O')
+      self.assertEqual(type(self.o.element_table.keys()[0][0]),str)
+      os.remove(filename)
+
+   def test_load_bad_element_table(self):
+      '''
+      test that an element table file that is not a list of [name, resname, element] strings is not loaded
+      '''
+      #
+      filename = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io','test-results','element_table-test.json')
+      self.o.element_table.clear()
+      for content in ['not json','{"CA": "C"}','[["CA","CAL","C"],["CB","CAL"]]','[["CA","CAL",6]]']:
+         outfile = open(filename,'w')
+         outfile.write(content)
+         outfile.close()
+         with self.assertRaises(Exception):
+            self.o.load_element_table(filename)
+         self.assertEqual(self.o.element_table,{})
+      os.remove(filename)
+
 
    def tearDown(self):
       pass
@@ -0,0 +1,197 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+"""
+Integration test for the hydrogen bonds of sasio.subset.Mask
+
+contract:
+
+donors and acceptors are paired from the DONO and ACCE names of the topology
+donors and acceptors are found again when another file is read
+get_hydrogen_bonds finds the same bonds as comparing all pairs
+frames searched together give the same bonds as one frame at a time, also in small blocks
+the donors and acceptors filters restrict the bonds
+without a topology there is an error
+hydrogen_bonded to selects the atoms bonded to the second selection
+"""
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+import sasmol.selection as selection
+
+import numpy
+
+import os
+
+PdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+DcdDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','dcd_common')+os.path.sep
+moduleDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','subset')+os.path.sep
+
+class Test_subset_Mask_get_hydrogen_bonds(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+      self.o.read_pdb(PdbDataPath+'hiv1_gag.pdb')
+      self.o.read_charmm_topology(moduleDataPath,'top_hydrogen_bonds.inp')
+
+   def all_pairs(self,coor,donors,acceptors):
+      '''
+      hydrogen bonds of one frame, comparing all pairs
+      '''
+      d = coor[donors[:,1]] ; h = coor[donors[:,0]] ; a = coor[acceptors]
+      distances = numpy.sqrt(((d[:,None,:]-a[None,:,:])**2).sum(axis=2))
+      to_donor = (d-h)[:,None,:] ; to_acceptor = a[None,:,:]-h[:,None,:]
+      cosines = (to_donor*to_acceptor).sum(axis=2)/numpy.sqrt((to_donor**2).sum(axis=2)*(to_acceptor**2).sum(axis=2))
+      bonded = (distances <= 3.5) & (cosines <= numpy.cos(numpy.radians(150.0))) & (donors[:,1][:,None] != acceptors[None,:])
+      bonds = [[donors[i,1],donors[i,0],acceptors[j]] for i,j in zip(*numpy.nonzero(bonded))]
+      return sorted(bonds)
+
+   def test_names(self):
+      '''
+      test pairing the DONO and ACCE names using the bonds of the residue
+      '''
+      #
+      names = selection.hydrogen_bond_names(self.o.topology_info)
+      self.assertEqual(names['SER'],([('HN','N'),('HG1','OG')],['OG','O']))
+      self.assertEqual(names['HSD'],([('HN','N'),('HD1','ND1')],['NE2','O']))
+      self.assertEqual(names['PRO'],([],['O']))
+      self.assertEqual(names['NTER'],([('HT1','N'),('HT2','N'),('HT3','N')],[]))
+
+   def test_atoms(self):
+      '''
+      test that the hydrogens are paired with the donor of their own residue
+      '''
+      #
+      error, donors, acceptors = self.o.get_hydrogen_bond_atoms()
+      self.assertEqual(error,[])
+      name = self.o.name() ; resid = self.o.resid()
+      self.assertEqual(len(donors),818)
+      for hydrogen, donor in donors:
+         self.assertEqual(resid[hydrogen],resid[donor])
+         self.assertEqual(name[hydrogen][0],'H')
+      self.assertEqual(sorted(set(name[i] for i in acceptors)),['ND1','NE2','O','OD1','OD2','OE1','OE2','OG','OG1','OH'])
+
+   def test_read_again(self):
+      '''
+      test that reading another file with the same number of atoms finds its own donors and acceptors
+      '''
+      #
+      error, donors, acceptors = self.o.get_hydrogen_bond_atoms()
+      self.assertEqual((len(donors),len(acceptors)),(818,639))
+      filename = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','sasmol','file_io','test-results','hiv1_gag-calpha-test.pdb')
+      self.o.setName(['CA']*self.o.natoms())
+      self.o.write_pdb(filename,0,'w')
+      self.o.read_pdb(PdbDataPath+'hiv1_gag.pdb')
+      error, donors, acceptors = self.o.get_hydrogen_bond_atoms()
+      self.assertEqual((len(donors),len(acceptors)),(818,639))
+      self.o.read_pdb(filename)
+      os.remove(filename)
+      error, donors, acceptors = self.o.get_hydrogen_bond_atoms()
+      self.assertEqual((len(donors),len(acceptors)),(0,0))
+
+   def test_same_as_all_pairs(self):
+      '''
+      test that the bonds found are the same as comparing all pairs
+      '''
+      #
+      error, donors, acceptors = self.o.get_hydrogen_bond_atoms()
+      error, bonds = self.o.get_hydrogen_bonds()
+      self.assertEqual(error,[])
+      self.assertEqual(len(bonds),1)
+      self.assertEqual(bonds[0].tolist(),self.all_pairs(self.o.coor()[0],donors,acceptors))
+      self.assertTrue(len(bonds[0]) > 0)
+
+   def test_frames(self):
+      '''
+      test that frames searched together give the bonds of each frame, also in small blocks
+      '''
+      #
+      self.o.read_pdb(PdbDataPath+'rna.pdb')
+      self.o.read_dcd(DcdDataPath+'rna-1to10.dcd')
+      error, donors, acceptors = self.o.get_hydrogen_bond_atoms()
+      error, bonds = self.o.get_hydrogen_bonds()
+      self.assertEqual(len(bonds),10)
+      for frame in [0,4,9]:
+         self.assertEqual(bonds[frame].tolist(),selection.find_hydrogen_bonds(self.o.coor()[frame],donors,acceptors)[0].tolist())
+      self.assertEqual(bonds[4].tolist(),self.all_pairs(self.o.coor()[4],donors,acceptors))
+      error, some_bonds = self.o.get_hydrogen_bonds(frames=[9,2])
+      self.assertEqual([b.tolist() for b in some_bonds],[bonds[9].tolist(),bonds[2].tolist()])
+      block_size = selection.SELECTION_PAIR_BLOCK_SIZE
+      try:
+         selection.SELECTION_PAIR_BLOCK_SIZE = 100
+         error, small_bonds = self.o.get_hydrogen_bonds()
+      finally:
+         selection.SELECTION_PAIR_BLOCK_SIZE = block_size
+      self.assertEqual([b.tolist() for b in small_bonds],[b.tolist() for b in bonds])
+
+   def test_donors_and_acceptors(self):
+      '''
+      test restricting the donors and acceptors with filters
+      '''
+      #
+      error, bonds = self.o.get_hydrogen_bonds()
+      error, some_bonds = self.o.get_hydrogen_bonds(donors='resname[i] == "LYS"',acceptors='resname[i] in ["ASP","GLU"]')
+      self.assertEqual(error,[])
+      resname = self.o.resname()
+      expected = [b for b in bonds[0].tolist() if resname[b[0]] == 'LYS' and resname[b[2]] in ['ASP','GLU']]
+      self.assertEqual(some_bonds[0].tolist(),expected)
+      error, no_bonds = self.o.get_hydrogen_bonds(donors='resname[i] == "XXX"')
+      self.assertEqual(error,[])
+      self.assertEqual(len(no_bonds[0]),0)
+
+   def test_no_topology(self):
+      '''
+      test that finding hydrogen bonds without a topology is an error
+      '''
+      #
+      o=system.Molecule(0)
+      o.read_pdb(PdbDataPath+'hiv1_gag.pdb')
+      error, bonds = o.get_hydrogen_bonds()
+      self.assertTrue(len(error) > 0)
+      error, mask = o.get_subset_mask('resname[i] == "LYS" hydrogen_bonded to resname[j] == "GLU"')
+      self.assertTrue(len(error) > 0)
+
+   def test_hydrogen_bonded_to(self):
+      '''
+      test selecting the atoms hydrogen bonded to a second selection
+      '''
+      #
+      error, mask = self.o.get_subset_mask('resname[i] == "LYS" hydrogen_bonded to (resname[j] == "GLU" or resname[j] == "ASP")')
+      self.assertEqual(error,[])
+      error, bonds = self.o.get_hydrogen_bonds()
+      resname = self.o.resname()
+      lysine = lambda i: resname[i] == 'LYS'
+      acidic = lambda i: resname[i] in ['GLU','ASP']
+      expected = set()
+      for donor, hydrogen, acceptor in bonds[0].tolist():
+         if lysine(donor) and acidic(acceptor):
+            expected.update([donor,hydrogen])
+         if lysine(acceptor) and acidic(donor):
+            expected.add(acceptor)
+      self.assertTrue(len(expected) > 0)
+      self.assertEqual(list(numpy.nonzero(mask)[0]),sorted(expected))
+      self.assertEqual(selection.hydrogen_bond_clause('name[i] == " hydrogen_bonded to "'),None)
+
+   def tearDown(self):
+      pass
+
+if __name__ == '__main__':
+   main()
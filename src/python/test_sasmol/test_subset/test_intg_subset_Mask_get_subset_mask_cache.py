@@ -0,0 +1,154 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+"""
+Integration test for the masks kept by sasio.subset.Mask.get_subset_mask
+
+contract:
+
+the mask of a filter is kept and given again
+the mask given is a copy
+setting a descriptor, set_descriptor_using_mask, topology_changed and read_pdb discard the mask
+the least recently used mask is dropped first
+get_subset_indices gives the indices of the selected atoms
+"""
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+import sasmol.selection as selection
+
+import numpy
+
+import os
+
+PdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+
+class Test_subset_Mask_get_subset_mask_cache(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+      self.o.read_pdb(PdbDataPath+'1CRN.pdb')
+      self.basis_filter = 'name[i] == "CA"'
+      self.compiled = selection.compile_selection(self.basis_filter)
+
+   def test_kept(self):
+      '''
+      test that the mask is kept and given again
+      '''
+      #
+      error, mask = self.o.get_subset_mask(self.basis_filter)
+      self.assertEqual(numpy.sum(mask),46)
+      cached = self.o.selection_cache().get(self.o,self.compiled)
+      self.assertNotEqual(cached,None)
+      self.assertTrue(numpy.array_equal(cached[0],mask))
+      error, mask_again = self.o.get_subset_mask(self.basis_filter)
+      self.assertEqual(error,[])
+      self.assertTrue(numpy.array_equal(mask_again,mask))
+
+   def test_copy(self):
+      '''
+      test that changing a mask that was given does not change the one kept
+      '''
+      #
+      error, mask = self.o.get_subset_mask(self.basis_filter)
+      mask[:] = 0
+      error, mask_again = self.o.get_subset_mask(self.basis_filter)
+      self.assertEqual(numpy.sum(mask_again),46)
+
+   def test_set_name(self):
+      '''
+      test that setting the names discards the mask
+      '''
+      #
+      self.o.get_subset_mask(self.basis_filter)
+      name = self.o.name()
+      name[0] = 'CA'
+      self.o.setName(name)
+      self.assertEqual(self.o.selection_cache().get(self.o,self.compiled),None)
+      error, mask = self.o.get_subset_mask(self.basis_filter)
+      self.assertEqual(numpy.sum(mask),47)
+
+   def test_set_descriptor_using_mask(self):
+      '''
+      test that set_descriptor_using_mask discards the mask
+      '''
+      #
+      error, mask = self.o.get_subset_mask(self.basis_filter)
+      error = self.o.set_descriptor_using_mask(mask,self.o.name(),'CX')
+      error, mask = self.o.get_subset_mask(self.basis_filter)
+      self.assertTrue(len(error) > 0)
+      self.assertEqual(numpy.sum(mask),0)
+
+   def test_topology_changed(self):
+      '''
+      test that topology_changed discards the mask after an in-place change
+      '''
+      #
+      self.o.get_subset_mask(self.basis_filter)
+      self.o.name()[0] = 'CA'
+      self.o.topology_changed()
+      error, mask = self.o.get_subset_mask(self.basis_filter)
+      self.assertEqual(numpy.sum(mask),47)
+
+   def test_read_pdb(self):
+      '''
+      test that reading another molecule discards the mask
+      '''
+      #
+      self.o.get_subset_mask(self.basis_filter)
+      self.o.read_pdb(PdbDataPath+'1ATM.pdb')
+      error, mask = self.o.get_subset_mask('name[i] == "N"')
+      self.assertEqual(list(mask),[1])
+      error, mask = self.o.get_subset_mask(self.basis_filter)
+      self.assertEqual(list(mask),[0])
+
+   def test_least_recently_used(self):
+      '''
+      test that the least recently used mask is dropped first
+      '''
+      #
+      self.o.get_subset_mask(self.basis_filter)
+      for resid in range(1,selection.SELECTION_MASK_CACHE_SIZE):
+         self.o.get_subset_mask('resid[i] == '+str(resid))
+      self.o.get_subset_mask(self.basis_filter)
+      self.o.get_subset_mask('resid[i] == 40')
+      self.assertEqual(len(self.o.selection_cache()),selection.SELECTION_MASK_CACHE_SIZE)
+      self.assertNotEqual(self.o.selection_cache().get(self.o,self.compiled),None)
+      self.assertEqual(self.o.selection_cache().get(self.o,selection.compile_selection('resid[i] == 1')),None)
+
+   def test_get_subset_indices(self):
+      '''
+      test that get_subset_indices gives the indices of the selected atoms
+      '''
+      #
+      error, mask = self.o.get_subset_mask(self.basis_filter)
+      error, indices = self.o.get_subset_indices(self.basis_filter)
+      self.assertEqual(error,[])
+      self.assertTrue(numpy.array_equal(indices,numpy.nonzero(mask)[0]))
+      error, indices = self.o.get_subset_indices('name[i] == "XX"')
+      self.assertTrue(len(error) > 0)
+      self.assertEqual(len(indices),0)
+
+   def tearDown(self):
+      pass
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,111 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+from __future__ import division
+
+from sasmol.test_sasmol.utilities import env
+
+"""
+Integration test for the compiled basis filters of sasio.subset.Mask.get_subset_mask
+
+contract:
+
+compiled filters give the same mask as evaluating the filter atom by atom
+filters that can not be compiled are still evaluated atom by atom
+a compiled filter that fails for some atoms gives the same error as before
+"""
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+import sasmol.selection as selection
+
+import numpy
+
+import os
+
+PdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+
+class Test_subset_Mask_get_subset_mask_compiled(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+      self.o.read_pdb(PdbDataPath+'1CRN.pdb')
+
+   def atom_by_atom(self,basis_filter):
+      '''
+      evaluate basis_filter for one atom at a time
+      '''
+      index = self.o.index() ; name = self.o.name() ; resname = self.o.resname()
+      chain = self.o.chain() ; resid = self.o.resid() ; beta = self.o.beta()
+      element = self.o.element() ; moltype = self.o.moltype()
+      return [int(bool(eval(basis_filter))) for i in range(self.o.natoms())]
+
+   def test_same_as_atom_by_atom(self):
+      '''
+      test that compiled filters select the same atoms as before
+      '''
+      #
+      basis_filters = ['name[i] == "CA" and resid[i] < 10',
+                       'name[i][0] == "C" and resid[i] < 10',
+                       '1 <= resid[i] < 10 or beta[i] > 10.0',
+                       'resname[i] in ["ALA","GLY"] and not name[i] == "N"',
+                       'resname[i] not in ("ALA",)',
+                       'name[i].startswith("C") and len(name[i]) == 2',
+                       'resid[i] % 2 == 0 and element[i] != "C"',
+                       'name[i][-1:] == "A" and moltype[i] == "protein"',
+                       'i < 5 or index[i] > 320',
+                       'resid[i]/2 > 3.5',
+                       'name[i] < 5']
+      #
+      for basis_filter in basis_filters:
+         self.assertNotEqual(selection.compile_selection(basis_filter),None)
+         error, mask = self.o.get_subset_mask(basis_filter)
+         self.assertEqual(list(mask),self.atom_by_atom(basis_filter))
+         if(numpy.sum(mask) > 0):
+            self.assertEqual(error,[])
+            self.assertEqual(mask.dtype,numpy.int32)
+         else:
+            self.assertTrue(len(error) > 0)
+
+   def test_not_compiled(self):
+      '''
+      test that filters using other variables are evaluated atom by atom
+      '''
+      #
+      basis_filter = 'name[i] == "CA" and self.natoms() > 0'
+      self.assertEqual(selection.compile_selection(basis_filter),None)
+      error, mask = self.o.get_subset_mask(basis_filter)
+      self.assertEqual(error,[])
+      self.assertEqual(list(mask),self.atom_by_atom('name[i] == "CA"'))
+
+   def test_compiled_filter_fails(self):
+      '''
+      test that a compiled filter failing for some atoms gives the error of the atom by atom evaluation
+      '''
+      #
+      basis_filter = 'name[i][3] == "A"'
+      self.assertNotEqual(selection.compile_selection(basis_filter),None)
+      error, mask = self.o.get_subset_mask(basis_filter)
+      self.assertTrue(len(error) > 0)
+      self.assertEqual(error[0],'failed to evaluate filter selection '+basis_filter+' for atom 0')
+
+   def tearDown(self):
+      pass
+
+if __name__ == '__main__':
+   main()
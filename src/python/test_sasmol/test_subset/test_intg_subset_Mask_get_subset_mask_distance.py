@@ -0,0 +1,152 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+"""
+Integration test for the distance clauses of sasio.subset.Mask.get_subset_mask
+
+contract:
+
+less_than, greater_than and between select the same atoms as comparing all pairs
+the distances are measured in the frame given
+an empty second selection is farther than any distance
+a filter with an error in the second selection gives an error
+nearest_distances gives the distance to the nearest target within the cutoff
+"""
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+import sasmol.selection as selection
+
+import numpy
+
+import os
+
+PdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+
+class Test_subset_Mask_get_subset_mask_distance(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+      self.o.read_pdb(PdbDataPath+'1CRN.pdb')
+
+   def nearest(self,atoms,others,frame=0):
+      '''
+      distance from every atom in atoms to the nearest atom in others, comparing all pairs
+      '''
+      coor = self.o.coor()[frame]
+      atoms = numpy.nonzero(atoms)[0] ; others = numpy.nonzero(others)[0]
+      distances = numpy.sqrt(((coor[atoms][:,None,:]-coor[others][None,:,:])**2).sum(axis=2))
+      return atoms,distances.min(axis=1)
+
+   def test_less_than(self):
+      '''
+      test selecting the atoms less than 6 angstroms from residue 10
+      '''
+      #
+      error, mask = self.o.get_subset_mask('name[i] == "CA" less_than 6 angstroms from resid[j] == 10')
+      self.assertEqual(error,[])
+      atoms,distances = self.nearest(self.o.get_subset_mask('name[i] == "CA"')[1],self.o.get_subset_mask('resid[i] == 10')[1])
+      self.assertEqual(list(numpy.nonzero(mask)[0]),list(atoms[distances < 6.0]))
+
+   def test_greater_than(self):
+      '''
+      test selecting the atoms greater than 7 angstroms from the sulfur atoms
+      '''
+      #
+      error, mask = self.o.get_subset_mask('moltype[i] == "protein" greater_than 7 angstroms from element[j] == "S"')
+      self.assertEqual(error,[])
+      atoms,distances = self.nearest(numpy.ones(self.o.natoms()),self.o.get_subset_mask('element[i] == "S"')[1])
+      self.assertEqual(list(numpy.nonzero(mask)[0]),list(atoms[distances > 7.0]))
+
+   def test_between(self):
+      '''
+      test selecting the atoms between 3 and 5 angstroms from a group in parentheses
+      '''
+      #
+      error, mask = self.o.get_subset_mask('(name[i] == "O" or name[i] == "N") between 3 and 5 angstroms from (resname[j] == "CYS" and name[j] == "SG")')
+      self.assertEqual(error,[])
+      atoms,distances = self.nearest(self.o.get_subset_mask('name[i] == "O" or name[i] == "N"')[1],self.o.get_subset_mask('resname[i] == "CYS" and name[i] == "SG"')[1])
+      self.assertEqual(list(numpy.nonzero(mask)[0]),list(atoms[(distances >= 3.0) & (distances <= 5.0)]))
+
+   def test_frame(self):
+      '''
+      test that the distances are measured in the frame given
+      '''
+      #
+      self.o.read_pdb(PdbDataPath+'2AAD-1to3.pdb')
+      basis_filter = 'resid[i] == 515 less_than 3 angstroms from (resid[j] == 516 and name[j] == "N")'
+      for frame in range(3):
+         error, mask = self.o.get_subset_mask(basis_filter,frame=frame)
+         atoms,distances = self.nearest(self.o.get_subset_mask('resid[i] == 515')[1],self.o.get_subset_mask('resid[i] == 516 and name[i] == "N"')[1],frame)
+         self.assertEqual(list(numpy.nonzero(mask)[0]),list(atoms[distances < 3.0]))
+
+   def test_empty_second_selection(self):
+      '''
+      test that no atom is near an empty selection and every atom is far from it
+      '''
+      #
+      error, mask = self.o.get_subset_mask('name[i] == "CA" less_than 5 angstroms from name[j] == "XX"')
+      self.assertTrue(len(error) > 0)
+      self.assertEqual(numpy.sum(mask),0)
+      error, mask = self.o.get_subset_mask('name[i] == "CA" greater_than 5 angstroms from name[j] == "XX"')
+      self.assertEqual(error,[])
+      self.assertEqual(numpy.sum(mask),46)
+
+   def test_error_in_second_selection(self):
+      '''
+      test that an error in the second selection is returned
+      '''
+      #
+      error, mask = self.o.get_subset_mask('name[i] == "CA" less_than 5 angstroms from abc[j] == 1')
+      self.assertTrue(len(error) > 0)
+      self.assertTrue(error[0].startswith('failed to evaluate filter selection'))
+
+   def test_quoted_keyword(self):
+      '''
+      test that a distance keyword inside quotes is not a distance clause
+      '''
+      #
+      self.assertEqual(selection.distance_clause('name[i] == " less_than 5 angstroms from "'),None)
+      self.assertEqual(selection.distance_clause('name[i] == "CA" less_than 5 angstroms from name[j] == "N"'),('name[i] == "CA"','name[i] == "N"',None,5.0))
+
+   def test_nearest_distances(self):
+      '''
+      test the cell list search against comparing all pairs, also in small blocks
+      '''
+      #
+      numpy.random.seed(7)
+      points = numpy.random.rand(400,3)*30.0
+      targets = numpy.random.rand(300,3)*30.0
+      expected = numpy.sqrt(((points[:,None,:]-targets[None,:,:])**2).sum(axis=2)).min(axis=1)
+      expected[expected > 2.5] = numpy.inf
+      self.assertTrue(numpy.allclose(selection.nearest_distances(points,targets,2.5),expected))
+      block_size = selection.SELECTION_PAIR_BLOCK_SIZE
+      try:
+         selection.SELECTION_PAIR_BLOCK_SIZE = 5
+         self.assertTrue(numpy.allclose(selection.nearest_distances(points,targets,2.5),expected))
+      finally:
+         selection.SELECTION_PAIR_BLOCK_SIZE = block_size
+
+   def tearDown(self):
+      pass
+
+if __name__ == '__main__':
+   main()
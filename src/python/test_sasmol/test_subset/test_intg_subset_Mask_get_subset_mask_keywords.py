@@ -0,0 +1,121 @@
+'''
+    SASMOL: Copyright (C) 2011 Joseph E. Curtis, Ph.D.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from sasmol.test_sasmol.utilities import env
+
+"""
+Integration test for the selection keywords of sasio.subset.Mask.get_subset_mask
+
+contract:
+
+keywords select the same atoms as the equivalent descriptor filters
+keywords combine with each other and with descriptors
+the keyword masks are computed once and kept until a descriptor they use changes
+keywords can be used in distance clauses
+"""
+
+from unittest import main
+from mocker import Mocker, MockerTestCase
+
+import sasmol.system as system
+import sasmol.selection as selection
+
+import numpy
+
+import os
+
+PdbDataPath = os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','data','pdb_common')+os.path.sep
+
+class Test_subset_Mask_get_subset_mask_keywords(MockerTestCase):
+
+   def setUp(self):
+      self.o=system.Molecule(0)
+      self.o.read_pdb(PdbDataPath+'hiv1_gag.pdb')
+
+   def assertSameAtoms(self,keyword_filter,basis_filter):
+      error, mask = self.o.get_subset_mask(keyword_filter)
+      expected_error, expected = self.o.get_subset_mask(basis_filter)
+      self.assertEqual(len(error),len(expected_error))
+      self.assertEqual(list(mask),list(expected))
+
+   def test_protein(self):
+      '''
+      test the protein keywords against descriptor filters
+      '''
+      #
+      self.assertSameAtoms('all','i >= 0')
+      self.assertSameAtoms('protein','moltype[i] == "protein"')
+      self.assertSameAtoms('calpha','moltype[i] == "protein" and name[i] == "CA"')
+      self.assertSameAtoms('backbone','moltype[i] == "protein" and name[i] in ["N","CA","C","O"]')
+      self.assertSameAtoms('hydrogen','element[i] == "H"')
+      self.assertSameAtoms('heavy','element[i] != "H"')
+      self.assertSameAtoms('hydrophobic','resname[i] in ["ALA","VAL","LEU","ILE","MET","PHE","TRP","PRO"]')
+      self.assertSameAtoms('polar','resname[i] not in ["ALA","VAL","LEU","ILE","MET","PHE","TRP","PRO"]')
+      self.assertSameAtoms('charged','resname[i] in ["ASP","GLU","ARG","LYS","HSD","HSE","HSP"]')
+      self.assertSameAtoms('water','moltype[i] == "water"')
+
+   def test_nucleic(self):
+      '''
+      test the nucleic keywords against descriptor filters
+      '''
+      #
+      self.o.read_pdb(PdbDataPath+'rna.pdb')
+      self.assertSameAtoms('nucleic','moltype[i] == "rna"')
+      self.assertSameAtoms('backbone','name[i] in ["P","O1P","O2P","O5\'","C5\'","C4\'","C3\'","O3\'"]')
+      self.assertSameAtoms('protein','moltype[i] == "protein"')
+
+   def test_combined(self):
+      '''
+      test combining keywords with each other and with descriptors
+      '''
+      #
+      self.assertSameAtoms('backbone and not hydrogen and resid[i] < 10','moltype[i] == "protein" and name[i] in ["N","CA","C","O"] and resid[i] < 10')
+      self.assertSameAtoms('calpha and (acidic or basic)','name[i] == "CA" and resname[i] in ["ASP","GLU","ARG","LYS","HSD","HSE","HSP"]')
+      compiled = selection.compile_selection('heavy and resid[i] == 3')
+      self.assertEqual(compiled.keywords,['heavy'])
+      self.assertEqual(compiled.dependencies,['element','resid'])
+
+   def test_masks_kept(self):
+      '''
+      test that the keyword masks are computed once and kept until a descriptor they use changes
+      '''
+      #
+      masks = self.o.keyword_masks()
+      self.assertTrue(self.o.keyword_masks() is masks)
+      self.assertFalse(masks['calpha'].flags.writeable)
+      self.o.setBeta(self.o.beta())
+      self.assertFalse(self.o.keyword_masks() is masks)
+      masks = self.o.keyword_masks()
+      name = self.o.name()
+      name[1] = 'CA'
+      self.o.setName(name)
+      self.assertEqual(numpy.sum(self.o.keyword_masks()['calpha']),numpy.sum(masks['calpha'])+1)
+      error, mask = self.o.get_subset_mask('calpha')
+      self.assertEqual(mask[1],1)
+
+   def test_distance(self):
+      '''
+      test keywords in a distance clause
+      '''
+      #
+      self.assertSameAtoms('hydrogen less_than 2 angstroms from calpha','element[i] == "H" less_than 2 angstroms from (moltype[j] == "protein" and name[j] == "CA")')
+
+   def tearDown(self):
+      pass
+
+if __name__ == '__main__':
+   main()
@@ -33,6 +33,10 @@ from __future__ import print_function
         chemical formula parsing, etc.
 '''
 #import system as system
+import os
+import io
+import bz2
+import gzip
 import string
 import copy
 import numpy
@@ -40,6 +44,76 @@ import numpy
 def find_unique(this_list):
     return list(numpy.unique(this_list))
 
+def compression_type(filename, mode='r'):
+    '''
+    Return the compression ('gzip', 'bz2' or 'xz') of a file, or None.
+
+    A file that is opened for reading is identified from its magic bytes,
+    otherwise the extension (.gz, .bz2 or .xz) of filename is used.
+
+    >>> import sasmol.utilities as utilities
+    >>> utilities.compression_type('hiv1_gag.pdb.gz', 'w')
+    'gzip'
+    '''
+
+    if 'r' in mode and os.path.isfile(filename):
+        infile = open(filename, 'rb')
+        magic = infile.read(6)
+        infile.close()
+        if magic[:2] == '\x1f\x8b':
+            return 'gzip'
+        elif magic[:3] == 'BZh':
+            return 'bz2'
+        elif magic == '\xfd7zXZ\x00':
+            return 'xz'
+        return None
+
+    extension = os.path.splitext(filename)[1].lower()
+
+    return {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}.get(extension)
+
+def open_file(filename, mode='r'):
+    '''
+    Open a file like open(), decompressing or compressing gzip, bz2 and
+    xz files on the fly so that no temporary file is needed.
+
+    Compressed files are always handled in binary mode.  xz needs the
+    lzma module (python 3, or the backports.lzma package for python 2).
+    bz2 files can not be opened for appending.
+
+    >>> import sasmol.utilities as utilities
+    >>> infile = utilities.open_file('hiv1_gag.pdb.gz')
+    '''
+
+    compression = compression_type(filename, mode)
+
+    if compression is None:
+        return open(filename, mode)
+
+    compressed_mode = mode.replace('b', '').replace('t', '') + 'b'
+
+    if compression == 'gzip':
+        compressed_file = gzip.open(filename, compressed_mode)
+        if 'r' in mode:
+            return io.BufferedReader(compressed_file)
+        return compressed_file
+
+    elif compression == 'bz2':
+        if 'a' in mode:
+            # BZ2File of python 2 crashes the interpreter in append mode
+            raise Exception('append is not supported for the bz2 compressed file ' + filename)
+        return bz2.BZ2File(filename, compressed_mode)
+
+    try:
+        import lzma
+    except ImportError:
+        try:
+            from backports import lzma
+        except ImportError:
+            raise Exception('the lzma module is needed to open the xz compressed file ' + filename)
+
+    return lzma.open(filename, compressed_mode)
+
 class Copy_Using_Mask():
 
     @classmethod